@@ -0,0 +1,10 @@
+"""
+Навантажувальний стенд без мережі і справжніх токенів.
+
+Локальні підміни Telegram Bot API (bench.fake_telegram) та OpenAI
+(bench.fake_openai) з налаштовуваною затримкою і штучними помилками,
+генератор трафіку з багатьох чатів (bench.loadgen) і запуск версій бота
+з порівнянням затримок та пропускної здатності:
+
+    python -m bench --variants bot,bot1,bot2,bot3 --chats 50 --messages 10
+"""
@@ -0,0 +1,208 @@
+"""
+Запуск навантажувального тесту: python -m bench --help
+
+Для кожної версії бота (bot, bot1, bot2, bot3 або brama — python -m brama) піднімаються підмінні
+сервери Telegram і OpenAI, бот запускається окремим процесом у тимчасовій
+теці (власні history.db, media_cache.db...), генератор трафіку проганяє
+однакове навантаження, після чого бот зупиняється. Наприкінці — таблиця
+p50/p95/p99 затримок і повідомлень на секунду для кожної версії.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import tempfile
+from pathlib import Path
+
+from bench.fake_openai import FakeOpenAI
+from bench.fake_telegram import FakeTelegram
+from bench.faults import Faults
+from bench.loadgen import LoadGenerator, parse_mix
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+VARIANTS = ("bot", "bot1", "bot2", "bot3", "brama")
+BENCH_TOKEN = "123456:bench-token"
+STARTUP_TIMEOUT = 60
+SHUTDOWN_TIMEOUT = 20
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Навантажувальний тест версій бота")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="версії через кому (bot,bot1,bot2,bot3,brama)")
+    parser.add_argument("--chats", type=int, default=20, help="кількість одночасних чатів")
+    parser.add_argument("--messages", type=int, default=10, help="повідомлень від кожного чату")
+    parser.add_argument("--mix", default="text=0.7,voice=0.2,photo=0.1", help="частки типів повідомлень")
+    parser.add_argument("--repeat", type=float, default=0.1, help="імовірність повтору попереднього тексту/файлу")
+    parser.add_argument("--think-time", type=float, default=0.0, help="середня пауза чату між повідомленнями, с")
+    parser.add_argument("--settle", type=float, default=1.5, help="тиша в чаті, після якої відповідь вважається повною, с")
+    parser.add_argument("--timeout", type=float, default=60.0, help="скільки чекати першу відповідь, с")
+    parser.add_argument("--seed", type=int, default=1)
+
+    parser.add_argument("--tg-latency", type=float, default=0.03, help="затримка Telegram API, с")
+    parser.add_argument("--tg-jitter", type=float, default=0.01)
+    parser.add_argument("--tg-error-rate", type=float, default=0.0, help="частка відповідей 429/500 від Telegram")
+    parser.add_argument("--ai-latency", type=float, default=0.6, help="час до першого токена OpenAI, с")
+    parser.add_argument("--ai-jitter", type=float, default=0.2)
+    parser.add_argument("--ai-tokens", type=int, default=60, help="довжина відповіді, токенів")
+    parser.add_argument("--ai-token-interval", type=float, default=0.02, help="пауза між токенами, с")
+    parser.add_argument("--whisper-latency", type=float, default=1.0, help="тривалість транскрипції, с")
+    parser.add_argument("--whisper-rtf", type=float, default=0.0,
+                        help="додаткові секунди транскрипції на секунду Opus-запису")
+    parser.add_argument("--ai-error-rate", type=float, default=0.0, help="частка відповідей 429/500 від OpenAI")
+
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="змінна оточення для бота (можна кілька разів), напр. STREAM_REPLIES=0")
+    parser.add_argument("--json", dest="json_path", help="зберегти результати у JSON")
+    parser.add_argument("--logs", help="тека для логів ботів (за замовчуванням — тимчасова)")
+    args = parser.parse_args(argv)
+    args.variants = [v.strip() for v in args.variants.split(",") if v.strip()]
+    unknown = set(args.variants) - set(VARIANTS)
+    if unknown:
+        parser.error(f"невідомі версії: {', '.join(sorted(unknown))}")
+    args.mix = parse_mix(args.mix)
+    return args
+
+
+def bot_env(extra_env, telegram, openai_server):
+    """Оточення бота: підмінні сервери, тестовий токен і KEY=VALUE з extra_env."""
+    env = dict(os.environ)
+    env.update({
+        "TELEGRAM_TOKEN": BENCH_TOKEN,
+        "OPENAI_API_KEY": "sk-bench",
+        "OPENAI_API_BASE": openai_server.api_base,
+        "TELEGRAM_API_URL": telegram.api_url,
+        "TELEGRAM_FILE_URL": telegram.file_url,
+        "BOT_MODE": "polling",
+        "METRICS_PORT": "0",
+        "LOG_LEVEL": "WARNING",
+        "PYTHONUNBUFFERED": "1",
+        # python -m brama запускається з тимчасової теки
+        "PYTHONPATH": os.pathsep.join(filter(None, (str(REPO_DIR), os.environ.get("PYTHONPATH")))),
+    })
+    for item in extra_env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+def variant_command(variant):
+    if variant == "brama":
+        return [sys.executable, "-m", "brama"]
+    return [sys.executable, str(REPO_DIR / f"{variant}.py")]
+
+
+async def start_variant(variant, env, workdir, log_file):
+    return await asyncio.create_subprocess_exec(
+        *variant_command(variant),
+        cwd=workdir,
+        env=env,
+        stdout=log_file,
+        stderr=asyncio.subprocess.STDOUT,
+    )
+
+
+async def wait_ready(variant, process, telegram, log_path):
+    """Чекає на перший getUpdates від бота (бот запущений і опитує Telegram)."""
+    ready = asyncio.ensure_future(telegram.ready.wait())
+    exited = asyncio.ensure_future(process.wait())
+    await asyncio.wait({ready, exited}, timeout=STARTUP_TIMEOUT, return_when=asyncio.FIRST_COMPLETED)
+    ready.cancel()
+    exited.cancel()
+    if not telegram.ready.is_set():
+        raise RuntimeError(f"{variant} не запустився, див. {log_path}")
+
+
+async def stop_process(process):
+    if process.returncode is not None:
+        return
+    process.send_signal(signal.SIGINT)
+    try:
+        await asyncio.wait_for(process.wait(), SHUTDOWN_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+async def run_variant(variant, args, telegram, openai_server, log_dir):
+    telegram.reset()
+    openai_server.reset()
+    workdir = tempfile.mkdtemp(prefix=f"bench-{variant}-")
+    log_path = Path(log_dir) / f"{variant}.log"
+    with open(log_path, "wb") as log_file:
+        process = await start_variant(variant, bot_env(args.env, telegram, openai_server), workdir, log_file)
+        try:
+            await wait_ready(variant, process, telegram, log_path)
+            generator = LoadGenerator(
+                telegram,
+                chats=args.chats,
+                messages=args.messages,
+                mix=args.mix,
+                repeat=args.repeat,
+                think_time=args.think_time,
+                settle=args.settle,
+                timeout=args.timeout,
+                seed=args.seed,
+            )
+            result = await generator.run(variant)
+        finally:
+            await stop_process(process)
+
+    summary = result.summary()
+    summary["telegram_calls"] = dict(telegram.calls)
+    summary["openai_calls"] = dict(openai_server.calls)
+    summary["openai_prompt_chars"] = openai_server.prompt_chars
+    summary["injected_errors"] = {"telegram": telegram.faults.injected, "openai": openai_server.faults.injected}
+    summary["log"] = str(log_path)
+    return summary
+
+
+def print_report(summaries):
+    columns = ("variant", "sent", "completed", "timeouts", "msg_per_sec",
+               "first_p50", "first_p95", "first_p99", "full_p50", "full_p95", "full_p99")
+    rows = [[str(s[c]) for c in columns] for s in summaries]
+    widths = [max(len(c), *(len(r[i]) for r in rows)) for i, c in enumerate(columns)]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+    for s in summaries:
+        kinds = ", ".join(
+            f"{kind}: n={v['count']} p50={v['full_p50']} p95={v['full_p95']}" for kind, v in s["by_kind"].items()
+        )
+        print(f"{s['variant']}: {kinds}; OpenAI: {s['openai_calls']}, промпт {s['openai_prompt_chars']} символів")
+
+
+async def main(argv=None):
+    args = parse_args(argv)
+    telegram = FakeTelegram(Faults(args.tg_latency, args.tg_jitter, args.tg_error_rate, seed=args.seed))
+    openai_server = FakeOpenAI(
+        Faults(args.ai_latency, args.ai_jitter, args.ai_error_rate, seed=args.seed),
+        tokens=args.ai_tokens,
+        token_interval=args.ai_token_interval,
+        whisper_latency=args.whisper_latency,
+        whisper_rtf=args.whisper_rtf,
+    )
+    log_dir = args.logs or tempfile.mkdtemp(prefix="bench-logs-")
+    os.makedirs(log_dir, exist_ok=True)
+
+    await telegram.start()
+    await openai_server.start()
+    summaries = []
+    try:
+        for variant in args.variants:
+            print(f"→ {variant}: {args.chats} чатів × {args.messages} повідомлень", flush=True)
+            summaries.append(await run_variant(variant, args, telegram, openai_server, log_dir))
+    finally:
+        await telegram.stop()
+        await openai_server.stop()
+
+    print_report(summaries)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
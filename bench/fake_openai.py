@@ -0,0 +1,137 @@
+"""
+Підміна OpenAI API (ChatCompletion і Whisper) для навантажувального тесту.
+
+Бот підключається через OPENAI_API_BASE (openai 0.28 читає її при імпорті).
+Відповідь чату — ai_tokens "слів"; перше приходить через latency секунд,
+наступні — кожні token_interval (і в потоковому режимі, і без нього час
+той самий). Транскрипція триває whisper_latency секунд плюс
+whisper_rtf секунд на кожну секунду Ogg/Opus-запису (як у справжнього
+Whisper, довший запис розпізнається довше).
+"""
+
+import asyncio
+import json
+import time
+
+from aiohttp import web
+
+from bench.faults import Faults
+
+ANSWER_WORDS = (
+    "Відповідно до законодавства Німеччини ви можете подати заяву до Jobcenter "
+    "протягом місяця. Зверніться до консультаційного центру у вашому місті."
+).split()
+TRANSCRIPT = "Підкажіть, будь ласка, які документи потрібні для реєстрації місця проживання?"
+
+
+def ogg_opus_duration(data):
+    """Тривалість Ogg/Opus у тілі запиту, с (0 — не Opus)."""
+    last_page = data.rfind(b"OggS")
+    if last_page < 0 or b"OpusHead" not in data:
+        return 0.0
+    # Позиція гранули останньої сторінки — кількість семплів на 48 кГц
+    granule = int.from_bytes(data[last_page + 6:last_page + 14], "little")
+    return granule / 48000
+
+
+class FakeOpenAI:
+    def __init__(self, faults=None, tokens=60, token_interval=0.02, whisper_latency=1.0, whisper_rtf=0.0):
+        self.faults = faults or Faults()
+        self.tokens = tokens
+        self.token_interval = token_interval
+        self.whisper_latency = whisper_latency
+        self.whisper_rtf = whisper_rtf
+        self.calls = {}
+        self.prompt_chars = 0
+        self._runner = None
+
+    def reset(self):
+        self.calls.clear()
+        self.prompt_chars = 0
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/chat/completions", self._handle_chat)
+        app.router.add_post("/v1/audio/transcriptions", self._handle_transcription)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.api_base = f"http://{host}:{self.port}/v1"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _error_response(self):
+        status = self.faults.error()
+        if status is None:
+            return None
+        return web.json_response(
+            {"error": {"message": "Injected failure", "type": "server_error" if status == 500 else "rate_limit"}},
+            status=status,
+            headers={"Retry-After": str(self.faults.retry_after)},
+        )
+
+    def _words(self):
+        return [ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(self.tokens)]
+
+    async def _handle_chat(self, request):
+        body = await request.json()
+        self._count("chat")
+        self.prompt_chars += sum(len(m.get("content") or "") for m in body.get("messages", []))
+        await self.faults.delay()
+        error = self._error_response()
+        if error is not None:
+            return error
+
+        words = self._words()
+        created = int(time.time())
+        if not body.get("stream"):
+            await asyncio.sleep(self.token_interval * max(0, len(words) - 1))
+            return web.json_response({
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(words)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {
+                    "prompt_tokens": self.prompt_chars // 4,
+                    "completion_tokens": len(words),
+                    "total_tokens": self.prompt_chars // 4 + len(words),
+                },
+            })
+
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(self.token_interval)
+            chunk = {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model"),
+                "choices": [{"index": 0, "delta": {"content": word if not i else " " + word}, "finish_reason": None}],
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def _handle_transcription(self, request):
+        body = await request.read()
+        self._count("transcription")
+        await self.faults.delay(self.whisper_latency + self.whisper_rtf * ogg_opus_duration(body))
+        error = self._error_response()
+        if error is not None:
+            return error
+        return web.json_response({"text": TRANSCRIPT})
@@ -0,0 +1,187 @@
+"""
+Підміна Telegram Bot API для навантажувального тесту.
+
+Бот підключається до неї через TELEGRAM_API_URL / TELEGRAM_FILE_URL
+(див. brama/serving.py). Сервер видає оновлення через getUpdates (long
+polling), віддає файли через getFile та /file/bot<token>/<path>, а всі
+вихідні запити бота (sendMessage, sendDocument, editMessageText...)
+записує з часом надходження — за ними генератор трафіку рахує затримку.
+Решта методів просто відповідають успіхом.
+"""
+
+import asyncio
+import itertools
+import json
+import time
+
+from aiohttp import web
+
+from bench.faults import Faults
+
+# Методи, що надсилають користувачу видимий результат
+REPLY_METHODS = frozenset({
+    "sendMessage", "sendDocument", "sendPhoto", "sendAudio", "sendVoice", "editMessageText",
+})
+BOT_USER = {"id": 1000000, "is_bot": True, "first_name": "Brama Bench", "username": "brama_bench_bot"}
+
+
+def _ok(result):
+    return web.json_response({"ok": True, "result": result})
+
+
+class FakeTelegram:
+    def __init__(self, faults=None):
+        self.faults = faults or Faults()
+        self.files = {}  # file_id -> bytes
+        self.calls = {}  # метод -> кількість
+        self.ready = asyncio.Event()
+        self._updates = []
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_update = asyncio.Event()
+        self._listeners = {}  # chat_id -> callback(method, data, timestamp)
+        self._runner = None
+
+    # --------------------- Для генератора трафіку ---------------------
+    def add_file(self, file_id, data):
+        self.files[file_id] = bytes(data)
+
+    def push_message(self, chat_id, **content):
+        """Ставить у чергу оновлення з повідомленням від користувача chat_id."""
+        user = {"id": chat_id, "is_bot": False, "first_name": f"User {chat_id}"}
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+        }
+        message.update(content)
+        self._updates.append({"update_id": next(self._update_ids), "message": message})
+        self._new_update.set()
+        return message["message_id"]
+
+    def listen(self, chat_id, callback):
+        self._listeners[chat_id] = callback
+
+    def reset(self):
+        self.files.clear()
+        self.calls.clear()
+        self._updates.clear()
+        self._listeners.clear()
+        self.ready.clear()
+
+    # --------------------- HTTP ---------------------
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/bot{token}/{method}", self._handle_method)
+        app.router.add_get("/bot{token}/{method}", self._handle_method)
+        app.router.add_get("/file/bot{token}/{path:.*}", self._handle_file)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+        self.api_url = f"http://{host}:{self.port}/bot"
+        self.file_url = f"http://{host}:{self.port}/file/bot"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _params(self, request):
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        for key, value in (await request.post()).items():
+            if isinstance(value, str) and value[:1] in "[{":
+                # Складні параметри PTB надсилає як JSON у полі форми
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            params[key] = value
+        return params
+
+    async def _handle_method(self, request):
+        method = request.match_info["method"]
+        params = await self._params(request)
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        if method == "getUpdates":
+            return _ok(await self._get_updates(params))
+        if method == "getMe":
+            return _ok(BOT_USER)
+
+        await self.faults.delay()
+        status = self.faults.error()
+        if status == 429:
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {self.faults.retry_after}",
+                "parameters": {"retry_after": self.faults.retry_after},
+            }, status=429)
+        if status is not None:
+            return web.json_response(
+                {"ok": False, "error_code": status, "description": "Internal Server Error"}, status=status
+            )
+
+        if method == "getFile":
+            file_id = params.get("file_id")
+            if file_id not in self.files:
+                return web.json_response(
+                    {"ok": False, "error_code": 400, "description": "Bad Request: invalid file_id"}, status=400
+                )
+            return _ok({
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "file_size": len(self.files[file_id]),
+                "file_path": f"files/{file_id}",
+            })
+
+        chat_id = params.get("chat_id")
+        if method in REPLY_METHODS and chat_id is not None:
+            listener = self._listeners.get(int(chat_id))
+            if listener is not None:
+                listener(method, params, time.monotonic())
+        if method in REPLY_METHODS:
+            return _ok(self._message(method, chat_id, params))
+        return _ok(True)
+
+    async def _get_updates(self, params):
+        self.ready.set()
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        if offset:
+            # Як і Telegram: усі оновлення до offset підтверджені
+            self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_update.clear()
+            try:
+                await asyncio.wait_for(self._new_update.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    def _message(self, method, chat_id, params):
+        message = {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": int(chat_id), "type": "private"},
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        if method == "sendDocument":
+            file_id = f"doc{message['message_id']}"
+            message["document"] = {"file_id": file_id, "file_unique_id": file_id}
+        return message
+
+    async def _handle_file(self, request):
+        await self.faults.delay()
+        file_id = request.match_info["path"].rsplit("/", 1)[-1]
+        data = self.files.get(file_id)
+        if data is None:
+            return web.Response(status=404)
+        return web.Response(body=data, content_type="application/octet-stream")
@@ -0,0 +1,33 @@
+"""Затримка і штучні помилки для підмінних серверів."""
+
+import asyncio
+import random
+
+
+class Faults:
+    """
+    latency ± jitter секунд на кожен запит; з імовірністю error_rate запит
+    завершується помилкою (половина — 429 з retry_after, половина — 500).
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self.injected = 0
+
+    async def delay(self, extra=0.0):
+        value = self.latency + extra
+        if self.jitter:
+            value += self._random.uniform(-self.jitter, self.jitter)
+        if value > 0:
+            await asyncio.sleep(value)
+
+    def error(self):
+        """HTTP-статус штучної помилки (429 чи 500) або None."""
+        if not self.error_rate or self._random.random() >= self.error_rate:
+            return None
+        self.injected += 1
+        return 429 if self._random.random() < 0.5 else 500
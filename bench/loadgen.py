@@ -0,0 +1,232 @@
+"""
+Генератор трафіку: багато чатів одночасно надсилають текст, голос і фото.
+
+Кожен чат працює по замкненому циклу: надсилає повідомлення, чекає на
+першу відповідь бота, далі — поки чат не затихне на settle секунд
+(потокові відповіді редагуються кілька разів), і лише тоді надсилає
+наступне. Для кожного повідомлення записуються:
+  first — час до першої видимої відповіді (sendMessage/sendDocument/...);
+  full  — час до останньої відповіді чи редагування.
+Повідомлення без відповіді за timeout секунд рахуються як таймаути.
+"""
+
+import asyncio
+import io
+import random
+import time
+
+from bench.fake_telegram import FakeTelegram
+
+QUESTIONS = (
+    "Як зареєструватися в Jobcenter?",
+    "Які документи потрібні для Anmeldung?",
+    "Чи можу я отримати Kindergeld на двох дітей?",
+    "Як продовжити дозвіл на проживання §24?",
+    "Що робити, якщо прийшов лист від Finanzamt?",
+    "Як знайти курси німецької мови безкоштовно?",
+    "Скільки часу розглядають заяву на Bürgergeld?",
+    "Де отримати довідку про доходи для оренди житла?",
+)
+PHOTO_LINES = (
+    "Sehr geehrte Damen und Herren,",
+    "bitte reichen Sie die folgenden Unterlagen ein:",
+    "Mietvertrag, Kontoauszüge, Meldebescheinigung.",
+    "Frist: 14 Tage nach Erhalt dieses Schreibens.",
+    "Mit freundlichen Grüßen, Ihr Jobcenter",
+)
+
+
+def parse_mix(value):
+    """'text=0.7,voice=0.2,photo=0.1' -> {'text': 0.7, ...}"""
+    mix = {}
+    for item in value.split(","):
+        if "=" in item:
+            kind, weight = item.split("=", 1)
+            mix[kind.strip()] = float(weight)
+    unknown = set(mix) - {"text", "voice", "photo"}
+    if unknown:
+        raise ValueError(f"Невідомі типи повідомлень: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def render_photo(seed):
+    """PNG з "листом" німецькою; кожен seed дає інше зображення (інший перцептивний хеш)."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    image = Image.new("L", (1240, 1754), 255)
+    draw = ImageDraw.Draw(image)
+    y = rng.randint(80, 400)
+    for _ in range(rng.randint(6, 14)):
+        draw.text((rng.randint(80, 200), y), rng.choice(PHOTO_LINES), fill=0)
+        y += rng.randint(40, 90)
+    for _ in range(rng.randint(2, 6)):
+        x0, y0 = rng.randint(0, 1100), rng.randint(0, 1600)
+        draw.rectangle((x0, y0, x0 + rng.randint(20, 140), y0 + rng.randint(20, 140)), fill=rng.randint(0, 200))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class _Pending:
+    __slots__ = ("sent", "first", "last", "replied")
+
+    def __init__(self):
+        self.sent = time.monotonic()
+        self.first = None
+        self.last = None
+        self.replied = asyncio.Event()
+
+
+class LoadResult:
+    def __init__(self, variant):
+        self.variant = variant
+        self.first = {}  # тип -> [секунди]
+        self.full = {}
+        self.sent = 0
+        self.timeouts = 0
+        self.elapsed = 0.0
+
+    @property
+    def completed(self):
+        return sum(len(values) for values in self.full.values())
+
+    @property
+    def throughput(self):
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        first = [v for values in self.first.values() for v in values]
+        full = [v for values in self.full.values() for v in values]
+        result = {
+            "variant": self.variant,
+            "sent": self.sent,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "elapsed": round(self.elapsed, 3),
+            "msg_per_sec": round(self.throughput, 3),
+        }
+        for name, values in (("first", first), ("full", full)):
+            for q in (50, 95, 99):
+                result[f"{name}_p{q}"] = round(percentile(values, q), 4)
+        result["by_kind"] = {
+            kind: {
+                "count": len(values),
+                **{f"full_p{q}": round(percentile(values, q), 4) for q in (50, 95, 99)},
+            }
+            for kind, values in self.full.items()
+        }
+        return result
+
+
+class LoadGenerator:
+    def __init__(
+        self,
+        telegram: FakeTelegram,
+        chats=20,
+        messages=10,
+        mix=None,
+        repeat=0.1,
+        think_time=0.0,
+        settle=1.5,
+        timeout=60.0,
+        seed=1,
+    ):
+        self.telegram = telegram
+        self.chats = chats
+        self.messages = messages
+        self.mix = mix or {"text": 0.7, "voice": 0.2, "photo": 0.1}
+        self.repeat = repeat
+        self.think_time = think_time
+        self.settle = settle
+        self.timeout = timeout
+        self.seed = seed
+        self._photo_cache = {}
+
+    def _photo(self, seed):
+        # Малювання в пам'яті дешеве, але 10 000 однакових PNG не потрібні
+        if seed not in self._photo_cache:
+            self._photo_cache[seed] = render_photo(seed)
+        return self._photo_cache[seed]
+
+    def _content(self, rng, chat_id, n, history):
+        kinds = list(self.mix)
+        kind = rng.choices(kinds, weights=[self.mix[k] for k in kinds])[0]
+        # Повтор: той самий текст або той самий файл (як переслане повідомлення)
+        previous = history.get(kind)
+        if previous is not None and rng.random() < self.repeat:
+            return kind, previous
+        if kind == "text":
+            content = {"text": f"{rng.choice(QUESTIONS)} (№{chat_id}-{n})"}
+        elif kind == "voice":
+            file_id = f"voice-{chat_id}-{n}"
+            self.telegram.add_file(file_id, rng.randbytes(rng.randint(8_000, 60_000)))
+            content = {"voice": {
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "duration": rng.randint(3, 30),
+                "mime_type": "audio/ogg",
+            }}
+        else:
+            file_id = f"photo-{chat_id}-{n}"
+            self.telegram.add_file(file_id, self._photo(rng.randint(0, 199)))
+            content = {"photo": [
+                {"file_id": file_id + "-s", "file_unique_id": file_id + "-s", "width": 90, "height": 128},
+                {"file_id": file_id, "file_unique_id": file_id, "width": 1240, "height": 1754},
+            ]}
+        history[kind] = content
+        return kind, content
+
+    async def _chat(self, chat_id, result):
+        rng = random.Random(self.seed * 1_000_003 + chat_id)
+        history = {}
+        pending = None
+
+        def on_reply(method, data, timestamp):
+            if pending is None:
+                return
+            if pending.first is None:
+                pending.first = timestamp
+            pending.last = timestamp
+            pending.replied.set()
+
+        self.telegram.listen(chat_id, on_reply)
+        for n in range(self.messages):
+            kind, content = self._content(rng, chat_id, n, history)
+            pending = _Pending()
+            self.telegram.push_message(chat_id, **content)
+            result.sent += 1
+            try:
+                await asyncio.wait_for(pending.replied.wait(), self.timeout)
+            except asyncio.TimeoutError:
+                result.timeouts += 1
+                pending = None
+                continue
+            # Чекаємо, поки бот не допише відповідь (редагування, кілька повідомлень)
+            while True:
+                pending.replied.clear()
+                try:
+                    await asyncio.wait_for(pending.replied.wait(), self.settle)
+                except asyncio.TimeoutError:
+                    break
+            result.first.setdefault(kind, []).append(pending.first - pending.sent)
+            result.full.setdefault(kind, []).append(pending.last - pending.sent)
+            pending = None
+            if self.think_time:
+                await asyncio.sleep(rng.expovariate(1 / self.think_time))
+
+    async def run(self, variant):
+        result = LoadResult(variant)
+        started = time.monotonic()
+        await asyncio.gather(*(self._chat(100_000 + i, result) for i in range(self.chats)))
+        # Останнє очікування settle кожного чату не входить у час роботи
+        result.elapsed = max(time.monotonic() - started - self.settle, 1e-9)
+        return result
@@ -0,0 +1,98 @@
+"""
+Холодний старт і пам'ять: python -m bench.startup --variants bot2,brama
+
+Кожна версія запускається runs разів проти підмінних серверів. Час
+старту — від запуску процесу до першого getUpdates (бот готовий приймати
+оновлення). RSS знімається в цей момент і ще раз через settle секунд
+(коли фонове підвантаження модулів у brama вже завершилось), а також
+після першого текстового повідомлення (завантажено клієнт OpenAI).
+Лише Linux: RSS читається з /proc/<pid>/status.
+"""
+
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from bench.__main__ import VARIANTS, bot_env, start_variant, stop_process, wait_ready
+from bench.fake_openai import FakeOpenAI
+from bench.fake_telegram import FakeTelegram
+
+CHAT_ID = 4242
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status", encoding="ascii") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+async def _first_reply(telegram, timeout=30):
+    replied = asyncio.Event()
+    telegram.listen(CHAT_ID, lambda method, data, timestamp: replied.set())
+    started = time.monotonic()
+    telegram.push_message(CHAT_ID, text="Як зареєструватися в Jobcenter?")
+    await asyncio.wait_for(replied.wait(), timeout)
+    return time.monotonic() - started
+
+
+async def measure(variant, telegram, openai_server, extra_env, settle, log_dir):
+    telegram.reset()
+    workdir = tempfile.mkdtemp(prefix=f"startup-{variant}-")
+    log_path = Path(log_dir) / f"{variant}.log"
+    with open(log_path, "ab") as log_file:
+        started = time.monotonic()
+        process = await start_variant(variant, bot_env(extra_env, telegram, openai_server), workdir, log_file)
+        try:
+            await wait_ready(variant, process, telegram, log_path)
+            result = {"start": time.monotonic() - started, "rss_ready": rss_mb(process.pid)}
+            await asyncio.sleep(settle)
+            result["rss_idle"] = rss_mb(process.pid)
+            result["first_reply"] = await _first_reply(telegram)
+            await asyncio.sleep(0.5)
+            result["rss_after_reply"] = rss_mb(process.pid)
+        finally:
+            await stop_process(process)
+    return result
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.startup", description="Холодний старт і RSS версій бота")
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--settle", type=float, default=3.0, help="пауза перед другим замірем RSS, с")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE")
+    args = parser.parse_args(argv)
+
+    telegram = FakeTelegram()
+    openai_server = FakeOpenAI(tokens=5, token_interval=0.0)
+    await telegram.start()
+    await openai_server.start()
+    log_dir = tempfile.mkdtemp(prefix="startup-logs-")
+    columns = ("start", "rss_ready", "rss_idle", "first_reply", "rss_after_reply")
+    rows = []
+    try:
+        for variant in [v.strip() for v in args.variants.split(",") if v.strip()]:
+            runs = [
+                await measure(variant, telegram, openai_server, args.env, args.settle, log_dir)
+                for _ in range(args.runs)
+            ]
+            rows.append([variant] + [f"{statistics.median(r[c] for r in runs):.2f}" for c in columns])
+    finally:
+        await telegram.stop()
+        await openai_server.stop()
+
+    header = ["variant", "start_s", "rss_ready_mb", "rss_idle_mb", "first_reply_s", "rss_reply_mb"]
+    widths = [max(len(h), *(len(r[i]) for r in rows)) for i, h in enumerate(header)]
+    print("  ".join(h.ljust(w) for h, w in zip(header, widths)))
+    for row in rows:
+        print("  ".join(v.ljust(w) for v, w in zip(row, widths)))
+    print(f"(медіана з {args.runs} запусків; логи: {log_dir})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
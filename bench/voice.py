@@ -0,0 +1,79 @@
+"""
+Довгі голосові: python -m bench.voice --duration 300 --concurrency 0,1,2,4,8
+
+Синтезує запис, схожий на мову (фрази 2–8 с з паузами 0.25–1.2 с), і
+розпізнає його через brama.transcription.Transcriber проти підмінного
+Whisper, тривалість відповіді якого залежить від довжини запису
+(--whisper-rtf). Concurrency 0 — весь запис одним запитом, як раніше.
+Потрібні numpy і PyAV.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from io import BytesIO
+
+import numpy as np
+import openai
+
+from bench.fake_openai import FakeOpenAI
+from brama.llm_client import LLMClient
+from brama.transcription import SAMPLE_RATE, Transcriber, encode
+
+
+def speech_like(duration, seed=1):
+    """Тональні «фрази» з амплітудною модуляцією, розділені паузами з тихим шумом."""
+    rng = np.random.default_rng(seed)
+    parts = [np.zeros(SAMPLE_RATE, dtype=np.float32)]
+    total = 0
+    while total < duration * SAMPLE_RATE:
+        t = np.arange(int(rng.uniform(2, 8) * SAMPLE_RATE)) / SAMPLE_RATE
+        phrase = 0.3 * np.sin(2 * np.pi * rng.uniform(120, 300) * t) * (0.6 + 0.4 * np.sin(2 * np.pi * 4 * t))
+        pause = rng.normal(0, 0.001, int(rng.uniform(0.25, 1.2) * SAMPLE_RATE))
+        parts += [phrase.astype(np.float32), pause.astype(np.float32)]
+        total += len(phrase) + len(pause)
+    return np.concatenate(parts)
+
+
+async def measure(llm, data, concurrency, runs):
+    transcriber = Transcriber(llm, concurrency=concurrency)
+    timings = []
+    for _ in range(runs):
+        audio = BytesIO(data)
+        audio.name = "audio.ogg"
+        started = time.monotonic()
+        await transcriber.transcribe(audio)
+        timings.append(time.monotonic() - started)
+    return statistics.median(timings)
+
+
+async def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.voice", description="Затримка розпізнавання довгих голосових")
+    parser.add_argument("--duration", type=float, default=300, help="тривалість запису, с")
+    parser.add_argument("--concurrency", default="0,1,2,4,8", help="значення VOICE_CONCURRENCY через кому")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--whisper-latency", type=float, default=0.5, help="постійна частина затримки Whisper, с")
+    parser.add_argument("--whisper-rtf", type=float, default=0.05, help="секунд затримки на секунду запису")
+    args = parser.parse_args(argv)
+
+    data = encode(speech_like(args.duration), "audio.ogg").getvalue()
+    server = FakeOpenAI(whisper_latency=args.whisper_latency, whisper_rtf=args.whisper_rtf)
+    await server.start()
+    openai.api_base = server.api_base
+    llm = LLMClient(api_key="bench")
+    print(f"запис {args.duration:.0f} с, {len(data) / 1024:.0f} КБ")
+    try:
+        for value in (int(v) for v in args.concurrency.split(",") if v.strip()):
+            server.reset()
+            seconds = await measure(llm, data, value, args.runs)
+            requests = server.calls.get("transcription", 0) // args.runs
+            print(f"concurrency={value}: {seconds:.2f} с, запитів до Whisper: {requests}")
+    finally:
+        await llm.close()
+        await server.stop()
+    print(f"(медіана з {args.runs} запусків)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,40 +1,67 @@
 import os
 import openai
-import pytesseract
-import requests
-
-from io import BytesIO
-from PIL import Image, ImageOps, ImageEnhance
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
 
 from datetime import datetime
 from dotenv import load_dotenv
-from telegram import Update, InputFile
+from telegram import Update
 from telegram.ext import (
-    Application,
     CommandHandler,
     MessageHandler,
     filters,
     ContextTypes
 )
 
+# .env читається до імпорту модулів brama: вони беруть налаштування з оточення при імпорті
+load_dotenv()
+
+from brama.answer_cache import AnswerCache
+from brama.intent import CREATE_PDF, classify
+from brama.llm_client import LLMClient
+from brama.log import log_event, setup_logging
+from brama.outbound import OutboundLimiter
+from brama.scheduler import ChatScheduler
+from brama.serving import application_builder, run_application
+from brama.pdf_renderer import PDFRenderer
+from brama.media_cache import MediaCache
+from brama.media_fetch import MEDIA_MAX_VOICE_BYTES, MediaFetcher
+from brama.transcription import Transcriber
+from brama.streaming_reply import STREAM_REPLIES, reply_long_text, stream_reply
+
 import logging
 
-logging.basicConfig(level=logging.INFO)
+# Логи пишуться у фоновому потоці через чергу (див. brama/log.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
-# --------------------- Завантаження змінних середовища ---------------------
-load_dotenv()
-
+# --------------------- Змінні середовища ---------------------
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ASSISTANT_MODEL = os.getenv("ASSISTANT_ID", "gpt-4")
 openai.api_key = OPENAI_API_KEY
 
-# --------------------- Налаштування шляху до Tesseract ---------------------
-pytesseract.pytesseract.tesseract_cmd = r"C:\Users\ПК\брама-юа-бот\appp\app\tesseract\tesseract.exe"
-os.environ["TESSDATA_PREFIX"] = r"C:\Users\ПК\брама-юа-бот\appp\app\tesseract\tessdata"
+# Спільний асинхронний клієнт OpenAI (пул з'єднань, ліміт паралельності, таймаути)
+llm = LLMClient(api_key=OPENAI_API_KEY, model=ASSISTANT_MODEL)
+
+# Кеш відповідей: запити тут без історії, тож однакові питання дають однаковий промпт
+answer_cache = AnswerCache()
+
+# Кеш розпізнаних голосових і фото за file_unique_id (пересланий файл не розпізнається вдруге)
+media_cache = MediaCache()
+
+# Потокове завантаження голосових і фото з лімітом розміру (замість download_as_bytearray)
+media_fetcher = MediaFetcher()
+
+# Довгі голосові розпізнаються частинами (по паузах) паралельно
+transcriber = Transcriber(llm)
+
+# Вихідні повідомлення: ліміти Telegram (на чат і загалом), черга на кожен чат
+outbound = OutboundLimiter()
+
+# Повідомлення одного чату — по черзі, різних чатів — паралельно (окремі смуги для тексту, голосу, фото)
+scheduler = ChatScheduler(outbound=outbound)
+
+# Генерація PDF (шрифт з кирилицею, перенос рядків) в окремих процесах
+pdf_renderer = PDFRenderer()
 
 # --------------------- Інші константи та глобальні змінні ---------------------
 SYSTEM_INSTRUCTIONS = """Ви Асистент працюєте від неприбуткової організації Brama-UA e.V.
@@ -43,117 +70,118 @@ SYSTEM_INSTRUCTIONS = """Ви Асистент працюєте від непр
 """
 
 # --------------------- Головний обробник ---------------------
+@scheduler.handler()
 async def universal_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    print("[INFO] Обробка повідомлення почалася.")
     chat_id = update.effective_chat.id
 
     if update.message.text:
-        print("[INFO] Отримано текстове повідомлення.")
+        log_event(logger, "message_received", chat_id=chat_id, kind="text")
         user_msg = update.message.text
         await process_text_message(user_msg, chat_id, update, context)
 
     elif update.message.photo:
-        print("[INFO] Отримано фото.")
+        log_event(logger, "message_received", chat_id=chat_id, kind="photo")
         await update.message.reply_text("Обробка фото поки що не працює коректно. Надішліть, будь ласка, текст чи голосове повідомлення.")
 
     elif update.message.voice:
-        print("[INFO] Отримано голосове повідомлення.")
+        log_event(logger, "message_received", chat_id=chat_id, kind="voice")
         await process_voice_message(update, context)
 
     else:
-        print("[INFO] Невідомий формат повідомлення.")
+        log_event(logger, "message_received", chat_id=chat_id, kind="unknown")
         await update.message.reply_text("Невідомий формат повідомлення. Надішліть текст або голосове повідомлення.")
 
 # --------------------- Обробка текстових повідомлень ---------------------
 async def process_text_message(user_msg, chat_id, update, context):
-    print(f"[INFO] Обробка текстового повідомлення: {user_msg}")
+    log_event(logger, "text_message", chat_id=chat_id, text=user_msg)
+
+    # Прохання створити PDF розпізнається до запиту в OpenAI: готовий текст
+    # («створи PDF: ...») одразу йде у PDF, інакше документом стає відповідь моделі
+    intent = classify(user_msg, {CREATE_PDF})
+    as_pdf = intent.name == CREATE_PDF
+    if as_pdf:
+        log_event(logger, "pdf_intent", chat_id=chat_id, source=intent.source)
+        if intent.argument:
+            await generate_pdf_from_ai(intent.argument, update)
+            return
+
     try:
-        print("[INFO] Надсилання запиту до OpenAI.")
-        response = openai.ChatCompletion.create(
-            model=ASSISTANT_MODEL,
-            messages=[{"role": "system", "content": SYSTEM_INSTRUCTIONS}, {"role": "user", "content": user_msg}],
-            temperature=0.7
+        log_event(logger, "openai_request", logging.DEBUG, chat_id=chat_id)
+        messages = [{"role": "system", "content": SYSTEM_INSTRUCTIONS}, {"role": "user", "content": user_msg}]
+        streamed = False
+
+        async def ask_openai():
+            nonlocal streamed
+            if as_pdf or not STREAM_REPLIES:
+                return await llm.chat(messages, temperature=0.7)
+            # Відповідь показується користувачу в міру надходження
+            streamed = True
+            return await stream_reply(update.message, llm.stream_chat(messages, temperature=0.7))
+
+        assistant_reply = await answer_cache.get_or_create(
+            ASSISTANT_MODEL, SYSTEM_INSTRUCTIONS, user_msg, ask_openai
         )
-        assistant_reply = response.choices[0].message.content
-        print(f"[INFO] Отримано відповідь від OpenAI: {assistant_reply}")
+        log_event(logger, "openai_reply", chat_id=chat_id, reply=assistant_reply)
 
-        # Перевірка, чи потрібно створити PDF
-        if "створити PDF" in assistant_reply.lower():
-            print("[INFO] Виявлено запит на створення PDF.")
+        if as_pdf:
             await generate_pdf_from_ai(assistant_reply, update)
-        else:
-            await update.message.reply_text(assistant_reply)
+        elif not streamed:
+            await reply_long_text(update.message, assistant_reply)
 
     except Exception as e:
         logger.error(f"Помилка OpenAI: {e}")
-        print(f"[ERROR] Помилка OpenAI: {e}")
         await update.message.reply_text("Вибачте, сталася помилка при обробці вашого запиту.")
 
 # --------------------- Створення PDF ---------------------
 async def generate_pdf_from_ai(content, update):
-    print("[INFO] Початок створення PDF.")
-    pdf_buffer = BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
-    c.drawString(50, 800, "Згенерований PDF:")
-
-    # Розбиваємо текст на рядки для кращого форматування
-    y_position = 780
-    line_height = 12
-    for line in content.split("\n"):
-        c.drawString(50, y_position, line)
-        y_position -= line_height
-        if y_position < 50:  # Нова сторінка, якщо бракує місця
-            c.showPage()
-            y_position = 780
-
-    c.save()
-    pdf_buffer.seek(0)
+    # Верстка з переносом рядків і розбиттям на сторінки — у процесі pdf_renderer
+    pdf_bytes = await pdf_renderer.render(content, title="Згенерований PDF:")
 
     pdf_name = f"generated_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    print(f"[INFO] PDF створено: {pdf_name}")
-    await update.message.reply_document(document=pdf_buffer, filename=pdf_name)
+    log_event(logger, "pdf_created", chat_id=update.effective_chat.id, filename=pdf_name)
+    await update.message.reply_document(document=pdf_bytes, filename=pdf_name)
 
 # --------------------- Обробка голосових повідомлень ---------------------
 async def process_voice_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    print("[INFO] Початок обробки голосового повідомлення.")
     try:
         voice = update.message.voice
-        file_id = voice.file_id
-        new_file = await context.bot.get_file(file_id)
-        file_data = await new_file.download_as_bytearray()
-
-        audio_buffer = BytesIO(file_data)
-        audio_buffer.name = "audio.ogg"
-
-        print("[INFO] Використання Whisper для розпізнавання голосу.")
-        transcript = openai.Audio.transcribe(
-            model="whisper-1",
-            file=audio_buffer,
-            language="uk"
-        )
-        text_result = transcript["text"]
-
-        print(f"[INFO] Whisper успішно розпізнав текст: {text_result}")
+        # Те саме голосове (наприклад, переслане) вже розпізнавали — не завантажуємо його
+        text_result = await media_cache.get("voice:uk", voice.file_unique_id)
+        if text_result is None:
+            # Файл читається потоком (з лімітом розміру) і йде у Whisper без копій
+            with await media_fetcher.fetch(context.bot, voice, MEDIA_MAX_VOICE_BYTES, "audio.ogg") as media:
+                log_event(logger, "whisper_request", logging.DEBUG, chat_id=update.effective_chat.id)
+                text_result = await transcriber.transcribe(media.open(), language="uk", duration=voice.duration)
+            if text_result.strip():
+                await media_cache.put("voice:uk", voice.file_unique_id, text_result)
+
+        log_event(logger, "voice_transcribed", chat_id=update.effective_chat.id, text=text_result)
         await process_text_message(text_result, update.effective_chat.id, update, context)
 
     except Exception as e:
         logger.error(f"Помилка при транскрипції голосу: {e}")
-        print(f"[ERROR] Помилка транскрипції: {e}")
         await update.message.reply_text("Не вдалося розпізнати голосове повідомлення.")
 
 # --------------------- Запуск бота ---------------------
-def main():
-    print("[INFO] Запуск бота.")
-    if not TELEGRAM_TOKEN:
-        raise ValueError("У .env не задано TELEGRAM_TOKEN")
+async def on_shutdown(application):
+    await llm.close()
+    await media_fetcher.close()
+    pdf_renderer.shutdown()
+    media_cache.close()
 
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+def build_application():
+    application = application_builder(TELEGRAM_TOKEN).rate_limiter(outbound).post_shutdown(on_shutdown).build()
 
     application.add_handler(MessageHandler(filters.ALL, universal_handler))
+    return application
+
+
+def main():
+    if not TELEGRAM_TOKEN:
+        raise ValueError("У .env не задано TELEGRAM_TOKEN")
 
     logger.info("Бот запущено... Натисніть Ctrl+C для зупинки.")
-    print("[INFO] Бот запущено. Чекаємо на повідомлення.")
-    application.run_polling()
+    run_application(build_application, TELEGRAM_TOKEN)
 
 if __name__ == "__main__":
     main()
@@ -2,37 +2,54 @@
 import os
 import openai
 import pytesseract
-import requests
-
-from io import BytesIO
-from PIL import Image
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
 
 from datetime import datetime
 from dotenv import load_dotenv
-from telegram import Update, InputFile
+from telegram import Update
 from telegram.ext import (
-    Application,
     CommandHandler,
     MessageHandler,
     filters,
     ContextTypes
 )
 
+# .env читається до імпорту модулів brama: вони беруть налаштування з оточення при імпорті
+load_dotenv()
+
+from brama.file_id_cache import FileIdCache
+from brama.history import ChatHistory
+from brama.history_store import create_history_backend
+from brama.llm_client import LLMClient
+from brama.log import log_event, setup_logging
+from brama.outbound import OutboundLimiter
+from brama.scheduler import ChatScheduler
+from brama.serving import application_builder, run_application
+from brama.pdf_renderer import PDFRenderer
+from brama.media_cache import MediaCache
+from brama.media_fetch import MEDIA_MAX_PHOTO_BYTES, MEDIA_MAX_VOICE_BYTES, MediaFetcher, pick_photo
+from brama.media_group import MediaGroupCollector, join_pages, recognize_pages
+from brama.transcription import Transcriber
+from brama.streaming_reply import STREAM_REPLIES, reply_long_text, stream_reply
+from brama.ocr_engine import OCREngine
+from brama.pdf_catalog import PDFCatalog
+from brama.doc_index import DocumentIndex
+from brama.prompts import build_system_prompt, load_system_prompt
+
 import logging
 
-logging.basicConfig(level=logging.INFO)
+# Логи пишуться у фоновому потоці через чергу (див. brama/log.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
-# --------------------- Завантаження змінних середовища ---------------------
-load_dotenv()
-
+# --------------------- Змінні середовища ---------------------
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ASSISTANT_MODEL = os.getenv("ASSISTANT_ID", "gpt-3.5-turbo")  # Наприклад "gpt-4"
 openai.api_key = OPENAI_API_KEY
 
+# Спільний асинхронний клієнт OpenAI (пул з'єднань, ліміт паралельності, таймаути)
+llm = LLMClient(api_key=OPENAI_API_KEY, model=ASSISTANT_MODEL)
+
 # --------------------- Налаштування шляху до Tesseract ---------------------
 # Припустимо, що ви скопіювали портативний Tesseract у папку:
 # C:\Users\ПК\брама-юа-бот\appp\app\tesseract\tesseract.exe
@@ -41,62 +58,60 @@ pytesseract.pytesseract.tesseract_cmd = r"C:\Users\ПК\брама-юа-бот\a
 
 # Якщо Tesseract.exe лежить у іншому місці, змініть шлях у рядку вище.
 
+# Пул процесів для OCR, щоб Tesseract не блокував інші чати
+ocr = OCREngine(tesseract_cmd=pytesseract.pytesseract.tesseract_cmd)
+
+# Кеш розпізнаних голосових і фото за file_unique_id (пересланий файл не розпізнається вдруге)
+media_cache = MediaCache()
+
+# Потокове завантаження голосових і фото з лімітом розміру (замість download_as_bytearray)
+media_fetcher = MediaFetcher()
+
+# Довгі голосові розпізнаються частинами (по паузах) паралельно
+transcriber = Transcriber(llm)
+
+# Фото одного альбому (багатосторінковий лист) обробляються разом
+media_groups = MediaGroupCollector()
+
 
 # --------------------- Інші константи та глобальні змінні ---------------------
 
 # Папка для PDF-файлів (де шукаємо готові pdf)
 PDF_FOLDER = "pdf_files"
 
-# Системне повідомлення (довгі інструкції)
-SYSTEM_INSTRUCTIONS = """Ви  Асистент працюєте від неприбуткової організації Brama-UA e.V.
-
-Відповідайте завжди на тій мові, на якій до Вас звернулись. Організація допомагає українцям у Німеччині інтегруватися в суспільство. Ассистент має доступ до файлів у векторному магазині та повинен консультувати тих, хто звертається за консультацією чи допомогою.
-
-Ассистент також шукає інформацію на наступних ресурсах для надання актуальних консультацій:
-- [Jobcenter Digital](https://www.jobcenter-digital.de)
-- [Agentur für Arbeit](https://www.arbeitsagentur.de)
-- [Gründenplattform.de](https://gruendenplattform.de)
-
-Ассистент повинен завжди відповідати користувачам на тій мові, на якій до нього звертаються.
-
-### Алгоритм пошуку інформації:
-1. Визначення теми запиту: Ассистент аналізує ключові слова та тему запиту користувача. Якщо потрібно — ставить уточнюючі запитання.
-2. Формулювання пошукового запиту: Створює релевантний пошуковий запит із зазначенням ключових слів та уточнень.
-3. Вибір джерела: Обирає ресурс для пошуку інформації (Jobcenter Digital, Agentur für Arbeit, Gründenplattform.de).
-4. Пошук інформації: Використовує внутрішній інструмент для пошуку на зазначених сайтах.
-5. Обробка результатів: Відбирає найбільш релевантні дані (посилання на сторінки, текстові витяги, файли чи документи).
-
-### Формат надання результатів:
-- Посилання: Пряме посилання на відповідну сторінку з коротким описом.
-- Текстовий витяг: Короткий текст із основною інформацією.
-- Файл або документ: Якщо знайдено релевантний файл, надається його посилання для завантаження.
-- Рекомендації: У разі необхідності, додаткові пояснення чи пропозиції щодо подальших дій.
-
-### Додаткові функції:
-1. Пошук і завантаження PDF-файлів:
-   - Ассистент може шукати необхідні бланки чи документи у форматі PDF.
-   - Після пошуку файл надається користувачеві як посилання для завантаження або надсилається безпосередньо через Telegram.
-2. Надсилання PDF-файлів:
-   - За запитом користувача Ассистент може надіслати необхідний PDF-файл у Telegram як документ.
-3. Обробка голосових повідомлень:
-   - Ассистент приймає голосові повідомлення від користувачів через Telegram.
-   - Використовує OpenAI Whisper API для перетворення голосу в текст.
-   - Отриманий текст обробляється як звичайний запит, на який Асистент надає відповідь.
-4. Обробка фото документу:
-   - Ассистент приймає фото листа чи документа, аналізує зміст, пояснює на мові, якою звернулись, і дає поради згідно законодавства.
-"""
-
-# Історія спілкування з користувачами
-user_history = {}
+# Індекс PDF-файлів у пам'яті (будується при запуску, оновлюється у фоні)
+pdf_catalog = PDFCatalog(PDF_FOLDER)
+
+# file_id уже надісланих PDF, щоб не завантажувати ті самі байти повторно
+file_id_cache = FileIdCache()
+
+# Генерація PDF (шрифт з кирилицею, перенос рядків) в окремих процесах
+pdf_renderer = PDFRenderer()
+
+# Вихідні повідомлення: ліміти Telegram (на чат і загалом), черга на кожен чат
+outbound = OutboundLimiter()
+
+# Повідомлення одного чату — по черзі, різних чатів — паралельно (окремі смуги для тексту, голосу, фото)
+scheduler = ChatScheduler(outbound=outbound)
+
+# Пошук по тексту PDF: у промпт іде короткий базовий текст і фрагменти, знайдені для питання
+doc_index = DocumentIndex(PDF_FOLDER)
+CORE_PROMPT = load_system_prompt()  # Вбудований базовий промпт або SYSTEM_PROMPT_FILE
+
+# Історія спілкування з користувачами (бюджет токенів на чат + LRU за кількістю чатів,
+# зберігається у SQLite, щоб переживати перезапуск)
+user_history = ChatHistory(model=ASSISTANT_MODEL, backend=create_history_backend())
 
 
 # --------------------- Обробники команд ---------------------
 
+@scheduler.handler("text")
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "Вітаю! Я Асистент Brama-UA. Напишіть чи надішліть щось, і я спробую допомогти."
     )
 
+@scheduler.handler("text")
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     help_text = (
         "Доступні команди:\n"
@@ -111,70 +126,70 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # --------------------- Обробка текстових повідомлень ---------------------
 
+@scheduler.handler("text")
 async def handle_text_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обробка звичайних текстових повідомлень (без команд)."""
-    chat_id = update.effective_chat.id
-    user_msg = update.message.text
+    await process_text(update, update.message.text)
 
-    if chat_id not in user_history:
-        user_history[chat_id] = []
+
+async def process_text(update: Update, user_msg):
+    """Відповідь на текст (з повідомлення, голосового чи фото) з урахуванням історії чату."""
+    chat_id = update.effective_chat.id
 
     # Додаємо повідомлення користувача
-    user_history[chat_id].append({"role": "user", "content": user_msg})
+    await user_history.append(chat_id, "user", user_msg)
 
     # Формуємо список для ChatCompletion
-    messages = [{"role": "system", "content": SYSTEM_INSTRUCTIONS}]
-    messages += user_history[chat_id]
+    messages = [{"role": "system", "content": build_system_prompt(doc_index.search(user_msg), CORE_PROMPT)}]
+    messages += user_history.messages(chat_id)
 
     try:
-        response = openai.ChatCompletion.create(
-            model=ASSISTANT_MODEL,
-            messages=messages,
-            temperature=0.7
-        )
-        assistant_reply = response.choices[0].message.content
+        if STREAM_REPLIES:
+            # Відповідь показується користувачу в міру надходження
+            assistant_reply = await stream_reply(update.message, llm.stream_chat(messages, temperature=0.7))
+        else:
+            assistant_reply = await llm.chat(messages, temperature=0.7)
+            await reply_long_text(update.message, assistant_reply)
     except Exception as e:
         logger.error(f"Помилка OpenAI: {e}")
         assistant_reply = "Вибачте, сталася помилка при отриманні відповіді."
+        await update.message.reply_text(assistant_reply)
 
     # Додаємо відповідь асистента до історії
-    user_history[chat_id].append({"role": "assistant", "content": assistant_reply})
-
-    await update.message.reply_text(assistant_reply)
+    await user_history.append(chat_id, "assistant", assistant_reply)
 
 
 # --------------------- Пошук і відправлення PDF ---------------------
 
+@scheduler.handler("media")
 async def findpdf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Пошук PDF-файлу за назвою у папці PDF_FOLDER та надсилання."""
     if not context.args:
         await update.message.reply_text("Синтаксис: /findpdf <назва файлу>")
         return
-    filename_query = context.args[0]
-
-    found_files = []
-    if os.path.exists(PDF_FOLDER):
-        for f in os.listdir(PDF_FOLDER):
-            if f.lower().endswith(".pdf") and filename_query.lower() in f.lower():
-                found_files.append(f)
-    
+    filename_query = " ".join(context.args)
+
+    # Пошук по індексу: найрелевантніші файли, не більше PDF_MAX_RESULTS
+    found_files = pdf_catalog.search(filename_query)
+
     if not found_files:
         await update.message.reply_text(
             f"Не знайдено PDF із назвою, що містить: {filename_query}"
         )
     else:
+        # Один список замість окремого повідомлення перед кожним файлом
+        names = "\n".join(f"• {f.name}" for f in found_files)
+        await outbound.reply_text(update.message, f"Знайдено файли:\n{names}\nНадсилаю...")
         for f in found_files:
-            file_path = os.path.join(PDF_FOLDER, f)
-            await update.message.reply_text(f"Знайдено файл: {f}\nНадсилаю...")
             try:
-                with open(file_path, 'rb') as doc:
-                    await update.message.reply_document(document=doc)
+                await file_id_cache.send_document(update.message, f.path, f.name, f.size, f.mtime)
             except Exception as e:
-                await update.message.reply_text(f"Помилка при відправці файлу {f}: {e}")
+                await update.message.reply_text(f"Помилка при відправці файлу {f.name}: {e}")
 
 
 # --------------------- Створення PDF ---------------------
 
+@scheduler.handler("media")
 async def createpdf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Створення PDF з указаним текстом та надсилання."""
     user_text = " ".join(context.args)  # все, що йде після команди
@@ -182,22 +197,17 @@ async def createpdf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Синтаксис: /createpdf <текст для PDF>")
         return
 
-    # Створюємо PDF у пам'яті
-    pdf_buffer = BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
-    c.drawString(50, 800, "Створений PDF-файл:")
-    c.drawString(50, 780, user_text)
-    c.showPage()
-    c.save()
-    pdf_buffer.seek(0)
+    # Створюємо PDF у пам'яті (в окремому процесі)
+    pdf_bytes = await pdf_renderer.render(user_text, title="Створений PDF-файл:")
 
     # Відправляємо PDF як документ
     pdf_name = f"created_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    await update.message.reply_document(document=pdf_buffer, filename=pdf_name)
+    await update.message.reply_document(document=pdf_bytes, filename=pdf_name)
 
 
 # --------------------- Обробка голосових повідомлень (Whisper) ---------------------
 
+@scheduler.handler("voice")
 async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Обробка голосового повідомлення.
@@ -206,28 +216,23 @@ async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYP
     3. Додаємо транскрибований текст до handle_text_message.
     """
     voice = update.message.voice
-    file_id = voice.file_id
-    new_file = await context.bot.get_file(file_id)
-    file_data = await new_file.download_as_bytearray()
 
     try:
-        # Зберігаємо у тимчасовий буфер
-        audio_buffer = BytesIO(file_data)
-        audio_buffer.name = "audio.ogg"
-
-        # Використовуємо Whisper API
-        transcript = openai.Audio.transcribe(
-            model="whisper-1",
-            file=audio_buffer,
-            language="uk"  # Або "en", "de" тощо
-        )
-        text_result = transcript["text"]
-
-        await update.message.reply_text(f"Розпізнаний текст: {text_result}")
+        # Те саме голосове (наприклад, переслане) вже розпізнавали — не завантажуємо його
+        text_result = await media_cache.get("voice:uk", voice.file_unique_id)
+        if text_result is None:
+            # Файл читається потоком (з лімітом розміру) і йде у Whisper без копій
+            with await media_fetcher.fetch(context.bot, voice, MEDIA_MAX_VOICE_BYTES, "audio.ogg") as media:
+                # Використовуємо Whisper API
+                text_result = await transcriber.transcribe(media.open(), language="uk", duration=voice.duration)  # Або "en", "de" тощо
+            if text_result.strip():
+                await media_cache.put("voice:uk", voice.file_unique_id, text_result)
+
+        await outbound.reply_text(update.message, f"Розпізнаний текст: {text_result}")
 
         # Далі обробляємо цей текст, як звичайне текстове повідомлення
-        update.message.text = text_result
-        await handle_text_message(update, context)
+        # (Message у PTB 20 незмінний, тому текст передається окремо)
+        await process_text(update, text_result)
 
     except Exception as e:
         logger.error(f"Помилка при транскрипції голосу: {e}")
@@ -242,31 +247,46 @@ async def handle_photo_message(update: Update, context: ContextTypes.DEFAULT_TYP
     Використовуємо pytesseract (локальний OCR).
     Якщо у вас був би GPT-4 with Vision, тоді був би інший механізм.
     """
-    photos = update.message.photo
-    if not photos:
+    if not update.message.photo:
         return
-
-    photo = photos[-1]  # Беремо найбільшу за розміром
-    file_id = photo.file_id
-    new_file = await context.bot.get_file(file_id)
-    file_data = await new_file.download_as_bytearray()
-
+    # Сторінки альбому збираються до планувальника, далі обробляються одним завданням
+    pages = await media_groups.collect(update.message)
+    if pages is not None:
+        await process_photos(update, context, pages)
+
+
+async def recognize_page(message, context):
+    # Найменший розмір, якого досить для OCR (а не найбільший)
+    photo = pick_photo(message.photo)
+
+    # Кеш за file_unique_id: при збігу фото не завантажується
+    text_result = await media_cache.get("ocr:ukr+eng,deu", photo.file_unique_id)
+    if text_result is None:
+        with await media_fetcher.fetch(context.bot, photo, MEDIA_MAX_PHOTO_BYTES, "photo.jpg") as media:
+            # Мова (українська + англійська чи німецька) обирається за мініатюрою фото;
+            # OCR виконується у пулі процесів
+            text_result, plan = await ocr.recognize(media.view(), langs=("ukr+eng", "deu"), psm_modes=(3,))
+            log_event(logger, "ocr_plan", chat_id=message.chat_id, lang=plan.lang, psm=plan.psm,
+                      confidence=round(plan.confidence), source=plan.source, full_passes=plan.full_passes)
+        if text_result.strip():
+            await media_cache.put("ocr:ukr+eng,deu", photo.file_unique_id, text_result)
+    return text_result
+
+
+@scheduler.handler("media")
+async def process_photos(update: Update, context: ContextTypes.DEFAULT_TYPE, pages):
     try:
-        img_buffer = BytesIO(file_data)
-        img = Image.open(img_buffer)
-
-        # Вказуємо мови (українська + англійська)
-        text_result = pytesseract.image_to_string(img, lang="ukr+eng")
+        # Сторінки розпізнаються одночасно, текст іде в GPT одним запитом
+        text_result = join_pages(await recognize_pages(lambda message: recognize_page(message, context), pages))
 
         if not text_result.strip():
             await update.message.reply_text("Не вдалося розпізнати текст на зображенні.")
         else:
             # Виводимо розпізнаний текст
-            await update.message.reply_text(f"Розпізнаний текст:\n{text_result}")
+            await outbound.reply_text(update.message, f"Розпізнаний текст:\n{text_result}")
 
             # Якщо треба — передаємо цей текст як запит у GPT
-            update.message.text = text_result
-            await handle_text_message(update, context)
+            await process_text(update, text_result)
 
     except Exception as e:
         logger.error(f"Помилка при OCR фото: {e}")
@@ -275,11 +295,25 @@ async def handle_photo_message(update: Update, context: ContextTypes.DEFAULT_TYP
 
 # --------------------- Запуск бота ---------------------
 
-def main():
-    if not TELEGRAM_TOKEN:
-        raise ValueError("У .env не задано TELEGRAM_TOKEN")
+async def on_startup(application):
+    await pdf_catalog.start()
+    await doc_index.start()
+
+
+async def on_shutdown(application):
+    pdf_catalog.stop()
+    doc_index.stop()
+    file_id_cache.close()
+    await llm.close()
+    await media_fetcher.close()
+    await user_history.close()
+    ocr.shutdown()
+    pdf_renderer.shutdown()
+    media_cache.close()
+
 
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+def build_application():
+    application = application_builder(TELEGRAM_TOKEN).rate_limiter(outbound).post_init(on_startup).post_shutdown(on_shutdown).build()
 
     # Команди
     application.add_handler(CommandHandler("start", start_command))
@@ -295,9 +329,15 @@ def main():
 
     # Обробка фото (OCR)
     application.add_handler(MessageHandler(filters.PHOTO, handle_photo_message))
+    return application
+
+
+def main():
+    if not TELEGRAM_TOKEN:
+        raise ValueError("У .env не задано TELEGRAM_TOKEN")
 
     logger.info("Бот запущено... Натисніть Ctrl+C для зупинки.")
-    application.run_polling()
+    run_application(build_application, TELEGRAM_TOKEN)
 
 if __name__ == "__main__":
     main()
@@ -1,173 +1,165 @@
 import os
 import openai
 import pytesseract
-import requests
-import cv2
-import numpy as np
-
-from io import BytesIO
-from PIL import Image
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
 
 from datetime import datetime
 from dotenv import load_dotenv
-from telegram import Update, InputFile
+from telegram import Update
 from telegram.ext import (
-    Application,
     CommandHandler,
     MessageHandler,
     filters,
     ContextTypes
 )
 
+# .env читається до імпорту модулів brama: вони беруть налаштування з оточення при імпорті
+load_dotenv()
+
+from brama.file_id_cache import FileIdCache
+from brama.history import ChatHistory
+from brama.history_store import create_history_backend
+from brama.intent import CREATE_PDF, FIND_PDF, classify
+from brama.llm_client import LLMClient
+from brama.log import log_event, setup_logging
+from brama.outbound import OutboundLimiter
+from brama.scheduler import ChatScheduler
+from brama.serving import application_builder, run_application
+from brama.pdf_renderer import PDFRenderer
+from brama.media_cache import MediaCache
+from brama.media_fetch import MEDIA_MAX_PHOTO_BYTES, MEDIA_MAX_VOICE_BYTES, MediaFetcher, pick_photo
+from brama.media_group import MediaGroupCollector, join_pages, recognize_pages
+from brama.transcription import Transcriber
+from brama.streaming_reply import STREAM_REPLIES, reply_long_text, stream_reply
+from brama.ocr_engine import OCREngine
+from brama.pdf_catalog import PDFCatalog
+from brama.doc_index import DocumentIndex
+from brama.prompts import build_system_prompt, load_system_prompt
+
 import logging
 
-logging.basicConfig(level=logging.INFO)
+# Логи пишуться у фоновому потоці через чергу (див. brama/log.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
-# --------------------- Завантаження змінних середовища ---------------------
-load_dotenv()
-
+# --------------------- Змінні середовища ---------------------
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ASSISTANT_MODEL = os.getenv("ASSISTANT_ID", "gpt-3.5-turbo")
 openai.api_key = OPENAI_API_KEY
 os.environ["TESSDATA_PREFIX"] = r"C:\\Users\\ПК\\брама-юа-бот\\appp\\app\\tesseract\\tessdata"
 
+# Спільний асинхронний клієнт OpenAI (пул з'єднань, ліміт паралельності, таймаути)
+llm = LLMClient(api_key=OPENAI_API_KEY, model=ASSISTANT_MODEL)
+
 
 # --------------------- Налаштування шляху до Tesseract ---------------------
 pytesseract.pytesseract.tesseract_cmd = r"C:\Users\ПК\брама-юа-бот\appp\app\tesseract\tesseract.exe"
 
+# Пул процесів для OCR, щоб Tesseract не блокував інші чати
+ocr = OCREngine(tesseract_cmd=pytesseract.pytesseract.tesseract_cmd)
+
+# Кеш розпізнаних голосових і фото за file_unique_id (пересланий файл не розпізнається вдруге)
+media_cache = MediaCache()
+
+# Потокове завантаження голосових і фото з лімітом розміру (замість download_as_bytearray)
+media_fetcher = MediaFetcher()
+
+# Довгі голосові розпізнаються частинами (по паузах) паралельно
+transcriber = Transcriber(llm)
+
+# Фото одного альбому (багатосторінковий лист) обробляються разом
+media_groups = MediaGroupCollector()
+
 # --------------------- Інші константи та глобальні змінні ---------------------
 PDF_FOLDER = "pdf_files"
-SYSTEM_INSTRUCTIONS = """Ви Асистент працюєте від неприбуткової організації Brama-UA e.V.
-
-Відповідайте завжди на тій мові, на якій до Вас звернулись. Організація допомагає українцям у Німеччині інтегруватися в суспільство.
-Ассистент також шукає інформацію на наступних ресурсах для надання актуальних консультацій:
-- [Jobcenter Digital](https://www.jobcenter-digital.de)
-- [Agentur für Arbeit](https://www.arbeitsagentur.de)
-- [Gründenplattform.de](https://gruendenplattform.de)
-
-Ассистент повинен завжди відповідати користувачам на тій мові, на якій до нього звертаються.
-
-### Алгоритм пошуку інформації:
-1. Визначення теми запиту: Ассистент аналізує ключові слова та тему запиту користувача. Якщо потрібно — ставить уточнюючі запитання.
-2. Формулювання пошукового запиту: Створює релевантний пошуковий запит із зазначенням ключових слів та уточнень.
-3. Вибір джерела: Обирає ресурс для пошуку інформації (Jobcenter Digital, Agentur für Arbeit, Gründenplattform.de).
-4. Пошук інформації: Використовує внутрішній інструмент для пошуку на зазначених сайтах.
-5. Обробка результатів: Відбирає найбільш релевантні дані (посилання на сторінки, текстові витяги, файли чи документи).
-
-### Формат надання результатів:
-- Посилання: Пряме посилання на відповідну сторінку з коротким описом.
-- Текстовий витяг: Короткий текст із основною інформацією.
-- Файл або документ: Якщо знайдено релевантний файл, надається його посилання для завантаження.
-- Рекомендації: У разі необхідності, додаткові пояснення чи пропозиції щодо подальших дій.
-
-### Додаткові функції:
-1. Пошук і завантаження PDF-файлів:
-   - Ассистент може шукати необхідні бланки чи документи у форматі PDF.
-   - Після пошуку файл надається користувачеві як посилання для завантаження або надсилається безпосередньо через Telegram.
-2. Надсилання PDF-файлів:
-   - За запитом користувача Ассистент може надіслати необхідний PDF-файл у Telegram як документ.
-3. Обробка голосових повідомлень:
-   - Ассистент приймає голосові повідомлення від користувачів через Telegram.
-   - Використовує OpenAI Whisper API для перетворення голосу в текст.
-   - Отриманий текст обробляється як звичайний запит, на який Асистент надає відповідь.
-4. Обробка фото документу:
-   - Ассистент приймає фото листа чи документа, аналізує зміст, пояснює на мові, якою звернулись, і дає поради згідно законодавства.
-"""
-
-user_history = {}
+pdf_catalog = PDFCatalog(PDF_FOLDER)  # Індекс PDF у пам'яті, оновлюється у фоні
+file_id_cache = FileIdCache()  # file_id уже надісланих PDF, щоб не завантажувати їх повторно
+pdf_renderer = PDFRenderer()  # Генерація PDF (шрифт з кирилицею, перенос рядків) в окремих процесах
+outbound = OutboundLimiter()  # Ліміти Telegram на вихідні повідомлення (на чат і загалом)
+scheduler = ChatScheduler(outbound=outbound)  # Черга по чатах і окремі смуги для тексту, голосу, фото
+doc_index = DocumentIndex(PDF_FOLDER)  # Фрагменти PDF, знайдені для питання, замість довгого системного промпту
+CORE_PROMPT = load_system_prompt()  # Вбудований базовий промпт або SYSTEM_PROMPT_FILE
+
+# Історія спілкування з користувачами (бюджет токенів на чат + LRU за кількістю чатів,
+# зберігається у SQLite, щоб переживати перезапуск)
+user_history = ChatHistory(model=ASSISTANT_MODEL, backend=create_history_backend())
 
 # --------------------- Головний обробник ---------------------
-async def universal_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    print("[INFO] Обробка повідомлення почалася.")
+async def receive_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Сторінки альбому збираються до планувальника: перше оновлення групи обробляє всі
+    pages = None
+    if update.message and update.message.photo:
+        pages = await media_groups.collect(update.message)
+        if pages is None:
+            return
+    await universal_handler(update, context, pages)
+
+
+@scheduler.handler()
+async def universal_handler(update: Update, context: ContextTypes.DEFAULT_TYPE, pages=None):
     chat_id = update.effective_chat.id
 
     if update.message.text:
-        print("[INFO] Отримано текстове повідомлення.")
+        log_event(logger, "message_received", chat_id=chat_id, kind="text")
         user_msg = update.message.text
         await process_text_message(user_msg, chat_id, update, context)
 
     elif update.message.photo:
-        print("[INFO] Отримано фото.")
-        await handle_photo_message(update, context)
+        log_event(logger, "message_received", chat_id=chat_id, kind="photo", pages=len(pages or ()))
+        await handle_photo_message(update, context, pages or [update.message])
 
     elif update.message.voice:
-        print("[INFO] Отримано голосове повідомлення.")
+        log_event(logger, "message_received", chat_id=chat_id, kind="voice")
         await handle_voice_message(update, context)
 
     else:
-        print("[INFO] Невідомий формат повідомлення.")
+        log_event(logger, "message_received", chat_id=chat_id, kind="unknown")
         await update.message.reply_text("Невідомий формат повідомлення. Надішліть текст, фото або голосове повідомлення.")
 
 # --------------------- Обробка текстових повідомлень ---------------------
 async def process_text_message(user_msg, chat_id, update, context):
-    print(f"[INFO] Обробка текстового повідомлення: {user_msg}")
-    global user_history
-    if chat_id not in user_history:
-        user_history[chat_id] = []
+    log_event(logger, "text_message", chat_id=chat_id, text=user_msg)
+
+    # Прохання знайти чи створити PDF виконуються одразу, без запиту до OpenAI
+    intent = classify(user_msg, {FIND_PDF, CREATE_PDF})
+    if intent.name == FIND_PDF and intent.argument:
+        log_event(logger, "pdf_intent", chat_id=chat_id, intent=intent.name, source=intent.source)
+        # Модель могла помилитись: якщо файлів немає, це звичайне питання
+        if await findpdf_command(intent.argument, update, reply_missing=intent.source == "rule"):
+            return
+    elif intent.name == CREATE_PDF:
+        log_event(logger, "pdf_intent", chat_id=chat_id, intent=intent.name, source=intent.source)
+        # «Збережи це у PDF» без тексту — остання відповідь асистента
+        pdf_text = intent.argument or await user_history.last_reply(chat_id)
+        if pdf_text:
+            await createpdf_from_text(pdf_text, update)
+        else:
+            await update.message.reply_text("Напишіть текст після двокрапки, наприклад: створи PDF: <текст>")
+        return
 
-    user_history[chat_id].append({"role": "user", "content": user_msg})
+    await user_history.append(chat_id, "user", user_msg)
 
-    messages = [{"role": "system", "content": SYSTEM_INSTRUCTIONS}]
-    messages += user_history[chat_id]
+    messages = [{"role": "system", "content": build_system_prompt(doc_index.search(user_msg), CORE_PROMPT)}]
+    messages += user_history.messages(chat_id)
 
     try:
-        print("[INFO] Надсилання запиту до OpenAI.")
-        response = openai.ChatCompletion.create(
-            model=ASSISTANT_MODEL,
-            messages=messages,
-            temperature=0.7
-        )
-        assistant_reply = response.choices[0].message.content
-
-        print(f"[INFO] Отримано відповідь від OpenAI: {assistant_reply}")
-
-        if "PDF" in assistant_reply.upper():
-            print("[INFO] Виявлено запит, пов'язаний із PDF.")
-            if "створити" in user_msg.lower():
-                await createpdf_from_text(user_msg, update)
-            elif "знайти" in user_msg.lower():
-                await findpdf_command(user_msg, update)
-            else:
-                await update.message.reply_text("Не зрозуміло, що робити з PDF. Спробуйте уточнити.")
+        log_event(logger, "openai_request", logging.DEBUG, chat_id=chat_id)
+        if STREAM_REPLIES:
+            # Відповідь показується користувачу в міру надходження
+            assistant_reply = await stream_reply(update.message, llm.stream_chat(messages, temperature=0.7))
         else:
-            await update.message.reply_text(assistant_reply)
+            assistant_reply = await llm.chat(messages, temperature=0.7)
+
+        log_event(logger, "openai_reply", chat_id=chat_id, reply=assistant_reply)
+        await user_history.append(chat_id, "assistant", assistant_reply)
+
+        if not STREAM_REPLIES:
+            await reply_long_text(update.message, assistant_reply)
 
     except Exception as e:
         logger.error(f"Помилка OpenAI: {e}")
-        print(f"[ERROR] Помилка OpenAI: {e}")
         await update.message.reply_text("Вибачте, сталася помилка при обробці вашого запиту.")
 
-# --------------------- Обробка фото ---------------------
-from io import BytesIO
-from PIL import Image
-import pytesseract
-from telegram import Update
-from telegram.ext import ContextTypes
-
-# --------------------- Обробка фото ---------------------
-from PIL import ImageOps, ImageEnhance
-
-def decode_tesseract_output(raw_text):
-    """Helper function to decode Tesseract output with multiple encodings"""
-    encodings = ['utf-8', 'latin1', 'cp1251', 'iso-8859-1', 'windows-1252']
-    
-    for encoding in encodings:
-        try:
-            # Try to decode bytes using current encoding
-            if isinstance(raw_text, bytes):
-                return raw_text.decode(encoding)
-            # Try to encode and then decode if string
-            return raw_text.encode(encoding).decode('utf-8')
-        except UnicodeError:
-            continue
-    
-    # If all encodings fail, try to clean the string
-    return ''.join(char for char in raw_text if ord(char) < 128)
-
 # --------------------- Обробка фото ---------------------
 def decode_tesseract_output(raw_text):
     """Допоміжна функція для декодування результату Tesseract"""
@@ -181,38 +173,37 @@ def decode_tesseract_output(raw_text):
             continue
     return ''.join(char for char in raw_text if ord(char) < 128)
 
-async def handle_photo_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    print("[INFO] Початок обробки фото.")
+async def recognize_page(message, context):
+    # Найменший розмір, якого досить для OCR (а не найбільший)
+    photo = pick_photo(message.photo)
+
+    # Кеш за file_unique_id: при збігу фото не завантажується
+    text_result = await media_cache.get("ocr:deu,ukr+eng", photo.file_unique_id)
+    if text_result is None:
+        with await media_fetcher.fetch(context.bot, photo, MEDIA_MAX_PHOTO_BYTES, "photo.jpg") as media:
+            # Мова і режим PSM обираються пробами на мініатюрі (у пулі процесів, з попередньою
+            # обробкою); повне фото розпізнається один раз, повторно — лише за низької впевненості
+            psm_modes = [6, 3, 4]
+            log_event(logger, "ocr_request", logging.DEBUG, chat_id=message.chat_id, psm_modes=psm_modes)
+            raw_result, plan = await ocr.recognize(media.view(), langs=("deu", "ukr+eng"), psm_modes=psm_modes)
+            log_event(logger, "ocr_plan", chat_id=message.chat_id, lang=plan.lang, psm=plan.psm,
+                      confidence=round(plan.confidence), source=plan.source, full_passes=plan.full_passes)
+            text_result = decode_tesseract_output(raw_result)
+        if text_result.strip():
+            await media_cache.put("ocr:deu,ukr+eng", photo.file_unique_id, text_result)
+    else:
+        log_event(logger, "ocr_cache_hit", chat_id=message.chat_id)
+    return text_result
+
+
+async def handle_photo_message(update: Update, context: ContextTypes.DEFAULT_TYPE, pages):
     try:
-        photo = update.message.photo[-1]
-        file_id = photo.file_id
-        new_file = await context.bot.get_file(file_id)
-        file_data = await new_file.download_as_bytearray()
-
-        # Перетворення у зображення та попередня обробка
-        img_buffer = BytesIO(file_data)
-        img = Image.open(img_buffer)
-        img = img.convert("L")  # Градація сірого
-        img = ImageOps.autocontrast(img)  # Автоматичний контраст
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(2)  # Підвищення контрасту
-
-        # OCR з кількома режимами PSM
-        psm_modes = [6, 3, 4]
-        text_result = None
-        for psm in psm_modes:
-            try:
-                print(f"[INFO] Спроба OCR з PSM режимом {psm}")
-                raw_result = pytesseract.image_to_string(img, lang="deu", config=f"--psm {psm} --oem 3")
-                text_result = decode_tesseract_output(raw_result)
-                if text_result.strip():
-                    print(f"[INFO] Успішно розпізнано текст з PSM={psm}")
-                    break
-            except Exception as e:
-                print(f"[WARNING] Помилка з PSM={psm}: {e}")
-        
+        # Сторінки альбому розпізнаються одночасно і виводяться однією відповіддю
+        texts = await recognize_pages(lambda message: recognize_page(message, context), pages)
+        text_result = join_pages([" ".join(text.split()) for text in texts])
+
         if not text_result or not text_result.strip():
-            print("[WARNING] Не вдалося розпізнати текст.")
+            log_event(logger, "ocr_empty", logging.WARNING, chat_id=update.effective_chat.id)
             await update.message.reply_text(
                 "Не вдалося розпізнати текст. Спробуйте:\n"
                 "1. Використати чіткіше фото\n"
@@ -222,34 +213,30 @@ async def handle_photo_message(update: Update, context: ContextTypes.DEFAULT_TYP
             return
 
         # Виведення результатів
-        text_result = ' '.join(text_result.split())  # Очищення від зайвих пробілів
-        print(f"[INFO] Фінальний результат OCR ({len(text_result)} символів):\n{text_result}")
-        await update.message.reply_text(f"Розпізнаний текст (німецькою):\n\n{text_result}")
+        log_event(logger, "ocr_result", chat_id=update.effective_chat.id, chars=len(text_result), ocr_text=text_result)
+        await update.message.reply_text(f"Розпізнаний текст:\n\n{text_result}")
 
     except Exception as e:
         logger.error(f"Помилка при обробці фото: {e}")
-        print(f"[ERROR] Помилка: {e}")
         await update.message.reply_text("Виникла помилка при обробці зображення.")
 
 # --------------------- Пошук PDF ---------------------
-async def findpdf_command(query, update):
-    print(f"[INFO] Початок пошуку PDF для запиту: {query}")
-    found_files = []
-    if os.path.exists(PDF_FOLDER):
-        for f in os.listdir(PDF_FOLDER):
-            if f.lower().endswith(".pdf") and query.lower() in f.lower():
-                found_files.append(f)
+async def findpdf_command(query, update, reply_missing=True):
+    log_event(logger, "pdf_search", chat_id=update.effective_chat.id, query=query)
+    found_files = pdf_catalog.search(query)
 
     if not found_files:
-        print("[INFO] PDF не знайдено.")
-        await update.message.reply_text(f"Не знайдено PDF із назвою, що містить: {query}")
+        log_event(logger, "pdf_not_found", chat_id=update.effective_chat.id)
+        if reply_missing:
+            await update.message.reply_text(f"Не знайдено PDF із назвою, що містить: {query}")
     else:
+        log_event(logger, "pdf_found", chat_id=update.effective_chat.id, files=[f.name for f in found_files])
+        # Один список замість окремого повідомлення перед кожним файлом
+        names = "\n".join(f"• {f.name}" for f in found_files)
+        await outbound.reply_text(update.message, f"Знайдено файли:\n{names}\nНадсилаю...")
         for f in found_files:
-            print(f"[INFO] Знайдено PDF: {f}")
-            file_path = os.path.join(PDF_FOLDER, f)
-            await update.message.reply_text(f"Знайдено файл: {f}\nНадсилаю...")
-            with open(file_path, 'rb') as doc:
-                await update.message.reply_document(document=doc)
+            await file_id_cache.send_document(update.message, f.path, f.name, f.size, f.mtime)
+    return bool(found_files)
 
 # --------------------- Обробка голосових повідомлень (Whisper) ---------------------
 
@@ -261,28 +248,22 @@ async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYP
     3. Додаємо транскрибований текст до handle_text_message.
     """
     voice = update.message.voice
-    file_id = voice.file_id
-    new_file = await context.bot.get_file(file_id)
-    file_data = await new_file.download_as_bytearray()
 
     try:
-        # Зберігаємо у тимчасовий буфер
-        audio_buffer = BytesIO(file_data)
-        audio_buffer.name = "audio.ogg"
-
-        # Використовуємо Whisper API
-        transcript = openai.Audio.transcribe(
-            model="whisper-1",
-            file=audio_buffer,
-            language="uk"  # Або "en", "de" тощо
-        )
-        text_result = transcript["text"]
-
-        await update.message.reply_text(f"Розпізнаний текст: {text_result}")
+        # Те саме голосове (наприклад, переслане) вже розпізнавали — не завантажуємо його
+        text_result = await media_cache.get("voice:uk", voice.file_unique_id)
+        if text_result is None:
+            # Файл читається потоком (з лімітом розміру) і йде у Whisper без копій
+            with await media_fetcher.fetch(context.bot, voice, MEDIA_MAX_VOICE_BYTES, "audio.ogg") as media:
+                # Використовуємо Whisper API
+                text_result = await transcriber.transcribe(media.open(), language="uk", duration=voice.duration)  # Або "en", "de" тощо
+            if text_result.strip():
+                await media_cache.put("voice:uk", voice.file_unique_id, text_result)
+
+        await outbound.reply_text(update.message, f"Розпізнаний текст: {text_result}")
 
         # Далі обробляємо цей текст, як звичайне текстове повідомлення
-        update.message.text = text_result
-        await handle_text_message(update, context)
+        await process_text_message(text_result, update.effective_chat.id, update, context)
 
     except Exception as e:
         logger.error(f"Помилка при транскрипції голосу: {e}")
@@ -291,32 +272,42 @@ async def handle_voice_message(update: Update, context: ContextTypes.DEFAULT_TYP
 
 # --------------------- Створення PDF ---------------------
 async def createpdf_from_text(user_text, update):
-    print(f"[INFO] Початок створення PDF з тексту: {user_text}")
-    pdf_buffer = BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
-    c.drawString(50, 800, "Створений PDF-файл:")
-    c.drawString(50, 780, user_text)
-    c.showPage()
-    c.save()
-    pdf_buffer.seek(0)
+    log_event(logger, "pdf_create", chat_id=update.effective_chat.id, text=user_text)
+    pdf_bytes = await pdf_renderer.render(user_text, title="Створений PDF-файл:")
 
     pdf_name = f"created_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    print(f"[INFO] PDF створено: {pdf_name}")
-    await update.message.reply_document(document=pdf_buffer, filename=pdf_name)
+    log_event(logger, "pdf_created", chat_id=update.effective_chat.id, filename=pdf_name)
+    await update.message.reply_document(document=pdf_bytes, filename=pdf_name)
 
 # --------------------- Запуск бота ---------------------
+async def on_startup(application):
+    await pdf_catalog.start()
+    await doc_index.start()
+
+async def on_shutdown(application):
+    pdf_catalog.stop()
+    doc_index.stop()
+    file_id_cache.close()
+    await llm.close()
+    await media_fetcher.close()
+    await user_history.close()
+    ocr.shutdown()
+    pdf_renderer.shutdown()
+    media_cache.close()
+
+def build_application():
+    application = application_builder(TELEGRAM_TOKEN).rate_limiter(outbound).post_init(on_startup).post_shutdown(on_shutdown).build()
+
+    application.add_handler(MessageHandler(filters.ALL, receive_update))
+    return application
+
+
 def main():
-    print("[INFO] Запуск бота.")
     if not TELEGRAM_TOKEN:
         raise ValueError("У .env не задано TELEGRAM_TOKEN")
 
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
-
-    application.add_handler(MessageHandler(filters.ALL, universal_handler))
-
     logger.info("Бот запущено... Натисніть Ctrl+C для зупинки.")
-    print("[INFO] Бот запущено. Чекаємо на повідомлення.")
-    application.run_polling()
+    run_application(build_application, TELEGRAM_TOKEN)
 
 if __name__ == "__main__":
     main()
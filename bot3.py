@@ -1,161 +1,166 @@
 import os
 import openai
-import pytesseract
-import requests
-
-from io import BytesIO
-from PIL import Image, ImageOps, ImageEnhance
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
 
 from datetime import datetime
 from dotenv import load_dotenv
-from telegram import Update, InputFile
+from telegram import Update
 from telegram.ext import (
-    Application,
     CommandHandler,
     MessageHandler,
     filters,
     ContextTypes
 )
 
+# .env читається до імпорту модулів brama: вони беруть налаштування з оточення при імпорті
+load_dotenv()
+
+from brama.answer_cache import AnswerCache
+from brama.llm_client import LLMClient
+from brama.log import log_event, setup_logging
+from brama.outbound import OutboundLimiter
+from brama.scheduler import ChatScheduler
+from brama.serving import application_builder, run_application
+from brama.media_cache import MediaCache
+from brama.media_fetch import MEDIA_MAX_VOICE_BYTES, MediaFetcher
+from brama.transcription import Transcriber
+from brama.doc_index import DocumentIndex
+from brama.prompts import build_system_prompt, load_system_prompt
+from brama.streaming_reply import STREAM_REPLIES, reply_long_text, stream_reply
+
 import logging
 
-logging.basicConfig(level=logging.INFO)
+# Логи пишуться у фоновому потоці через чергу (див. brama/log.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
-# --------------------- Завантаження змінних середовища ---------------------
-load_dotenv()
-
+# --------------------- Змінні середовища ---------------------
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ASSISTANT_MODEL = os.getenv("ASSISTANT_ID", "gpt-4")
 openai.api_key = OPENAI_API_KEY
 
-# --------------------- Налаштування шляху до Tesseract ---------------------
-pytesseract.pytesseract.tesseract_cmd = r"C:\Users\ПК\брама-юа-бот\appp\app\tesseract\tesseract.exe"
-os.environ["TESSDATA_PREFIX"] = r"C:\Users\ПК\брама-юа-бот\appp\app\tesseract\tessdata"
+# Спільний асинхронний клієнт OpenAI (пул з'єднань, ліміт паралельності, таймаути)
+llm = LLMClient(api_key=OPENAI_API_KEY, model=ASSISTANT_MODEL)
+
+# Кеш відповідей: запити тут без історії, тож однакові питання дають однаковий промпт
+answer_cache = AnswerCache()
+
+# Кеш розпізнаних голосових і фото за file_unique_id (пересланий файл не розпізнається вдруге)
+media_cache = MediaCache()
+
+# Потокове завантаження голосових і фото з лімітом розміру (замість download_as_bytearray)
+media_fetcher = MediaFetcher()
+
+# Довгі голосові розпізнаються частинами (по паузах) паралельно
+transcriber = Transcriber(llm)
+
+# Вихідні повідомлення: ліміти Telegram (на чат і загалом), черга на кожен чат
+outbound = OutboundLimiter()
+
+# Повідомлення одного чату — по черзі, різних чатів — паралельно (окремі смуги для тексту, голосу, фото)
+scheduler = ChatScheduler(outbound=outbound)
 
 # --------------------- Інші константи та глобальні змінні ---------------------
-SYSTEM_INSTRUCTIONS = """Ви Асистент працюєте від неприбуткової організації Brama-UA e.V.
-
-Відповідайте завжди на тій мові, на якій до Вас звернулись. Організація допомагає українцям у Німеччині інтегруватися в суспільство.
-Ассистент також шукає інформацію на наступних ресурсах для надання актуальних консультацій:
-- [Jobcenter Digital](https://www.jobcenter-digital.de)
-- [Agentur für Arbeit](https://www.arbeitsagentur.de)
-- [Gründenplattform.de](https://gruendenplattform.de)
-
-Ассистент повинен завжди відповідати користувачам на тій мові, на якій до нього звертаються.
-
-### Алгоритм пошуку інформації:
-1. Визначення теми запиту: Ассистент аналізує ключові слова та тему запиту користувача. Якщо потрібно — ставить уточнюючі запитання.
-2. Формулювання пошукового запиту: Створює релевантний пошуковий запит із зазначенням ключових слів та уточнень.
-3. Вибір джерела: Обирає ресурс для пошуку інформації (Jobcenter Digital, Agentur für Arbeit, Gründenplattform.de).
-4. Пошук інформації: Використовує внутрішній інструмент для пошуку на зазначених сайтах.
-5. Обробка результатів: Відбирає найбільш релевантні дані (посилання на сторінки, текстові витяги, файли чи документи).
-
-### Формат надання результатів:
-- Посилання: Пряме посилання на відповідну сторінку з коротким описом.
-- Текстовий витяг: Короткий текст із основною інформацією.
-- Файл або документ: Якщо знайдено релевантний файл, надається його посилання для завантаження.
-- Рекомендації: У разі необхідності, додаткові пояснення чи пропозиції щодо подальших дій.
-
-### Додаткові функції:
-1. Пошук і завантаження PDF-файлів:
-   - Ассистент може шукати необхідні бланки чи документи у форматі PDF.
-   - Після пошуку файл надається користувачеві як посилання для завантаження або надсилається безпосередньо через Telegram.
-2. Надсилання PDF-файлів:
-   - За запитом користувача Ассистент може надіслати необхідний PDF-файл у Telegram як документ.
-3. Обробка голосових повідомлень:
-   - Ассистент приймає голосові повідомлення від користувачів через Telegram.
-   - Використовує OpenAI Whisper API для перетворення голосу в текст.
-   - Отриманий текст обробляється як звичайний запит, на який Асистент надає відповідь.
-4. Обробка фото документу:
-   - Ассистент приймає фото листа чи документа, аналізує зміст, пояснює на мові, якою звернулись, і дає поради згідно законодавства.
-"""
+PDF_FOLDER = "pdf_files"
+
+# Пошук по тексту PDF: у промпт іде короткий базовий текст і фрагменти, знайдені для питання
+doc_index = DocumentIndex(PDF_FOLDER)
+CORE_PROMPT = load_system_prompt()  # Вбудований базовий промпт або SYSTEM_PROMPT_FILE
 
 # --------------------- Головний обробник ---------------------
+@scheduler.handler()
 async def universal_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    print("[INFO] Обробка повідомлення почалася.")
     chat_id = update.effective_chat.id
 
     if update.message.text:
-        print("[INFO] Отримано текстове повідомлення.")
+        log_event(logger, "message_received", chat_id=chat_id, kind="text")
         user_msg = update.message.text
         await process_text_message(user_msg, chat_id, update, context)
 
     elif update.message.photo:
-        print("[INFO] Отримано фото.")
+        log_event(logger, "message_received", chat_id=chat_id, kind="photo")
         await update.message.reply_text("Обробка фото поки що не працює коректно. Надішліть, будь ласка, текст чи голосове повідомлення.")
 
     elif update.message.voice:
-        print("[INFO] Отримано голосове повідомлення.")
+        log_event(logger, "message_received", chat_id=chat_id, kind="voice")
         await process_voice_message(update, context)
 
     else:
-        print("[INFO] Невідомий формат повідомлення.")
+        log_event(logger, "message_received", chat_id=chat_id, kind="unknown")
         await update.message.reply_text("Невідомий формат повідомлення. Надішліть текст або голосове повідомлення.")
 
 # --------------------- Обробка текстових повідомлень ---------------------
 async def process_text_message(user_msg, chat_id, update, context):
-    print(f"[INFO] Обробка текстового повідомлення: {user_msg}")
+    log_event(logger, "text_message", chat_id=chat_id, text=user_msg)
     try:
-        print("[INFO] Надсилання запиту до OpenAI.")
-        response = openai.ChatCompletion.create(
-            model=ASSISTANT_MODEL,
-            messages=[{"role": "system", "content": SYSTEM_INSTRUCTIONS}, {"role": "user", "content": user_msg}],
-            temperature=0.7
+        log_event(logger, "openai_request", logging.DEBUG, chat_id=chat_id)
+        system_prompt = build_system_prompt(doc_index.search(user_msg), CORE_PROMPT)
+        messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_msg}]
+        streamed = False
+
+        async def ask_openai():
+            nonlocal streamed
+            if not STREAM_REPLIES:
+                return await llm.chat(messages, temperature=0.7)
+            # Відповідь показується користувачу в міру надходження
+            streamed = True
+            return await stream_reply(update.message, llm.stream_chat(messages, temperature=0.7))
+
+        assistant_reply = await answer_cache.get_or_create(
+            ASSISTANT_MODEL, system_prompt, user_msg, ask_openai
         )
-        assistant_reply = response.choices[0].message.content
-        print(f"[INFO] Отримано відповідь від OpenAI: {assistant_reply}")
-        await update.message.reply_text(assistant_reply)
+        log_event(logger, "openai_reply", chat_id=chat_id, reply=assistant_reply)
+        if not streamed:
+            await reply_long_text(update.message, assistant_reply)
 
     except Exception as e:
         logger.error(f"Помилка OpenAI: {e}")
-        print(f"[ERROR] Помилка OpenAI: {e}")
         await update.message.reply_text("Вибачте, сталася помилка при обробці вашого запиту.")
 
 # --------------------- Обробка голосових повідомлень ---------------------
 async def process_voice_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    print("[INFO] Початок обробки голосового повідомлення.")
     try:
         voice = update.message.voice
-        file_id = voice.file_id
-        new_file = await context.bot.get_file(file_id)
-        file_data = await new_file.download_as_bytearray()
-
-        audio_buffer = BytesIO(file_data)
-        audio_buffer.name = "audio.ogg"
-
-        print("[INFO] Використання Whisper для розпізнавання голосу.")
-        transcript = openai.Audio.transcribe(
-            model="whisper-1",
-            file=audio_buffer,
-            language="uk"
-        )
-        text_result = transcript["text"]
-
-        print(f"[INFO] Whisper успішно розпізнав текст: {text_result}")
+        # Те саме голосове (наприклад, переслане) вже розпізнавали — не завантажуємо його
+        text_result = await media_cache.get("voice:uk", voice.file_unique_id)
+        if text_result is None:
+            # Файл читається потоком (з лімітом розміру) і йде у Whisper без копій
+            with await media_fetcher.fetch(context.bot, voice, MEDIA_MAX_VOICE_BYTES, "audio.ogg") as media:
+                log_event(logger, "whisper_request", logging.DEBUG, chat_id=update.effective_chat.id)
+                text_result = await transcriber.transcribe(media.open(), language="uk", duration=voice.duration)
+            if text_result.strip():
+                await media_cache.put("voice:uk", voice.file_unique_id, text_result)
+
+        log_event(logger, "voice_transcribed", chat_id=update.effective_chat.id, text=text_result)
         await process_text_message(text_result, update.effective_chat.id, update, context)
 
     except Exception as e:
         logger.error(f"Помилка при транскрипції голосу: {e}")
-        print(f"[ERROR] Помилка транскрипції: {e}")
         await update.message.reply_text("Не вдалося розпізнати голосове повідомлення.")
 
 # --------------------- Запуск бота ---------------------
-def main():
-    print("[INFO] Запуск бота.")
-    if not TELEGRAM_TOKEN:
-        raise ValueError("У .env не задано TELEGRAM_TOKEN")
+async def on_startup(application):
+    await doc_index.start()
 
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+async def on_shutdown(application):
+    doc_index.stop()
+    await llm.close()
+    await media_fetcher.close()
+    media_cache.close()
+
+def build_application():
+    application = application_builder(TELEGRAM_TOKEN).rate_limiter(outbound).post_init(on_startup).post_shutdown(on_shutdown).build()
 
     application.add_handler(MessageHandler(filters.ALL, universal_handler))
+    return application
+
+
+def main():
+    if not TELEGRAM_TOKEN:
+        raise ValueError("У .env не задано TELEGRAM_TOKEN")
 
     logger.info("Бот запущено... Натисніть Ctrl+C для зупинки.")
-    print("[INFO] Бот запущено. Чекаємо на повідомлення.")
-    application.run_polling()
+    run_application(build_application, TELEGRAM_TOKEN)
 
 if __name__ == "__main__":
     main()
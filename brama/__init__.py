@@ -0,0 +1 @@
+"""Спільні модулі для ботів Brama-UA."""
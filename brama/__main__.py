@@ -0,0 +1,14 @@
+"""python -m brama — запуск бота (див. brama/app.py)."""
+
+from dotenv import load_dotenv
+
+# .env читається до імпорту модулів brama: вони беруть налаштування з оточення при імпорті
+load_dotenv()
+
+from brama.log import setup_logging  # noqa: E402
+
+setup_logging()
+
+from brama.app import main  # noqa: E402
+
+main()
@@ -0,0 +1,191 @@
+"""
+Кеш відповідей для запитів без історії (bot.py, bot3.py).
+
+Ключ — модель, системний промпт і нормалізоване питання користувача.
+Записи мають TTL, а розмір кешу обмежений (витісняються найдавніше
+використані). Нечіткий пошук за триграмами символів (вмикається
+ANSWER_CACHE_SIMILARITY) знаходить перефразовані питання ("як
+зареєструватися в Jobcenter?" / "Як зареєструватись у Jobcenter"), але
+так само зближує питання протилежного змісту ("зареєструватися" /
+"знятися з реєстрації"), тому за замовчуванням вимкнений. Однакові
+питання, що надходять одночасно, чекають на один запит до OpenAI.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+
+from brama.metrics import track_cache
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+# Поріг схожості для нечіткого збігу (0 — вимкнено, лише точний збіг нормалізованого питання)
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+_PUNCT_RE = re.compile(r"[^\w\s]+")
+
+
+def normalize_question(text):
+    text = _PUNCT_RE.sub(" ", text.casefold())
+    return " ".join(text.split())
+
+
+def _shingles(text):
+    padded = f" {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class _Entry:
+    __slots__ = ("scope", "question", "answer", "expires", "shingles")
+
+    def __init__(self, scope, question, answer, expires, shingles):
+        self.scope = scope
+        self.question = question
+        self.answer = answer
+        self.expires = expires
+        self.shingles = shingles
+
+
+class AnswerCache:
+    """LRU-кеш відповідей з TTL і нечітким пошуком перефразованих питань."""
+
+    def __init__(self, max_size=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, similarity=ANSWER_CACHE_SIMILARITY):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()  # ключ -> _Entry
+        self._shingle_index = {}  # триграма -> множина ключів
+        self._inflight = {}  # ключ -> Future з відповіддю
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        track_cache("answer", self)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+    @staticmethod
+    def _scope(model, system_prompt):
+        digest = hashlib.sha1(system_prompt.encode("utf-8")).hexdigest()[:12]
+        return f"{model}:{digest}"
+
+    # --------------------- Внутрішні операції з індексом ---------------------
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for shingle in entry.shingles:
+            keys = self._shingle_index.get(shingle)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._shingle_index[shingle]
+
+    def _find_similar(self, scope, question, now):
+        shingles = _shingles(question)
+        shared = {}
+        for shingle in shingles:
+            for key in self._shingle_index.get(shingle, ()):
+                shared[key] = shared.get(key, 0) + 1
+        best_key, best_score = None, self.similarity
+        for key, count in shared.items():
+            entry = self._entries[key]
+            if entry.scope != scope or entry.expires < now:
+                continue
+            score = count / (len(shingles) + len(entry.shingles) - count)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    # --------------------- Публічний інтерфейс ---------------------
+    def _lookup(self, scope, normalized):
+        key = (scope, normalized)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires < now:
+            self._remove(key)
+            entry = None
+        if entry is None and self.similarity > 0:
+            similar_key = self._find_similar(scope, normalized, now)
+            if similar_key is not None:
+                self.fuzzy_hits += 1
+                key, entry = similar_key, self._entries[similar_key]
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def get(self, model, system_prompt, question):
+        """Повертає закешовану відповідь або None."""
+        entry = self._lookup(self._scope(model, system_prompt), normalize_question(question))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.answer
+
+    def put(self, model, system_prompt, question, answer):
+        scope = self._scope(model, system_prompt)
+        normalized = normalize_question(question)
+        key = (scope, normalized)
+        if key in self._entries:
+            self._remove(key)
+        shingles = _shingles(normalized) if self.similarity > 0 else frozenset()
+        self._entries[key] = _Entry(scope, normalized, answer, time.monotonic() + self.ttl, shingles)
+        for shingle in shingles:
+            self._shingle_index.setdefault(shingle, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    async def get_or_create(self, model, system_prompt, question, create):
+        """
+        Повертає відповідь з кешу або викликає create() (корутину) і кешує
+        результат. Поки відповідь на питання готується, однакові питання
+        чекають на неї, а не надсилають ще один запит.
+        """
+        key = (self._scope(model, system_prompt), normalize_question(question))
+        entry = self._lookup(*key)
+        inflight = self._inflight.get(key)
+        if entry is not None or inflight is not None:
+            self.hits += 1
+            logger.info(f"Відповідь з кешу (hit rate {self.hit_rate:.0%})")
+            if entry is not None:
+                return entry.answer
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            answer = await create()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Щоб не було попередження "Future exception was never retrieved"
+            future.exception()
+            raise
+        else:
+            self.put(model, system_prompt, question, answer)
+            future.set_result(answer)
+            return answer
+        finally:
+            self._inflight.pop(key, None)
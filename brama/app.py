@@ -0,0 +1,212 @@
+"""
+Єдина точка входу бота: python -m brama
+
+Замість чотирьох майже однакових скриптів (bot.py ... bot3.py) — один
+застосунок, у якому голос, OCR, PDF, пошук по документах для промпту (rag)
+та історія розмов є модулями brama.features і вмикаються змінною
+BOT_FEATURES. Текстові відповіді (чат з OpenAI) працюють завжди.
+
+Важкі залежності не імпортуються при старті: openai — при першому запиті
+до LLM, Tesseract/OpenCV — при першому фото, reportlab — при першому PDF.
+Вимкнений модуль не завантажує їх зовсім. Клієнт OpenAI потрібен майже
+кожному повідомленню, тому після запуску він підвантажується у фоновому
+потоці (BOT_PRELOAD=0 — вимкнути); OCR і PDF чекають на перше фото чи PDF.
+"""
+
+import asyncio
+import functools
+import importlib
+import logging
+import os
+
+from brama.features import chat, ocr, pdf, voice
+from brama.outbound import OutboundLimiter
+from brama.scheduler import ChatScheduler
+from brama.serving import application_builder, run_application
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+ASSISTANT_MODEL = os.getenv("ASSISTANT_ID", "gpt-4")
+
+ALL_FEATURES = ("voice", "ocr", "pdf", "rag", "history")
+BOT_FEATURES = frozenset(
+    name.strip() for name in os.getenv("BOT_FEATURES", ",".join(ALL_FEATURES)).split(",") if name.strip()
+)
+BOT_PRELOAD = os.getenv("BOT_PRELOAD", "1") == "1"
+
+# Порожньо — tesseract шукається у PATH
+TESSERACT_CMD = os.getenv("TESSERACT_CMD", "")
+PDF_FOLDER = os.getenv("PDF_FOLDER", "pdf_files")
+
+FEATURE_MODULES = {"voice": voice, "ocr": ocr, "pdf": pdf}
+# Що підвантажити у фоні після запуску
+PRELOAD_MODULES = ("brama.llm_client",)
+
+
+class Services:
+    """
+    Спільні об'єкти бота. Черги і планувальник потрібні одразу, решта
+    створюється (разом з імпортом модуля) при першому зверненні.
+    """
+
+    def __init__(self, features=BOT_FEATURES):
+        unknown = set(features) - set(ALL_FEATURES)
+        if unknown:
+            raise ValueError(f"Невідомі функції у BOT_FEATURES: {', '.join(sorted(unknown))}")
+        self.features = frozenset(features)
+        # Вихідні повідомлення: ліміти Telegram (на чат і загалом), черга на кожен чат
+        self.outbound = OutboundLimiter()
+        # Повідомлення одного чату — по черзі, різних чатів — паралельно
+        self.scheduler = ChatScheduler(outbound=self.outbound)
+
+    @functools.cached_property
+    def llm(self):
+        from brama.llm_client import LLMClient
+
+        return LLMClient(api_key=OPENAI_API_KEY, model=ASSISTANT_MODEL)
+
+    @functools.cached_property
+    def history(self):
+        """Історія розмов (None, якщо функцію history вимкнено)."""
+        if "history" not in self.features:
+            return None
+        from brama.history import ChatHistory
+        from brama.history_store import create_history_backend
+
+        return ChatHistory(model=ASSISTANT_MODEL, backend=create_history_backend())
+
+    @functools.cached_property
+    def answer_cache(self):
+        from brama.answer_cache import AnswerCache
+
+        return AnswerCache()
+
+    @functools.cached_property
+    def media_cache(self):
+        from brama.media_cache import MediaCache
+
+        return MediaCache()
+
+    @functools.cached_property
+    def media_fetcher(self):
+        from brama.media_fetch import MediaFetcher
+
+        return MediaFetcher()
+
+    @functools.cached_property
+    def transcriber(self):
+        from brama.transcription import Transcriber
+
+        return Transcriber(self.llm)
+
+    @functools.cached_property
+    def ocr(self):
+        from brama.ocr_engine import OCREngine
+
+        return OCREngine(tesseract_cmd=TESSERACT_CMD or None)
+
+    @functools.cached_property
+    def pdf_renderer(self):
+        from brama.pdf_renderer import PDFRenderer
+
+        return PDFRenderer()
+
+    @functools.cached_property
+    def pdf_catalog(self):
+        from brama.pdf_catalog import PDFCatalog
+
+        return PDFCatalog(PDF_FOLDER)
+
+    @functools.cached_property
+    def doc_index(self):
+        """Індекс фрагментів PDF для промпту (None, якщо функцію rag вимкнено)."""
+        if "rag" not in self.features:
+            return None
+        from brama.doc_index import DocumentIndex
+
+        return DocumentIndex(PDF_FOLDER)
+
+    @functools.cached_property
+    def file_id_cache(self):
+        from brama.file_id_cache import FileIdCache
+
+        return FileIdCache()
+
+    def _created(self, name):
+        # cached_property зберігає створений об'єкт у __dict__
+        return self.__dict__.get(name)
+
+    async def close(self):
+        """Закриває лише те, що встигли створити."""
+        if self._created("pdf_catalog") is not None:
+            self.pdf_catalog.stop()
+        if self._created("doc_index") is not None:
+            self.doc_index.stop()
+        if self._created("file_id_cache") is not None:
+            self.file_id_cache.close()
+        if self._created("llm") is not None:
+            await self.llm.close()
+        if self._created("media_fetcher") is not None:
+            await self.media_fetcher.close()
+        if self._created("history") is not None:
+            await self.history.close()
+        if self._created("ocr") is not None:
+            self.ocr.shutdown()
+        if self._created("pdf_renderer") is not None:
+            self.pdf_renderer.shutdown()
+        if self._created("media_cache") is not None:
+            self.media_cache.close()
+
+
+def _preload(names):
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            logger.warning(f"Не вдалося підвантажити {name}: {e}")
+
+
+async def _start_doc_index(services):
+    # numpy і сегменти індексу відкриваються у фоні: до того відповіді йдуть без фрагментів
+    await asyncio.to_thread(importlib.import_module, "brama.doc_index")
+    await services.doc_index.start()
+
+
+def build_application(features=BOT_FEATURES):
+    services = Services(features)
+
+    async def on_startup(application):
+        if "pdf" in services.features:
+            await services.pdf_catalog.start()
+        if "rag" in services.features:
+            application.bot_data["doc_index"] = asyncio.create_task(_start_doc_index(services))
+        if BOT_PRELOAD:
+            # Не чекаємо: бот уже приймає оновлення, поки модулі завантажуються
+            application.bot_data["preload"] = asyncio.create_task(asyncio.to_thread(_preload, PRELOAD_MODULES))
+
+    async def on_shutdown(application):
+        await services.close()
+
+    application = (
+        application_builder(TELEGRAM_TOKEN)
+        .rate_limiter(services.outbound)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
+    chat.register(application, services)
+    for name, module in FEATURE_MODULES.items():
+        if name in services.features:
+            module.register(application, services)
+    logger.info(f"Функції: {', '.join(sorted(services.features)) or 'лише текст'}")
+    return application
+
+
+def main():
+    if not TELEGRAM_TOKEN:
+        raise ValueError("У .env не задано TELEGRAM_TOKEN")
+
+    logger.info("Бот запущено... Натисніть Ctrl+C для зупинки.")
+    run_application(build_application, TELEGRAM_TOKEN)
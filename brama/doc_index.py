@@ -0,0 +1,468 @@
+"""
+Пошук по тексту наших PDF-документів (BM25) для промпту асистента.
+
+Замість багатокілобайтного системного промпту в кожен запит до LLM іде
+короткий базовий промпт і кілька фрагментів документів з PDF_FOLDER,
+найближчих до питання. Текст PDF витягується через pypdf і ділиться на
+фрагменти по RAG_PASSAGE_WORDS слів (з перекриттям).
+
+Кожен файл — окремий незмінний сегмент у RAG_INDEX_DIR: масиви numpy
+(відсортовані хеші слів, списки входжень, довжини фрагментів) і текст
+фрагментів, відкриті через mmap. Пошук читає лише потрібні сторінки
+файлів, а кілька процесів бота ділять їх через кеш ОС. Змінений файл
+перебудовує лише свій сегмент; витягування тексту йде в окремому
+процесі, тож великий PDF не зупиняє чати. Список сегментів зберігається
+в manifest.json, тому після перезапуску індекс не будується заново.
+
+Кілька процесів (BOT_WORKERS > 1) можуть ділити один RAG_INDEX_DIR:
+зміни в ньому (побудова сегментів, прибирання, маніфест) робляться лише
+під файловим блокуванням .lock. Процес, що отримав блокування, спершу
+перечитує маніфест, якщо його оновив інший процес, тож кожен файл
+індексується один раз, а чужі сегменти не видаляються.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from brama.metrics import timed
+from brama.pdf_catalog import normalize, scan_folder, tokenize
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+RAG_INDEX_DIR = os.getenv("RAG_INDEX_DIR", "rag_index")
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "3"))
+RAG_PASSAGE_WORDS = int(os.getenv("RAG_PASSAGE_WORDS", "60"))
+RAG_POLL_INTERVAL = float(os.getenv("RAG_POLL_INTERVAL", "60"))
+# Фрагменти з оцінкою, нижчою за цю частку від найкращої, не додаються
+RAG_MIN_RELATIVE_SCORE = float(os.getenv("RAG_MIN_RELATIVE_SCORE", "0.5"))
+
+# Перекриття сусідніх фрагментів (частка довжини фрагмента)
+OVERLAP = 0.25
+# Основа слова — перші символи (грубе відсікання закінчень замість стемера)
+STEM_CHARS = 6
+BM25_K1 = 1.2
+BM25_B = 0.75
+MANIFEST = "manifest.json"
+LOCK = ".lock"
+FORMAT_VERSION = 1
+
+STOP_WORDS = frozenset(normalize(word) for word in (
+    "і", "й", "та", "в", "у", "на", "з", "із", "до", "для", "що", "як", "це", "не", "чи", "а", "але", "або",
+    "по", "про", "від", "за", "я", "ви", "ти", "мені", "мене", "є", "де", "коли", "який", "яка", "які",
+    "и", "с", "что", "как", "это", "или", "от", "мне", "где", "когда", "какой",
+    "der", "die", "das", "und", "ist", "ich", "ein", "eine", "zu", "mit", "den", "dem", "im", "in", "für",
+    "von", "auf", "wie", "was", "wo", "sie", "es",
+    "the", "an", "and", "is", "to", "of", "for", "on", "how", "what", "my", "do",
+))
+
+
+def terms(text):
+    return [t[:STEM_CHARS] for t in tokenize(text) if t not in STOP_WORDS and (len(t) > 1 or t.isdigit())]
+
+
+def term_hash(term):
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def split_passages(pages, size=RAG_PASSAGE_WORDS):
+    """(сторінка, текст) -> фрагменти по size слів у межах сторінки."""
+    step = max(1, size - int(size * OVERLAP))
+    for page, text in pages:
+        words = text.split()
+        for start in range(0, len(words), step):
+            yield page, " ".join(words[start:start + size])
+            if start + size >= len(words):
+                break
+
+
+# --------------------- Код, що виконується у процесі індексації ---------------------
+def _init_worker():
+    # Процес створено через fork і він успадкував обробники сигналів циклу подій
+    # бота: без цього SIGTERM при зупинці пулу "отримав" би і сам бот
+    if hasattr(signal, "set_wakeup_fd"):
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _extract_pages(path):
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    for number, page in enumerate(reader.pages, 1):
+        text = page.extract_text() or ""
+        if text.strip():
+            yield number, text
+
+
+def build_segment(path, segment_dir):
+    """Індексує один PDF у segment_dir; повертає (фрагментів, слів усього)."""
+    hashes = {}
+    postings = {}  # хеш слова -> [(фрагмент, частота)]
+    texts, pages, lengths = [], [], []
+    for page, text in split_passages(_extract_pages(path)):
+        passage_terms = terms(text)
+        if not passage_terms:
+            continue
+        counts = {}
+        for term in passage_terms:
+            h = hashes.get(term)
+            if h is None:
+                h = hashes[term] = term_hash(term)
+            counts[h] = counts.get(h, 0) + 1
+        passage = len(texts)
+        for h, count in counts.items():
+            postings.setdefault(h, []).append((passage, count))
+        texts.append(text.encode("utf-8"))
+        pages.append(page)
+        lengths.append(len(passage_terms))
+    if not texts:
+        return 0, 0
+
+    sorted_hashes = sorted(postings)
+    offsets = np.zeros(len(sorted_hashes) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[h]) for h in sorted_hashes])
+    flat = [item for h in sorted_hashes for item in postings[h]]
+    text_offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+    text_offsets[1:] = np.cumsum([len(t) for t in texts])
+
+    tmp_dir = segment_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    arrays = {
+        "terms": np.array(sorted_hashes, dtype=np.uint64),
+        "offsets": offsets,
+        "ids": np.array([p for p, _ in flat], dtype=np.uint32),
+        "freqs": np.minimum([c for _, c in flat], np.iinfo(np.uint16).max).astype(np.uint16),
+        "lengths": np.array(lengths, dtype=np.uint32),
+        "pages": np.array(pages, dtype=np.uint32),
+        "text_offsets": text_offsets,
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+    with open(os.path.join(tmp_dir, "text.bin"), "wb") as f:
+        f.write(b"".join(texts))
+    os.replace(tmp_dir, segment_dir)
+    return len(texts), sum(lengths)
+
+
+# --------------------- Сегменти ---------------------
+class Passage:
+    __slots__ = ("file", "page", "text", "score")
+
+    def __init__(self, file, page, text, score):
+        self.file = file
+        self.page = page
+        self.text = text
+        self.score = score
+
+
+class Segment:
+    """Індекс одного PDF, відкритий через mmap (лише для читання)."""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+        def load(array):
+            return np.load(os.path.join(path, f"{array}.npy"), mmap_mode="r")
+
+        self.terms = load("terms")
+        self.offsets = load("offsets")
+        self.ids = load("ids")
+        self.freqs = load("freqs")
+        self.lengths = load("lengths")
+        self.pages = load("pages")
+        self.text_offsets = load("text_offsets")
+        self.text = np.memmap(os.path.join(path, "text.bin"), dtype=np.uint8, mode="r")
+
+    def lookup(self, hashes):
+        """Межі списків входжень для кожного хешу (start == end — слова немає)."""
+        idx = np.minimum(np.searchsorted(self.terms, hashes), len(self.terms) - 1)
+        found = self.terms[idx] == hashes
+        starts = np.where(found, self.offsets[idx], 0)
+        ends = np.where(found, self.offsets[idx + 1], 0)
+        return starts, ends
+
+    def passage_text(self, i):
+        return self.text[self.text_offsets[i]:self.text_offsets[i + 1]].tobytes().decode("utf-8")
+
+
+class DocumentIndex:
+    """BM25-індекс фрагментів PDF з папки, що оновлюється у фоні."""
+
+    def __init__(self, folder, index_dir=RAG_INDEX_DIR, top_k=RAG_TOP_K, poll_interval=RAG_POLL_INTERVAL):
+        self.folder = folder
+        self.index_dir = index_dir
+        self.top_k = top_k
+        self.poll_interval = poll_interval
+        self._files = {}  # ім'я PDF -> запис маніфесту
+        self._segments = {}  # ім'я PDF -> Segment
+        self._passages = 0
+        self._tokens = 0
+        self._manifest_stat = None  # (inode, mtime) маніфесту, з якого завантажено сегменти
+        self._poll_task = None
+
+    def __len__(self):
+        return self._passages
+
+    # --------------------- Блокування ---------------------
+    def _lock(self):
+        """Чекає на виключне блокування RAG_INDEX_DIR між процесами."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        f = open(os.path.join(self.index_dir, LOCK), "a+b")
+        try:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:  # LK_LOCK здається після 10 спроб
+                        time.sleep(1)
+        except BaseException:
+            f.close()
+            raise
+        return f
+
+    @staticmethod
+    def _unlock(f):
+        if fcntl is None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        f.close()
+
+    # --------------------- Маніфест ---------------------
+    def _stat_manifest(self):
+        try:
+            st = os.stat(os.path.join(self.index_dir, MANIFEST))
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def _load(self):
+        """
+        Відкриває сегменти з маніфесту і прибирає ті, яких у ньому немає.
+        Викликається лише під блокуванням, тож чужих незавершених сегментів
+        у каталозі немає. Виконується в потоці, тому поточний індекс не
+        змінює: повертає (файли, сегменти, фрагментів, слів, стан маніфесту),
+        які _apply підставляє в циклі подій одним присвоєнням.
+        """
+        files, segments = {}, {}
+        passages = tokens = 0
+        path = os.path.join(self.index_dir, MANIFEST)
+        manifest_stat = self._stat_manifest()
+        try:
+            with open(path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Маніфест індексу документів пошкоджено, індекс буде перебудовано: {e}")
+            manifest = {}
+        if manifest.get("version") != FORMAT_VERSION:
+            manifest = {}
+
+        for name, entry in manifest.get("files", {}).items():
+            try:
+                if entry["segment"] is not None:
+                    segments[name] = Segment(name, os.path.join(self.index_dir, entry["segment"]))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Сегмент {entry.get('segment')} не відкрився, буде перебудований: {e}")
+                continue
+            files[name] = entry
+            passages += entry["passages"]
+            tokens += entry["tokens"]
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        used = {entry["segment"] for entry in files.values()} | {MANIFEST, LOCK}
+        for item in os.listdir(self.index_dir):
+            if item not in used:
+                self._remove_path(os.path.join(self.index_dir, item))
+        return files, segments, passages, tokens, manifest_stat
+
+    def _apply(self, state):
+        # Без await між присвоєннями: search() бачить або старий індекс, або новий
+        self._files, self._segments, self._passages, self._tokens, self._manifest_stat = state
+
+    def _save(self):
+        path = os.path.join(self.index_dir, MANIFEST)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": FORMAT_VERSION, "files": self._files}, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+        self._manifest_stat = self._stat_manifest()
+
+    @staticmethod
+    def _remove_path(path):
+        # У Windows файл, відкритий через mmap, не видаляється — тоді його прибере наступний запуск
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _add(self, name, entry):
+        if entry["segment"] is not None:
+            self._segments[name] = Segment(name, os.path.join(self.index_dir, entry["segment"]))
+        self._files[name] = entry
+        self._passages += entry["passages"]
+        self._tokens += entry["tokens"]
+
+    def _drop(self, name):
+        entry = self._files.pop(name, None)
+        if entry is None:
+            return
+        self._segments.pop(name, None)
+        self._passages -= entry["passages"]
+        self._tokens -= entry["tokens"]
+        if entry["segment"] is not None:
+            self._remove_path(os.path.join(self.index_dir, entry["segment"]))
+
+    # --------------------- Побудова та оновлення ---------------------
+    async def start(self):
+        """Відкриває збережений індекс і запускає фонову індексацію змінених файлів."""
+        lock = await asyncio.to_thread(self._lock)
+        try:
+            self._apply(await asyncio.to_thread(self._load))
+        finally:
+            self._unlock(lock)
+        logger.info(f"Індекс документів: {len(self._segments)} файлів, {self._passages} фрагментів")
+        if self._poll_task is None:
+            self._poll_task = asyncio.create_task(self._poll_loop())
+
+    async def _poll_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Помилка оновлення індексу документів: {e}")
+            if self.poll_interval <= 0:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    async def refresh(self):
+        """Індексує нові та змінені PDF і прибирає видалені."""
+        found = await asyncio.to_thread(scan_folder, self.folder)
+        lock = await asyncio.to_thread(self._lock)
+        try:
+            if self._stat_manifest() != self._manifest_stat:
+                # Індекс оновив інший процес — беремо його сегменти замість побудови своїх
+                self._apply(await asyncio.to_thread(self._load))
+            await self._update(found)
+        finally:
+            self._unlock(lock)
+
+    async def _update(self, found):
+        changed = [
+            name for name, (_, size, mtime) in found.items()
+            if name not in self._files or (self._files[name]["size"], self._files[name]["mtime"]) != (size, mtime)
+        ]
+        removed = [name for name in self._files if name not in found]
+        if not changed and not removed:
+            return
+
+        for name in removed:
+            self._drop(name)
+        if changed:
+            loop = asyncio.get_running_loop()
+            # Процес живе лише на час індексації, щоб не тримати pypdf у пам'яті
+            pool = ProcessPoolExecutor(max_workers=1, initializer=_init_worker)
+            try:
+                for name in changed:
+                    path, size, mtime = found[name]
+                    segment = hashlib.sha1(f"{name}:{size}:{mtime}".encode("utf-8")).hexdigest()[:16]
+                    try:
+                        with timed("doc_index"):
+                            passages, tokens = await loop.run_in_executor(
+                                pool, build_segment, path, os.path.join(self.index_dir, segment)
+                            )
+                    except Exception as e:
+                        # Запис лишається, щоб файл не індексувався знову до наступної зміни
+                        logger.error(f"Не вдалося проіндексувати {name}: {e}")
+                        passages = tokens = 0
+                    entry = {
+                        "size": size,
+                        "mtime": mtime,
+                        "segment": segment if passages else None,
+                        "passages": passages,
+                        "tokens": tokens,
+                    }
+                    self._drop(name)
+                    self._add(name, entry)
+            finally:
+                await asyncio.to_thread(pool.shutdown)
+        await asyncio.to_thread(self._save)
+        logger.info(
+            f"Індекс документів оновлено: +{len(changed)} -{len(removed)}, "
+            f"усього {len(self._segments)} файлів, {self._passages} фрагментів"
+        )
+
+    def stop(self):
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    # --------------------- Пошук ---------------------
+    def search(self, query, k=None):
+        """Повертає до k фрагментів (Passage), найрелевантніших до query."""
+        k = self.top_k if k is None else k
+        if k <= 0 or not self._segments:
+            return []
+        hashes = np.array(sorted({term_hash(t) for t in terms(query)}), dtype=np.uint64)
+        if not len(hashes):
+            return []
+
+        with timed("retrieval"):
+            # Документна частота слова — сума по всіх сегментах
+            located = []
+            df = np.zeros(len(hashes))
+            for segment in self._segments.values():
+                starts, ends = segment.lookup(hashes)
+                df += ends - starts
+                located.append((segment, starts, ends))
+            idf = np.log(1 + (self._passages - df + 0.5) / (df + 0.5))
+            avgdl = self._tokens / self._passages
+
+            candidates = []
+            for segment, starts, ends in located:
+                hits = np.nonzero(ends > starts)[0]
+                if not len(hits):
+                    continue
+                scores = np.zeros(len(segment.lengths), dtype=np.float32)
+                for j in hits:
+                    ids = segment.ids[starts[j]:ends[j]]
+                    tf = segment.freqs[starts[j]:ends[j]].astype(np.float32)
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.lengths[ids] / avgdl)
+                    # У межах одного слова фрагменти не повторюються
+                    scores[ids] += idf[j] * tf * (BM25_K1 + 1) / (tf + norm)
+                top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+                candidates.extend((float(scores[i]), segment, int(i)) for i in top if scores[i] > 0)
+
+        candidates.sort(key=lambda c: c[0], reverse=True)
+        if not candidates:
+            return []
+        cutoff = candidates[0][0] * RAG_MIN_RELATIVE_SCORE
+        return [
+            Passage(segment.name, int(segment.pages[i]), segment.passage_text(i), score)
+            for score, segment, i in candidates[:k]
+            if score >= cutoff
+        ]
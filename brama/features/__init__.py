@@ -0,0 +1,7 @@
+"""
+Функції бота для brama.app.
+
+Кожен модуль має register(application, services), який додає обробники
+python-telegram-bot. Модулі імпортують лише telegram і легкі частини
+brama; важкі залежності беруться через services при першому використанні.
+"""
@@ -0,0 +1,132 @@
+"""
+Текстові відповіді: /start, /help і звичайні повідомлення через OpenAI.
+
+З функцією history запит містить історію чату; без неї кожне питання
+самостійне, тож однакові питання беруться з кешу відповідей. Системний
+промпт — короткий базовий текст і фрагменти PDF-документів, знайдені для
+питання (функція rag, brama.doc_index). Прохання
+знайти чи створити PDF і показати довідку розпізнаються локально
+(brama.intent) і виконуються без запиту до LLM.
+"""
+
+import logging
+
+from telegram.ext import CommandHandler, MessageHandler, filters
+
+from brama.features.pdf import create_pdf, find_pdf
+from brama.intent import CHAT, CREATE_PDF, FIND_PDF, HELP, classify
+from brama.log import log_event
+from brama.prompts import build_system_prompt, load_system_prompt
+from brama.streaming_reply import STREAM_REPLIES, reply_long_text, stream_reply
+
+logger = logging.getLogger(__name__)
+
+CORE_PROMPT = load_system_prompt()
+
+START_TEXT = "Вітаю! Я Асистент Brama-UA. Напишіть чи надішліть щось, і я спробую допомогти."
+ERROR_TEXT = "Вибачте, сталася помилка при обробці вашого запиту."
+
+
+def help_text(features):
+    lines = ["Доступні команди:", "/start — почати роботу", "/help — показати це повідомлення"]
+    if "pdf" in features:
+        lines.append("/findpdf <ім'я файлу> — знайти та надіслати PDF із локальної папки")
+        lines.append("/createpdf <текст> — створити PDF з вашим текстом і надіслати")
+    media = []
+    if "voice" in features:
+        media.append("голосове повідомлення, щоб я його розпізнав")
+    if "ocr" in features:
+        media.append("фото, щоб я витягнув текст")
+    if media:
+        lines.append(f"(Надішліть {'; '.join(media)}.)")
+    return "\n".join(lines)
+
+
+async def answer(services, update, user_msg):
+    """Відповідає на текст user_msg (з повідомлення, голосу чи фото)."""
+    chat_id = update.effective_chat.id
+    log_event(logger, "text_message", chat_id=chat_id, text=user_msg)
+    doc_index = services.doc_index
+    system_prompt = build_system_prompt(doc_index.search(user_msg) if doc_index is not None else [], CORE_PROMPT)
+    history = services.history
+    if history is not None:
+        await history.append(chat_id, "user", user_msg)
+        messages = [{"role": "system", "content": system_prompt}] + history.messages(chat_id)
+    else:
+        messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_msg}]
+    streamed = False
+
+    async def ask_openai():
+        nonlocal streamed
+        if not STREAM_REPLIES:
+            return await services.llm.chat(messages, temperature=0.7)
+        # Відповідь показується користувачу в міру надходження
+        streamed = True
+        return await stream_reply(update.message, services.llm.stream_chat(messages, temperature=0.7))
+
+    try:
+        if history is not None:
+            assistant_reply = await ask_openai()
+        else:
+            assistant_reply = await services.answer_cache.get_or_create(
+                services.llm.model, system_prompt, user_msg, ask_openai
+            )
+        log_event(logger, "openai_reply", chat_id=chat_id, reply=assistant_reply)
+        if not streamed:
+            await reply_long_text(update.message, assistant_reply)
+    except Exception as e:
+        logger.error(f"Помилка OpenAI: {e}")
+        assistant_reply = ERROR_TEXT
+        await update.message.reply_text(assistant_reply)
+
+    if history is not None:
+        await history.append(chat_id, "assistant", assistant_reply)
+
+
+async def route(services, update, user_msg):
+    """Виконує розпізнану локально команду; False — текст іде до LLM."""
+    enabled = {HELP, FIND_PDF, CREATE_PDF} if "pdf" in services.features else {HELP}
+    intent = classify(user_msg, enabled)
+    if intent.name == CHAT:
+        return False
+    log_event(logger, "intent_routed", chat_id=update.effective_chat.id, intent=intent.name, source=intent.source)
+    if intent.name == HELP:
+        await update.message.reply_text(help_text(services.features))
+        return True
+    if intent.name == FIND_PDF:
+        if not intent.argument:
+            await update.message.reply_text("Напишіть назву файлу, наприклад: знайди PDF Anmeldung")
+            return True
+        # Модель могла помилитись: якщо файлів немає, це звичайне питання
+        return await find_pdf(services, update, intent.argument, reply_missing=intent.source == "rule")
+    # CREATE_PDF: «збережи це у PDF» без тексту — остання відповідь асистента
+    text = intent.argument
+    if not text and services.history is not None:
+        text = await services.history.last_reply(update.effective_chat.id)
+    if not text:
+        await update.message.reply_text("Напишіть текст після двокрапки, наприклад: створи PDF: <текст>")
+        return True
+    await create_pdf(services, update, text)
+    return True
+
+
+def register(application, services):
+    scheduler = services.scheduler
+
+    @scheduler.handler("text")
+    async def start_command(update, context):
+        await update.message.reply_text(START_TEXT)
+
+    @scheduler.handler("text")
+    async def help_command(update, context):
+        await update.message.reply_text(help_text(services.features))
+
+    @scheduler.handler("text")
+    async def text_message(update, context):
+        log_event(logger, "message_received", chat_id=update.effective_chat.id, kind="text")
+        if not await route(services, update, update.message.text):
+            await answer(services, update, update.message.text)
+
+    application.add_handler(CommandHandler("start", start_command))
+    application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, text_message))
@@ -0,0 +1,88 @@
+"""
+Фото документів: OCR у пулі процесів, далі відповідь як на текст.
+
+Мови і режими PSM, з яких OCREngine.recognize обирає план за мініатюрою
+фото, задаються OCR_LANG / OCR_PSM_MODES (через кому; за рівної
+впевненості перевага — раніше вказаним). Як у bot2.py, лише німецькі листи:
+OCR_LANG=deu OCR_PSM_MODES=6,3,4.
+Сторінки альбому розпізнаються одночасно і йдуть у LLM одним запитом
+(brama/media_group.py).
+"""
+
+import logging
+import os
+
+from telegram.ext import MessageHandler, filters
+
+from brama.features.chat import answer
+from brama.log import log_event
+from brama.media_fetch import MEDIA_MAX_PHOTO_BYTES, MediaTooLarge, pick_photo
+from brama.media_group import MediaGroupCollector, join_pages, recognize_pages
+
+logger = logging.getLogger(__name__)
+
+OCR_LANG = os.getenv("OCR_LANG", "ukr+eng,deu")
+OCR_LANGS = tuple(lang.strip() for lang in OCR_LANG.split(",") if lang.strip())
+OCR_PSM_MODES = tuple(int(psm) for psm in os.getenv("OCR_PSM_MODES", "3,6").split(",") if psm.strip())
+
+EMPTY_TEXT = (
+    "Не вдалося розпізнати текст. Спробуйте:\n"
+    "1. Використати чіткіше фото\n"
+    "2. Збільшити контрастність тексту\n"
+    "3. Уникати тіней або відблисків"
+)
+
+
+async def recognize_photo(services, message, context):
+    photo = pick_photo(message.photo)  # найменший розмір, якого досить для OCR
+    cache_key = f"ocr:{OCR_LANG}"
+    # Кеш за file_unique_id: при збігу фото не завантажується
+    text_result = await services.media_cache.get(cache_key, photo.file_unique_id)
+    if text_result is not None:
+        log_event(logger, "ocr_cache_hit", chat_id=message.chat_id)
+        return text_result
+
+    with await services.media_fetcher.fetch(context.bot, photo, MEDIA_MAX_PHOTO_BYTES, "photo.jpg") as media:
+        text_result, plan = await services.ocr.recognize(media.view(), langs=OCR_LANGS, psm_modes=OCR_PSM_MODES)
+        log_event(
+            logger, "ocr_plan", chat_id=message.chat_id, lang=plan.lang, psm=plan.psm, rotate=plan.rotate,
+            confidence=round(plan.confidence), source=plan.source, full_passes=plan.full_passes,
+        )
+    if text_result.strip():
+        await services.media_cache.put(cache_key, photo.file_unique_id, text_result)
+    return text_result
+
+
+def register(application, services):
+    media_groups = MediaGroupCollector()
+
+    @services.scheduler.handler("media")
+    async def photo_message(update, context, pages):
+        chat_id = update.effective_chat.id
+        log_event(logger, "message_received", chat_id=chat_id, kind="photo", pages=len(pages))
+        try:
+            texts = await recognize_pages(lambda message: recognize_photo(services, message, context), pages)
+        except MediaTooLarge:
+            await update.message.reply_text("Фото завелике для обробки.")
+            return
+        except Exception as e:
+            logger.error(f"Помилка при OCR фото: {e}")
+            await update.message.reply_text("Не вдалося обробити це зображення.")
+            return
+        text_result = join_pages([" ".join(text.split()) for text in texts])
+        if not text_result.strip():
+            log_event(logger, "ocr_empty", logging.WARNING, chat_id=chat_id)
+            await update.message.reply_text(EMPTY_TEXT)
+            return
+
+        log_event(logger, "ocr_result", chat_id=chat_id, chars=len(text_result), ocr_text=text_result)
+        await services.outbound.reply_text(update.message, f"Розпізнаний текст:\n{text_result}")
+        await answer(services, update, text_result)
+
+    async def photo_received(update, context):
+        # Альбом збирається до планувальника: інакше сторінки чекали б у черзі чату за першою
+        pages = await media_groups.collect(update.message)
+        if pages is not None:
+            await photo_message(update, context, pages)
+
+    application.add_handler(MessageHandler(filters.PHOTO, photo_received))
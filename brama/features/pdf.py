@@ -0,0 +1,60 @@
+"""PDF: /findpdf шукає файли у PDF_FOLDER, /createpdf створює PDF з тексту."""
+
+import logging
+from datetime import datetime
+
+from telegram.ext import CommandHandler
+
+from brama.log import log_event
+
+logger = logging.getLogger(__name__)
+
+
+async def find_pdf(services, update, query, reply_missing=True):
+    """Надсилає знайдені файли; повертає False, якщо нічого не знайдено."""
+    chat_id = update.effective_chat.id
+    log_event(logger, "pdf_search", chat_id=chat_id, query=query)
+    found_files = services.pdf_catalog.search(query)
+    if not found_files:
+        log_event(logger, "pdf_not_found", chat_id=chat_id)
+        if reply_missing:
+            await update.message.reply_text(f"Не знайдено PDF із назвою, що містить: {query}")
+        return False
+
+    log_event(logger, "pdf_found", chat_id=chat_id, files=[f.name for f in found_files])
+    # Один список замість окремого повідомлення перед кожним файлом
+    names = "\n".join(f"• {f.name}" for f in found_files)
+    await services.outbound.reply_text(update.message, f"Знайдено файли:\n{names}\nНадсилаю...")
+    for f in found_files:
+        try:
+            await services.file_id_cache.send_document(update.message, f.path, f.name, f.size, f.mtime)
+        except Exception as e:
+            await update.message.reply_text(f"Помилка при відправці файлу {f.name}: {e}")
+    return True
+
+
+async def create_pdf(services, update, text):
+    pdf_bytes = await services.pdf_renderer.render(text, title="Створений PDF-файл:")
+    pdf_name = f"created_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    log_event(logger, "pdf_created", chat_id=update.effective_chat.id, filename=pdf_name)
+    await update.message.reply_document(document=pdf_bytes, filename=pdf_name)
+
+
+def register(application, services):
+    @services.scheduler.handler("media")
+    async def findpdf_command(update, context):
+        if not context.args:
+            await update.message.reply_text("Синтаксис: /findpdf <назва файлу>")
+            return
+        await find_pdf(services, update, " ".join(context.args))
+
+    @services.scheduler.handler("media")
+    async def createpdf_command(update, context):
+        user_text = " ".join(context.args)
+        if not user_text.strip():
+            await update.message.reply_text("Синтаксис: /createpdf <текст для PDF>")
+            return
+        await create_pdf(services, update, user_text)
+
+    application.add_handler(CommandHandler("findpdf", findpdf_command))
+    application.add_handler(CommandHandler("createpdf", createpdf_command))
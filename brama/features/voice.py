@@ -0,0 +1,52 @@
+"""Голосові повідомлення: Whisper, далі відповідь як на текст."""
+
+import logging
+
+from telegram.ext import MessageHandler, filters
+
+from brama.features.chat import answer, route
+from brama.log import log_event
+from brama.media_fetch import MEDIA_MAX_VOICE_BYTES, MediaTooLarge
+
+logger = logging.getLogger(__name__)
+
+VOICE_LANGUAGE = "uk"
+
+
+async def transcribe_voice(services, update, context):
+    voice = update.message.voice
+    # Те саме голосове (наприклад, переслане) вже розпізнавали — не завантажуємо його
+    cache_key = f"voice:{VOICE_LANGUAGE}"
+    text_result = await services.media_cache.get(cache_key, voice.file_unique_id)
+    if text_result is None:
+        with await services.media_fetcher.fetch(context.bot, voice, MEDIA_MAX_VOICE_BYTES, "audio.ogg") as media:
+            text_result = await services.transcriber.transcribe(
+                media.open(), language=VOICE_LANGUAGE, duration=voice.duration
+            )
+        if text_result.strip():
+            await services.media_cache.put(cache_key, voice.file_unique_id, text_result)
+    return text_result
+
+
+def register(application, services):
+    @services.scheduler.handler("voice")
+    async def voice_message(update, context):
+        chat_id = update.effective_chat.id
+        log_event(logger, "message_received", chat_id=chat_id, kind="voice")
+        try:
+            text_result = await transcribe_voice(services, update, context)
+        except MediaTooLarge:
+            await update.message.reply_text("Голосове повідомлення задовге для обробки.")
+            return
+        except Exception as e:
+            logger.error(f"Помилка при транскрипції голосу: {e}")
+            text_result = ""
+        if not text_result.strip():
+            await update.message.reply_text("Вибачте, не вдалося розпізнати голос.")
+            return
+        log_event(logger, "voice_transcribed", chat_id=chat_id, text=text_result)
+        await services.outbound.reply_text(update.message, f"Розпізнаний текст: {text_result}")
+        if not await route(services, update, text_result):
+            await answer(services, update, text_result)
+
+    application.add_handler(MessageHandler(filters.VOICE, voice_message))
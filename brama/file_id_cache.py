@@ -0,0 +1,129 @@
+"""
+Кеш file_id для документів, які бот уже надсилав.
+
+Після першого завантаження файлу Telegram повертає file_id; далі той самий
+файл надсилається лише за цим ідентифікатором, без повторного завантаження
+байтів. Ключ — шлях, розмір і mtime файлу (змінений файл завантажиться
+заново). Кеш зберігається у SQLite і повністю тримається в пам'яті;
+читання файлів і запис у базу виконуються поза циклом подій.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from telegram.error import BadRequest
+
+from brama.metrics import track_cache
+
+logger = logging.getLogger(__name__)
+
+FILE_ID_DB = os.getenv("FILE_ID_DB", "file_ids.db")
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class FileIdCache:
+    """Постійна відповідність (бот, файл) -> file_id від Telegram."""
+
+    def __init__(self, path=FILE_ID_DB):
+        self.path = path
+        self._file_ids = None
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="file-id-db")
+        self.hits = 0
+        self.misses = 0
+        track_cache("file_id", self)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    # --------------------- Код, що виконується у потоці бази ---------------------
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_ids ("
+                " cache_key TEXT PRIMARY KEY,"
+                " file_id TEXT NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _load_sync(self):
+        return dict(self._connect().execute("SELECT cache_key, file_id FROM file_ids"))
+
+    def _put_sync(self, key, file_id):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO file_ids (cache_key, file_id) VALUES (?, ?)",
+                (key, file_id),
+            )
+
+    def _delete_sync(self, key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM file_ids WHERE cache_key = ?", (key,))
+
+    # --------------------- Асинхронний інтерфейс ---------------------
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _ensure_loaded(self):
+        if self._file_ids is None:
+            file_ids = await self._run(self._load_sync)
+            if self._file_ids is None:
+                self._file_ids = file_ids
+                logger.info(f"Кеш file_id: завантажено {len(file_ids)} записів")
+
+    @staticmethod
+    def make_key(bot_id, path, size, mtime):
+        return f"{bot_id}:{os.path.abspath(path)}:{size}:{mtime}"
+
+    async def send_document(self, message, path, filename=None, size=None, mtime=None):
+        """
+        Надсилає файл у відповідь на повідомлення, за можливості — за file_id.
+        size/mtime можна передати з каталогу, щоб не робити stat() повторно.
+        """
+        filename = filename or os.path.basename(path)
+        if size is None or mtime is None:
+            st = await asyncio.to_thread(os.stat, path)
+            size, mtime = st.st_size, st.st_mtime
+        await self._ensure_loaded()
+        key = self.make_key(message.get_bot().id, path, size, mtime)
+
+        file_id = self._file_ids.get(key)
+        if file_id is not None:
+            try:
+                sent = await message.reply_document(document=file_id)
+                self.hits += 1
+                return sent
+            except BadRequest as e:
+                # file_id більше не дійсний — завантажуємо файл заново
+                logger.warning(f"Недійсний file_id для {filename}: {e}")
+                self._file_ids.pop(key, None)
+                await self._run(self._delete_sync, key)
+
+        self.misses += 1
+        data = await asyncio.to_thread(_read_file, path)
+        sent = await message.reply_document(document=data, filename=filename)
+        if sent.document is not None:
+            self._file_ids[key] = sent.document.file_id
+            await self._run(self._put_sync, key, sent.document.file_id)
+        return sent
+
+    def close(self):
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self._executor.submit(_close)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,183 @@
+"""
+Історія розмов з обмеженням за токенами.
+
+Для кожного чату зберігається лише стільки останніх повідомлень, скільки
+вміщується у бюджет токенів. Старіші повідомлення згортаються у короткий
+поточний підсумок (теж обмежений за розміром), а кількість чатів у пам'яті
+обмежена: найдавніше використані чати витісняються (LRU). Тому розмір
+запиту до OpenAI і пам'ять процесу не ростуть, хоч як довго триває розмова.
+
+Якщо задано сховище (brama.history_store), кеш у пам'яті стоїть перед ним:
+читання не торкаються диска, нові повідомлення пишуться у фоні, а історія
+чату, якого немає в кеші, підвантажується лише при його наступному записі.
+"""
+
+import logging
+import os
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "2000"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+HISTORY_MAX_CHATS = int(os.getenv("HISTORY_MAX_CHATS", "5000"))
+
+# Скільки символів з кожного старого повідомлення потрапляє у підсумок
+SUMMARY_SNIPPET_CHARS = 200
+
+
+# --------------------- Підрахунок токенів ---------------------
+class TokenCounter:
+    """
+    Локальний підрахунок токенів через tiktoken.
+    Якщо tiktoken не встановлено, використовується груба оцінка за довжиною.
+    """
+
+    def __init__(self, model="gpt-4"):
+        self.model = model
+        self._encoding = None
+        self._loaded = False
+
+    def _get_encoding(self):
+        if not self._loaded:
+            self._loaded = True
+            try:
+                import tiktoken
+                try:
+                    self._encoding = tiktoken.encoding_for_model(self.model)
+                except KeyError:
+                    self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken недоступний, використовується оцінка токенів: {e}")
+        return self._encoding
+
+    def count(self, text):
+        encoding = self._get_encoding()
+        if encoding is None:
+            # Кирилиця займає більше токенів на символ, ніж латиниця
+            return len(text) // 3 + 1
+        return len(encoding.encode(text))
+
+    def count_message(self, message):
+        # ~4 службові токени на кожне повідомлення у форматі ChatCompletion
+        return self.count(message["content"]) + 4
+
+
+# --------------------- Історія чатів ---------------------
+class _ChatState:
+    __slots__ = ("turns", "tokens", "summary", "summary_tokens")
+
+    def __init__(self):
+        self.turns = deque()  # (повідомлення, кількість токенів)
+        self.tokens = 0
+        self.summary = deque()  # (рядок підсумку, кількість токенів)
+        self.summary_tokens = 0
+
+
+class ChatHistory:
+    """Обмежена історія розмов: бюджет токенів на чат + LRU за кількістю чатів."""
+
+    def __init__(
+        self,
+        model="gpt-4",
+        max_tokens=HISTORY_MAX_TOKENS,
+        summary_tokens=HISTORY_SUMMARY_TOKENS,
+        max_chats=HISTORY_MAX_CHATS,
+        backend=None,
+    ):
+        self.backend = backend
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.max_chats = max_chats
+        self.counter = TokenCounter(model)
+        self._chats = OrderedDict()
+
+    def __len__(self):
+        return len(self._chats)
+
+    def _new_state(self, chat_id):
+        state = self._chats[chat_id] = _ChatState()
+        while len(self._chats) > self.max_chats:
+            evicted_id, _ = self._chats.popitem(last=False)
+            logger.debug(f"Історію чату {evicted_id} витіснено з пам'яті")
+        return state
+
+    def _get_state(self, chat_id):
+        state = self._chats.get(chat_id)
+        if state is None:
+            return self._new_state(chat_id)
+        self._chats.move_to_end(chat_id)
+        return state
+
+    async def _load_state(self, chat_id):
+        if chat_id in self._chats or self.backend is None:
+            return self._get_state(chat_id)
+        rows = await self.backend.load(chat_id)
+        # Поки чекали на базу, чат міг бути завантажений іншим повідомленням
+        if chat_id in self._chats:
+            return self._get_state(chat_id)
+        state = self._new_state(chat_id)
+        for role, content in rows:
+            self._add(state, role, content)
+        return state
+
+    async def append(self, chat_id, role, content):
+        """Додає повідомлення і згортає старі, якщо бюджет токенів перевищено."""
+        state = await self._load_state(chat_id)
+        self._add(state, role, content)
+        if self.backend is not None:
+            self.backend.save(chat_id, role, content)
+
+    def _add(self, state, role, content):
+        message = {"role": role, "content": content}
+        tokens = self.counter.count_message(message)
+        state.turns.append((message, tokens))
+        state.tokens += tokens
+
+        # Останнє повідомлення залишається завжди, навіть якщо воно завелике
+        while state.tokens > self.max_tokens and len(state.turns) > 1:
+            old_message, old_tokens = state.turns.popleft()
+            state.tokens -= old_tokens
+            self._fold_into_summary(state, old_message)
+
+    def _fold_into_summary(self, state, message):
+        label = "Користувач" if message["role"] == "user" else "Асистент"
+        snippet = " ".join(message["content"].split())
+        if len(snippet) > SUMMARY_SNIPPET_CHARS:
+            snippet = snippet[:SUMMARY_SNIPPET_CHARS] + "…"
+        line = f"{label}: {snippet}"
+        tokens = self.counter.count(line)
+        state.summary.append((line, tokens))
+        state.summary_tokens += tokens
+        while state.summary_tokens > self.summary_tokens and state.summary:
+            _, old_tokens = state.summary.popleft()
+            state.summary_tokens -= old_tokens
+
+    def messages(self, chat_id):
+        """Повертає історію чату у форматі ChatCompletion (з підсумком, якщо є)."""
+        state = self._get_state(chat_id)
+        result = []
+        if state.summary:
+            summary = "\n".join(line for line, _ in state.summary)
+            result.append({
+                "role": "system",
+                "content": f"Короткий зміст попередньої частини розмови:\n{summary}",
+            })
+        result.extend(message for message, _ in state.turns)
+        return result
+
+    async def last_reply(self, chat_id):
+        """Остання відповідь асистента в чаті (порожній рядок, якщо її немає)."""
+        state = await self._load_state(chat_id)
+        for message, _ in reversed(state.turns):
+            if message["role"] == "assistant":
+                return message["content"]
+        return ""
+
+    def clear(self, chat_id):
+        self._chats.pop(chat_id, None)
+
+    async def close(self):
+        """Дописує чергу сховища і закриває його (при зупинці бота)."""
+        if self.backend is not None:
+            await self.backend.close()
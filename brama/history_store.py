@@ -0,0 +1,172 @@
+"""
+Постійне сховище історії розмов.
+
+За замовчуванням — SQLite у режимі WAL. Записи не виконуються одразу:
+вони складаються у чергу і пишуться пакетами у фоновому потоці, тому
+обробники не чекають на диск. Історія чату читається з бази лише тоді,
+коли чату немає у гарячому кеші (див. brama.history.ChatHistory).
+
+Кілька процесів можуть працювати з однією базою (WAL дозволяє паралельне
+читання), але гарячий кеш у кожному процесі свій, тож один чат має
+обслуговуватися одним процесом.
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "sqlite")
+HISTORY_DB = os.getenv("HISTORY_DB", "history.db")
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.5"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "200"))
+# Скільки останніх повідомлень чату зберігати у базі
+HISTORY_KEEP_MESSAGES = int(os.getenv("HISTORY_KEEP_MESSAGES", "200"))
+
+
+class HistoryBackend:
+    """Інтерфейс сховища: завантаження історії чату та асинхронний запис."""
+
+    async def load(self, chat_id):
+        """Повертає список (role, content) у хронологічному порядку."""
+        return []
+
+    def save(self, chat_id, role, content):
+        """Ставить повідомлення в чергу на запис (без очікування)."""
+
+    async def flush(self):
+        """Записує все, що накопичилося в черзі."""
+
+    async def close(self):
+        """Записує залишки черги та закриває сховище."""
+
+
+class SQLiteHistoryBackend(HistoryBackend):
+    """SQLite (WAL) з пакетним записом у фоновому потоці."""
+
+    def __init__(
+        self,
+        path=HISTORY_DB,
+        flush_interval=HISTORY_FLUSH_INTERVAL,
+        batch_size=HISTORY_BATCH_SIZE,
+        keep_messages=HISTORY_KEEP_MESSAGES,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.keep_messages = keep_messages
+        self._pending = []
+        self._conn = None
+        # Один потік — одне з'єднання: усі операції з базою виконуються послідовно
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-db")
+        self._writer_task = None
+        self._wakeup = None
+
+    # --------------------- Код, що виконується у потоці бази ---------------------
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " chat_id INTEGER NOT NULL,"
+                " role TEXT NOT NULL,"
+                " content TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages(chat_id, id)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _load_sync(self, chat_id):
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT role, content FROM ("
+            " SELECT id, role, content FROM messages"
+            " WHERE chat_id = ? ORDER BY id DESC LIMIT ?"
+            ") ORDER BY id",
+            (chat_id, self.keep_messages),
+        ).fetchall()
+        return rows
+
+    def _write_sync(self, batch):
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT INTO messages (chat_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                batch,
+            )
+            # Обрізаємо старі повідомлення лише тих чатів, що були в пакеті
+            for chat_id in {row[0] for row in batch}:
+                conn.execute(
+                    "DELETE FROM messages WHERE chat_id = ? AND id <= ("
+                    " SELECT id FROM messages WHERE chat_id = ?"
+                    " ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                    (chat_id, chat_id, self.keep_messages),
+                )
+
+    def _close_sync(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # --------------------- Асинхронний інтерфейс ---------------------
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def load(self, chat_id):
+        # Спочатку дописуємо чергу, щоб не втратити щойно збережені повідомлення
+        await self.flush()
+        return await self._run(self._load_sync, chat_id)
+
+    def save(self, chat_id, role, content):
+        self._pending.append((chat_id, role, content, time.time()))
+        if self._writer_task is None:
+            self._wakeup = asyncio.Event()
+            self._writer_task = asyncio.create_task(self._writer_loop())
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _writer_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Помилка запису історії у базу: {e}")
+
+    async def flush(self):
+        while self._pending:
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            await self._run(self._write_sync, batch)
+
+    async def close(self):
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            self._writer_task = None
+        await self.flush()
+        await self._run(self._close_sync)
+        self._executor.shutdown(wait=True)
+
+
+def create_history_backend(kind=HISTORY_BACKEND):
+    """Створює сховище історії за назвою: "sqlite" (за замовчуванням) або "memory"."""
+    if kind == "sqlite":
+        return SQLiteHistoryBackend()
+    if kind == "memory":
+        return None
+    raise ValueError(f"Невідоме сховище історії: {kind}")
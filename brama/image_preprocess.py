@@ -0,0 +1,124 @@
+"""
+Попередня обробка фото документів перед OCR (OpenCV + NumPy).
+
+Кроки (порядок і склад задаються через OCR_PREPROCESS_STEPS):
+  grayscale — декодування одразу у відтінки сірого;
+  downscale — зменшення до цільової роздільності (OCR_TARGET_DPI);
+  denoise   — медіанний фільтр проти шуму камери;
+  deskew    — вирівнювання нахилу тексту;
+  threshold — адаптивна бінаризація (нерівне освітлення, тіні);
+  crop      — обрізання до області з текстом.
+
+Кожен крок вимірюється окремо. Менше і чистіше зображення пришвидшує
+Tesseract і покращує розпізнавання фото листів.
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+OCR_PREPROCESS_STEPS = tuple(
+    step.strip()
+    for step in os.getenv("OCR_PREPROCESS_STEPS", "grayscale,downscale,denoise,deskew,threshold,crop").split(",")
+    if step.strip()
+)
+OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+
+# Довша сторона аркуша A4 у дюймах: вважаємо, що лист займає все фото
+A4_LONG_SIDE_INCHES = 11.69
+# Більший кут — це, найімовірніше, не нахил тексту, а помилка оцінки
+MAX_DESKEW_ANGLE = 15.0
+CROP_MARGIN = 20
+
+
+def _downscale(img, target_dpi=OCR_TARGET_DPI):
+    estimated_dpi = max(img.shape[:2]) / A4_LONG_SIDE_INCHES
+    if estimated_dpi <= target_dpi:
+        return img
+    scale = target_dpi / estimated_dpi
+    return cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def _denoise(img):
+    return cv2.medianBlur(img, 3)
+
+
+def _deskew(img):
+    # Кут нахилу — з мінімального прямокутника навколо всіх темних пікселів
+    _, inverted = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    coords = cv2.findNonZero(inverted)
+    if coords is None:
+        return img
+    angle = cv2.minAreaRect(coords)[-1]
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    if abs(angle) < 0.5 or abs(angle) > MAX_DESKEW_ANGLE:
+        return img
+    h, w = img.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(img, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def _threshold(img):
+    return cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15)
+
+
+def _crop(img):
+    if img.dtype != np.uint8 or img.ndim != 2:
+        return img
+    _, inverted = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    # Прибираємо дрібний шум і розширюємо символи, щоб рядки злилися в одну область
+    inverted = cv2.morphologyEx(inverted, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+    coords = cv2.findNonZero(cv2.dilate(inverted, np.ones((5, 25), np.uint8)))
+    if coords is None:
+        return img
+    x, y, w, h = cv2.boundingRect(coords)
+    y0, y1 = max(y - CROP_MARGIN, 0), min(y + h + CROP_MARGIN, img.shape[0])
+    x0, x1 = max(x - CROP_MARGIN, 0), min(x + w + CROP_MARGIN, img.shape[1])
+    return img[y0:y1, x0:x1]
+
+
+_STEPS = {
+    "downscale": _downscale,
+    "denoise": _denoise,
+    "deskew": _deskew,
+    "threshold": _threshold,
+    "crop": _crop,
+}
+
+
+def preprocess_image(image_data, steps=OCR_PREPROCESS_STEPS):
+    """
+    Обробляє зображення (байти JPEG/PNG) і повертає (масив NumPy, час кроків у мс).
+    Без кроку "grayscale" зображення все одно переводиться у відтінки сірого,
+    бо решта кроків працює з одним каналом.
+    """
+    timings = {}
+    started = time.perf_counter()
+    buffer = np.frombuffer(image_data, dtype=np.uint8)
+    img = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError("Не вдалося декодувати зображення")
+    timings["grayscale"] = (time.perf_counter() - started) * 1000
+
+    for step in steps:
+        if step == "grayscale":
+            continue
+        func = _STEPS.get(step)
+        if func is None:
+            raise ValueError(f"Невідомий крок обробки зображення: {step}")
+        started = time.perf_counter()
+        img = func(img)
+        timings[step] = (time.perf_counter() - started) * 1000
+    return img, timings
+
+
+def encode_png(img):
+    ok, encoded = cv2.imencode(".png", img)
+    if not ok:
+        raise ValueError("Не вдалося закодувати зображення у PNG")
+    return encoded.tobytes()
@@ -0,0 +1,301 @@
+"""
+Локальне визначення наміру повідомлення до запиту в LLM.
+
+Прохання знайти чи створити PDF або показати довідку не потребують
+відповіді моделі: їх можна одразу передати відповідному обробнику і не
+чекати кілька секунд на ChatCompletion. Спершу перевіряються ключові
+фрази (точні правила), далі — маленький наївний баєсів класифікатор за
+символьними n-грамами, навчений при імпорті на вбудованих прикладах
+(українська, російська, німецька, англійська). Класифікація займає
+десятки мікросекунд. Якщо модель не впевнена, повідомлення довге або
+це питання ("Як створити PDF на телефоні?"), намір — звичайна розмова
+з LLM. Правило створення PDF спрацьовує лише з текстом документа
+("створи PDF: ...").
+"""
+
+import logging
+import math
+import os
+import re
+
+from brama.metrics import Counter
+from brama.pdf_catalog import tokenize
+
+logger = logging.getLogger(__name__)
+
+# Мінімальна ймовірність класу, з якою модель маршрутизує повідомлення
+INTENT_THRESHOLD = float(os.getenv("INTENT_THRESHOLD", "0.85"))
+# Довші повідомлення завжди йдуть до LLM
+INTENT_MAX_WORDS = int(os.getenv("INTENT_MAX_WORDS", "20"))
+
+CHAT = "chat"
+FIND_PDF = "find_pdf"
+CREATE_PDF = "create_pdf"
+HELP = "help"
+
+INTENTS = Counter("brama_intents_total", "Повідомлення за визначеним наміром", ("intent", "source"))
+
+# --------------------- Правила ---------------------
+_CREATE = r"(створ\w*|зроб\w*|згенеру\w*|сделай\w*|созда\w*|erstell\w*|mach\w*|generier\w*|create|make|generate)"
+_FIND = r"(знайд\w*|знайти|шука\w*|надішл\w*|скинь\w*|найд\w*|найти|пришли\w*|such\w*|find\w*|schick\w*|send)"
+_PDF = r"(pdf|пдф)"
+
+# Правила команд; create_pdf — лише якщо в повідомленні є текст документа
+RULES = (
+    (CREATE_PDF, re.compile(rf"\b{_CREATE}\b.{{0,30}}\b{_PDF}\b|\b{_PDF}\b.{{0,15}}\b(з|із|из|aus|from)\s+(текст\w*|text)")),
+    (FIND_PDF, re.compile(rf"\b{_FIND}\b.{{0,40}}\b{_PDF}\b|\b{_PDF}\b.{{0,40}}\b{_FIND}\b")),
+    (HELP, re.compile(
+        r"^(help|hilfe|допомога|помощь|команди|команды|що ти вмієш|что ты умеешь|які є команди|какие есть команды"
+        r"|was kannst du|welche befehle gibt es|what can you do)\W*$"
+    )),
+)
+
+# Питання про те, як щось зробити, — не команда PDF, а розмова з LLM
+# (довідка на кшталт «що ти вмієш?» лишається довідкою)
+PDF_INTENTS = (FIND_PDF, CREATE_PDF)
+QUESTION_RE = re.compile(
+    r"^(як|как|чи|можна|можно|що|что|чому|почему|навіщо|зачем|how|what|why|can|could|is|"
+    r"wie|was|warum|kann|ist)\b"
+)
+
+# Слова, які описують дію, а не назву файлу (прибираються із запиту пошуку)
+FILLER_WORDS = {
+    "pdf", "пдф", "мені", "мне", "mir", "me", "будь", "ласка", "пожалуйста", "bitte", "please",
+    "файл", "файли", "документ", "datei", "file", "a", "the", "den", "die", "das", "ein", "eine",
+    "у", "в", "з", "із", "на", "про", "для", "of", "for", "about", "für", "über", "zu", "форматі", "формате",
+    "я", "як", "де", "взяти", "дай", "є", "вас", "потрібен", "потрібна", "потрібно", "треба", "нужен", "нужна",
+    "где", "взять", "wo", "ich", "brauche", "i", "need", "where", "can", "get",
+}
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+# --------------------- Навчальні приклади ---------------------
+TRAINING_DATA = {
+    FIND_PDF: (
+        "знайди бланк заяви",
+        "знайди мені форму для jobcenter",
+        "надішли бланк anmeldung",
+        "скинь формуляр на кіндергельд",
+        "де взяти бланк заяви на bürgergeld",
+        "потрібен бланк для реєстрації",
+        "дай формуляр wohngeld",
+        "шукаю бланк заяви на житло",
+        "є у вас бланк антрагу",
+        "найди бланк заявления",
+        "пришли форму для регистрации",
+        "нужен бланк на киндергельд",
+        "где взять формуляр anmeldung",
+        "schick mir das formular",
+        "ich brauche den antrag auf wohngeld",
+        "such das formular für kindergeld",
+        "haben sie das anmeldeformular",
+        "send me the registration form",
+        "i need the kindergeld form",
+        "find the application form",
+    ),
+    CREATE_PDF: (
+        "створи документ з цього тексту",
+        "зроби документ з тексту",
+        "збережи це у файл",
+        "оформи цей текст документом",
+        "перетвори текст у документ",
+        "запиши це в документ",
+        "сделай документ из этого текста",
+        "сохрани это в файл",
+        "оформи текст документом",
+        "erstelle ein dokument aus diesem text",
+        "speichere das als dokument",
+        "mach daraus ein dokument",
+        "make a document from this text",
+        "save this as a document",
+        "turn this text into a document",
+    ),
+    CHAT: (
+        "як зареєструватися в jobcenter",
+        "що таке bürgergeld",
+        "мені прийшов лист від ausländerbehörde що робити",
+        "як заповнити заяву на кіндергельд",
+        "скільки коштує deutschlandticket",
+        "де знайти роботу в німеччині",
+        "як відкрити рахунок у банку",
+        "чи можна працювати під час інтеграційного курсу",
+        "які документи потрібні для anmeldung",
+        "поясни цей лист",
+        "привіт",
+        "дякую",
+        "добрий день у мене питання",
+        "як продовжити дозвіл на проживання",
+        "що написати в заяві",
+        "как зарегистрироваться в джобцентре",
+        "что делать если пришло письмо",
+        "какие документы нужны для регистрации",
+        "спасибо",
+        "wie beantrage ich kindergeld",
+        "wie beantrage ich wohngeld",
+        "wo muss ich den antrag abgeben",
+        "was muss ich im formular ausfüllen",
+        "можеш допомогти з заявою",
+        "допоможи заповнити бланк",
+        "дякую за допомогу",
+        "як подати заяву на житло",
+        "що писати у формулярі",
+        "помоги заполнить заявление",
+        "how do i fill in the form",
+        "я шукаю квартиру",
+        "шукаю роботу",
+        "ищу работу",
+        "ich suche eine wohnung",
+        "was ist eine meldebescheinigung",
+        "wo finde ich einen deutschkurs",
+        "danke",
+        "how do i register my address",
+        "what is the jobcenter",
+        "thanks",
+        "hello",
+    ),
+}
+
+
+# --------------------- Модель ---------------------
+def features(text):
+    """Слова та символьні 3- і 4-грами слів (стійкі до відмінків і опечаток)."""
+    result = []
+    for token in tokenize(text):
+        result.append(f"w:{token}")
+        padded = f" {token} "
+        for n in (3, 4):
+            result.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return result
+
+
+class NaiveBayes:
+    """Мультиноміальний наївний Баєс зі згладжуванням Лапласа."""
+
+    def __init__(self, examples, alpha=0.5):
+        self.alpha = alpha
+        counts = {}
+        totals = {}
+        vocabulary = set()
+        for label, texts in examples.items():
+            label_counts = counts.setdefault(label, {})
+            for text in texts:
+                for feature in features(text):
+                    label_counts[feature] = label_counts.get(feature, 0) + 1
+                    vocabulary.add(feature)
+            totals[label] = sum(label_counts.values())
+        size = sum(len(texts) for texts in examples.values())
+        self.labels = tuple(examples)
+        self.vocabulary = vocabulary
+        self.priors = {label: math.log(len(examples[label]) / size) for label in self.labels}
+        # log P(ознака | клас) і значення для ознак, яких у класі не було
+        self.log_probs = {}
+        self.log_unseen = {}
+        for label in self.labels:
+            denominator = totals[label] + alpha * len(vocabulary)
+            self.log_probs[label] = {f: math.log((c + alpha) / denominator) for f, c in counts[label].items()}
+            self.log_unseen[label] = math.log(alpha / denominator)
+
+    def predict(self, text):
+        """
+        Повертає (клас, ймовірність); невідомі ознаки ігноруються. n-грами
+        одного слова сильно залежні, тому сума логарифмів масштабується до
+        кількості слів — інакше ймовірність майже завжди 1.0.
+        """
+        words = tokenize(text)
+        known = [f for f in features(text) if f in self.vocabulary]
+        if not known:
+            return CHAT, 0.0
+        scale = len(words) / len(known)
+        scores = {}
+        for label in self.labels:
+            log_probs = self.log_probs[label]
+            unseen = self.log_unseen[label]
+            scores[label] = self.priors[label] + scale * sum(log_probs.get(f, unseen) for f in known)
+        best = max(scores, key=scores.get)
+        top = scores[best]
+        total = sum(math.exp(score - top) for score in scores.values())
+        return best, 1.0 / total
+
+
+class Intent:
+    __slots__ = ("name", "confidence", "source", "argument")
+
+    def __init__(self, name, confidence, source, argument=""):
+        self.name = name
+        self.confidence = confidence
+        self.source = source
+        self.argument = argument
+
+    def __repr__(self):
+        return f"Intent({self.name!r}, {self.confidence:.2f}, {self.source!r}, {self.argument!r})"
+
+
+# --------------------- Аргументи ---------------------
+_COLON_RE = re.compile(r"[:\n]")
+
+
+def pdf_query(text):
+    """Назва файлу для пошуку: слова запиту без дієслів і службових слів."""
+    words = _WORD_RE.findall(text.casefold())
+    return " ".join(w for w in words if w not in FILLER_WORDS and not re.fullmatch(_FIND, w))
+
+
+def pdf_text(text):
+    """Текст для PDF: усе після двокрапки (або першого рядка) в «створи PDF: ...»."""
+    parts = _COLON_RE.split(text, maxsplit=1)
+    return parts[1].strip() if len(parts) == 2 else ""
+
+
+class IntentRouter:
+    def __init__(self, examples=TRAINING_DATA, threshold=INTENT_THRESHOLD, max_words=INTENT_MAX_WORDS):
+        self.model = NaiveBayes(examples)
+        self.threshold = threshold
+        self.max_words = max_words
+
+    def _classify(self, text):
+        # Команда — у першому рядку до двокрапки; решта — текст для PDF
+        head = text.casefold().split("\n", 1)[0].split(":", 1)[0]
+        head = " ".join(head.split())
+        question = QUESTION_RE.match(head) is not None
+        for name, pattern in RULES:
+            if (question and name in PDF_INTENTS) or (name == CREATE_PDF and not pdf_text(text)):
+                continue
+            if pattern.search(head):
+                return Intent(name, 1.0, "rule")
+        if len(head.split()) > self.max_words:
+            return Intent(CHAT, 1.0, "length")
+        name, confidence = self.model.predict(head)
+        if question and name in PDF_INTENTS:
+            return Intent(CHAT, 1.0, "question")
+        if name != CHAT and confidence < self.threshold:
+            return Intent(CHAT, confidence, "model")
+        return Intent(name, confidence, "model")
+
+    def classify(self, text, enabled=None):
+        """
+        Визначає намір тексту. enabled — намір, які обробляє бот (решта йде
+        до LLM). Для find_pdf аргумент — запит до каталогу, для create_pdf —
+        текст документа (порожній, якщо його немає в повідомленні).
+        """
+        intent = self._classify(text)
+        if intent.name == FIND_PDF:
+            intent.argument = pdf_query(text.split(":", 1)[-1] if ":" in text else text)
+        elif intent.name == CREATE_PDF:
+            intent.argument = pdf_text(text)
+        if enabled is not None and intent.name not in enabled:
+            intent = Intent(CHAT, intent.confidence, intent.source)
+        INTENTS.inc(intent.name, intent.source)
+        if intent.name != CHAT:
+            logger.debug("Намір %r для %r", intent, text[:80])
+        return intent
+
+
+_router = None
+
+
+def classify(text, enabled=None):
+    """Намір повідомлення; модель навчається при першому виклику."""
+    global _router
+    if _router is None:
+        _router = IntentRouter()
+    return _router.classify(text, enabled)
@@ -0,0 +1,139 @@
+"""
+Асинхронний клієнт OpenAI (ChatCompletion + Whisper) для всіх версій бота.
+
+Усі запити йдуть через одну спільну aiohttp-сесію з пулом з'єднань,
+кількість одночасних запитів обмежена семафором, а кожен виклик має
+власний таймаут. Так обробники не блокують цикл подій asyncio, і N
+одночасних чатів дають N паралельних запитів, а не N послідовних.
+"""
+
+import asyncio
+import logging
+import os
+
+import aiohttp
+import openai
+
+from brama.metrics import LLM_TOKENS, observe_stage, timed
+
+logger = logging.getLogger(__name__)
+
+# --------------------- Налаштування за замовчуванням ---------------------
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_TRANSCRIBE_TIMEOUT = float(os.getenv("OPENAI_TRANSCRIBE_TIMEOUT", "120"))
+OPENAI_POOL_SIZE = int(os.getenv("OPENAI_POOL_SIZE", "32"))
+
+
+class LLMClient:
+    """Спільний асинхронний клієнт для ChatCompletion та Whisper."""
+
+    def __init__(
+        self,
+        api_key=None,
+        model="gpt-4",
+        max_concurrency=OPENAI_MAX_CONCURRENCY,
+        timeout=OPENAI_TIMEOUT,
+        transcribe_timeout=OPENAI_TRANSCRIBE_TIMEOUT,
+        pool_size=OPENAI_POOL_SIZE,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.transcribe_timeout = transcribe_timeout
+        self.pool_size = pool_size
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+
+    def _get_session(self):
+        """Створює спільну сесію при першому виклику (всередині циклу подій)."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_size, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(connector=connector)
+        # openai.aiosession — це ContextVar, тому встановлюємо її в контексті
+        # поточної задачі, інакше бібліотека відкриє нову сесію на кожен запит.
+        openai.aiosession.set(self._session)
+        return self._session
+
+    async def chat(self, messages, temperature=0.7, model=None, timeout=None):
+        """Надсилає ChatCompletion і повертає текст відповіді асистента."""
+        self._get_session()
+        async with self._semaphore:
+            with timed("llm"):
+                response = await asyncio.wait_for(
+                    openai.ChatCompletion.acreate(
+                        model=model or self.model,
+                        messages=messages,
+                        temperature=temperature,
+                        api_key=self.api_key,
+                    ),
+                    timeout=timeout or self.timeout,
+                )
+        usage = response.get("usage")
+        if usage:
+            LLM_TOKENS.inc("prompt", amount=usage["prompt_tokens"])
+            LLM_TOKENS.inc("completion", amount=usage["completion_tokens"])
+        return response.choices[0].message.content
+
+    async def stream_chat(self, messages, temperature=0.7, model=None, timeout=None):
+        """
+        Асинхронний генератор фрагментів відповіді (stream=True).
+        Таймаут діє на очікування кожного наступного фрагмента.
+        """
+        self._get_session()
+        timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            with timed("llm"):
+                started = loop.time()
+                first_chunk = True
+                stream = await asyncio.wait_for(
+                    openai.ChatCompletion.acreate(
+                        model=model or self.model,
+                        messages=messages,
+                        temperature=temperature,
+                        api_key=self.api_key,
+                        stream=True,
+                    ),
+                    timeout=timeout,
+                )
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), timeout=timeout)
+                        except StopAsyncIteration:
+                            break
+                        if not chunk.choices:
+                            continue
+                        content = chunk.choices[0].delta.get("content")
+                        if content:
+                            if first_chunk:
+                                observe_stage("llm_first_token", loop.time() - started)
+                                first_chunk = False
+                            # У потоковому режимі usage немає: один фрагмент — приблизно один токен
+                            LLM_TOKENS.inc("completion")
+                            yield content
+                finally:
+                    await stream.aclose()
+
+    async def transcribe(self, audio_file, language="uk", model="whisper-1", timeout=None):
+        """Розпізнає аудіо через Whisper і повертає текст."""
+        self._get_session()
+        async with self._semaphore:
+            with timed("whisper"):
+                transcript = await asyncio.wait_for(
+                    openai.Audio.atranscribe(
+                        model=model,
+                        file=audio_file,
+                        language=language,
+                        api_key=self.api_key,
+                    ),
+                    timeout=timeout or self.transcribe_timeout,
+                )
+        return transcript["text"]
+
+    async def close(self):
+        """Закриває спільну сесію (викликається при зупинці бота)."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
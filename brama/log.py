@@ -0,0 +1,159 @@
+"""
+Неблокуюче структуроване логування.
+
+Обробник на корені logging лише кладе запис у чергу (без форматування і
+без запису у stdout), а окремий потік форматує та виводить записи. Так
+повільний stdout чи великий текст не затримують цикл подій.
+
+  log_event(logger, "ocr_result", chat_id=..., text=...)  — подія з полями;
+  LOG_FORMAT=json — один JSON-об'єкт на рядок (для збирачів логів);
+  LOG_SAMPLE="message_received=0.1,httpx=0.01" — частка записів, що
+      потрапляють у лог, за назвою події або логера (WARNING і вище — завжди);
+  LOG_REDACT=1 — текст користувачів, відповіді та OCR замінюються їх довжиною;
+  LOG_MAX_FIELD — довші значення полів обрізаються.
+Токени Telegram/OpenAI у повідомленнях (наприклад, у URL запитів httpx)
+маскуються. Коли черга переповнена, нові записи відкидаються і
+рахуються в метриці brama_log_dropped_total.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from brama.metrics import Counter
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_MAX_FIELD = int(os.getenv("LOG_MAX_FIELD", "300"))
+LOG_REDACT = os.getenv("LOG_REDACT", "1") == "1"
+LOG_SAMPLE = {
+    name.strip(): float(rate)
+    for name, rate in (
+        item.split("=", 1) for item in os.getenv("LOG_SAMPLE", "").split(",") if "=" in item
+    )
+}
+
+# Поля з текстом користувача або згенерованим текстом
+REDACT_FIELDS = frozenset({"text", "reply", "query", "ocr_text"})
+_SECRET_RE = re.compile(r"\b\d{6,}:[A-Za-z0-9_-]{30,}\b|\bsk-[A-Za-z0-9_-]{20,}")
+
+LOG_DROPPED = Counter("brama_log_dropped_total", "Записи логу, відкинуті через переповнену чергу")
+
+_handler = None
+_listener = None
+
+
+def _sampled(key, level):
+    rate = LOG_SAMPLE.get(key)
+    return rate is None or level >= logging.WARNING or random.random() < rate
+
+
+def log_event(logger, event, level=logging.INFO, **fields):
+    """Записує подію з полями; неактивні чи невибрані записи навіть не створюються."""
+    if not logger.isEnabledFor(level) or not _sampled(event, level):
+        return
+    logger.log(level, event, extra={"event": event, "fields": fields})
+
+
+def _clean(key, value):
+    if isinstance(value, str):
+        if LOG_REDACT and key in REDACT_FIELDS:
+            return f"<{len(value)} символів>"
+        if len(value) > LOG_MAX_FIELD:
+            return value[:LOG_MAX_FIELD] + f"... (+{len(value) - LOG_MAX_FIELD})"
+    return value
+
+
+# --------------------- Форматування (у потоці запису) ---------------------
+class _Formatter(logging.Formatter):
+    def __init__(self, fmt):
+        super().__init__()
+        self.json = fmt == "json"
+
+    def format(self, record):
+        message = _SECRET_RE.sub("***", record.getMessage())
+        fields = {key: _clean(key, value) for key, value in getattr(record, "fields", {}).items()}
+        exc_text = self.formatException(record.exc_info) if record.exc_info else None
+        if self.json:
+            data = {
+                "ts": round(record.created, 3),
+                "level": record.levelname,
+                "logger": record.name,
+                "msg": message,
+            }
+            data.update(fields)
+            if exc_text:
+                data["exc"] = exc_text
+            return json.dumps(data, ensure_ascii=False, default=str)
+
+        created = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record.created))
+        line = f"{created} {record.levelname} {record.name}: {message}"
+        if fields:
+            line += " " + " ".join(f"{key}={value!r}" for key, value in fields.items())
+        if exc_text:
+            line += "\n" + exc_text
+        return line
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # Черга в межах процесу: форматування відкладається до потоку запису
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+
+class _SampleFilter(logging.Filter):
+    def filter(self, record):
+        # Події log_event уже пройшли вибірку — вдруге не відкидаємо (інакше частка була б rate²)
+        if hasattr(record, "event"):
+            return True
+        return _sampled(record.name, record.levelno)
+
+
+# --------------------- Налаштування ---------------------
+def _start_listener():
+    global _listener
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(_Formatter(LOG_FORMAT))
+    _handler.queue = log_queue
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+
+
+def setup_logging(level=LOG_LEVEL):
+    """Замінює обробники кореневого логера на чергу з фоновим записом."""
+    global _handler
+    if _handler is not None:
+        return
+    _handler = _QueueHandler(None)
+    _handler.addFilter(_SampleFilter())
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    root.setLevel(level)
+    _start_listener()
+    atexit.register(flush_logging)
+    if hasattr(os, "register_at_fork"):
+        # Потік запису не переживає fork: у дочірньому процесі запускаємо новий
+        os.register_at_fork(after_in_child=_start_listener)
+
+
+def flush_logging():
+    """Дописує всі записи з черги (перед завершенням процесу)."""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
@@ -0,0 +1,123 @@
+"""
+Кеш результатів розпізнавання медіа (Whisper та OCR).
+
+Ключ — file_unique_id від Telegram: той самий файл, пересланий будь-ким,
+має той самий file_unique_id, тож при збігу не потрібні ні завантаження,
+ні розпізнавання. Інших ключів немає: перцептивні хеші різних листів з
+однаковим бланком майже збігаються (користувач отримав би чужий текст),
+а байти повторно надісланого фото Telegram перекодовує, тож хеш вмісту
+майже не дає збігів, але вимагав би завантаження перед кожним пошуком.
+Кеш зберігається у SQLite, кількість записів обмежена (витісняються
+найдавніше використані).
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from brama.metrics import track_cache
+
+logger = logging.getLogger(__name__)
+
+MEDIA_CACHE_DB = os.getenv("MEDIA_CACHE_DB", "media_cache.db")
+MEDIA_CACHE_SIZE = int(os.getenv("MEDIA_CACHE_SIZE", "10000"))
+
+
+class MediaCache:
+    """Постійний кеш: (вид, file_unique_id) -> розпізнаний текст."""
+
+    def __init__(self, path=MEDIA_CACHE_DB, max_size=MEDIA_CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="media-cache-db")
+        self.hits = 0
+        self.misses = 0
+        track_cache("media", self)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    # --------------------- Код, що виконується у потоці бази ---------------------
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS media_results ("
+                " kind TEXT NOT NULL,"
+                " unique_id TEXT NOT NULL,"
+                " result TEXT NOT NULL,"
+                " used_at REAL NOT NULL,"
+                " PRIMARY KEY (kind, unique_id))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_media_used ON media_results(used_at)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _get_sync(self, kind, unique_id):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT result FROM media_results WHERE kind = ? AND unique_id = ?",
+            (kind, unique_id),
+        ).fetchone()
+        if row is not None:
+            with conn:
+                conn.execute(
+                    "UPDATE media_results SET used_at = ? WHERE kind = ? AND unique_id = ?",
+                    (time.time(), kind, unique_id),
+                )
+        return row[0] if row else None
+
+    def _put_sync(self, kind, unique_id, result):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO media_results (kind, unique_id, result, used_at)"
+                " VALUES (?, ?, ?, ?)",
+                (kind, unique_id, result, time.time()),
+            )
+            count = conn.execute("SELECT COUNT(*) FROM media_results").fetchone()[0]
+            if count > self.max_size:
+                # Витісняємо з запасом (10%), щоб не чистити кеш на кожному записі
+                excess = count - self.max_size + self.max_size // 10
+                evicted = conn.execute(
+                    "SELECT kind, unique_id FROM media_results ORDER BY used_at LIMIT ?",
+                    (excess,),
+                ).fetchall()
+                conn.executemany(
+                    "DELETE FROM media_results WHERE kind = ? AND unique_id = ?", evicted
+                )
+
+    # --------------------- Асинхронний інтерфейс ---------------------
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def get(self, kind, unique_id):
+        """Результат за file_unique_id або None."""
+        result = await self._run(self._get_sync, kind, unique_id)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    async def put(self, kind, unique_id, result):
+        await self._run(self._put_sync, kind, unique_id, result)
+
+    def close(self):
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        self._executor.submit(_close)
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,181 @@
+"""
+Завантаження голосових і фото з Telegram потоком, з обмеженням розміру.
+
+download_as_bytearray() тримає весь файл у пам'яті (і PTB робить ще одну
+копію), а далі BytesIO, PIL і відправка у Whisper копіюють його знову.
+Тут файл читається частинами у MediaBuffer: до MEDIA_SPOOL_BYTES — у
+пам'яті, більший — у тимчасовому файлі на диску. Розмір обмежено ще до
+завантаження (за file_size від Telegram) і під час нього, тож пам'ять на
+одне фото чи голосове передбачувана. Споживачі отримують memoryview без
+копіювання (буфер BytesIO або mmap файлу) чи файловий об'єкт.
+
+Для OCR береться не найбільший PhotoSize, а найменший, довша сторона
+якого не менша за OCR_MIN_PHOTO_SIDE: попередня обробка все одно
+зменшує фото, а завантажувати і декодувати його вчетверо менше.
+"""
+
+import logging
+import mmap
+import os
+import tempfile
+from io import BytesIO
+
+from brama.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+MEDIA_MAX_PHOTO_BYTES = int(os.getenv("MEDIA_MAX_PHOTO_BYTES", str(10 * 1024 * 1024)))
+# Bot API віддає файли до 20 МБ
+MEDIA_MAX_VOICE_BYTES = int(os.getenv("MEDIA_MAX_VOICE_BYTES", str(20 * 1024 * 1024)))
+# Більші файли пишуться у тимчасовий файл, а не в пам'ять
+MEDIA_SPOOL_BYTES = int(os.getenv("MEDIA_SPOOL_BYTES", str(1024 * 1024)))
+MEDIA_TIMEOUT = float(os.getenv("MEDIA_TIMEOUT", "60"))
+OCR_MIN_PHOTO_SIDE = int(os.getenv("OCR_MIN_PHOTO_SIDE", "1280"))
+
+CHUNK_SIZE = 64 * 1024
+
+
+class MediaTooLarge(ValueError):
+    """Файл більший за дозволений розмір."""
+
+
+def pick_photo(sizes, min_side=OCR_MIN_PHOTO_SIDE):
+    """Найменший PhotoSize з довшою стороною >= min_side (інакше найбільший)."""
+    sizes = sorted(sizes, key=lambda s: s.width * s.height)
+    for size in sizes:
+        if max(size.width, size.height) >= min_side:
+            return size
+    return sizes[-1]
+
+
+class _NamedReader:
+    """Файловий об'єкт з потрібним ім'ям (за ним Whisper визначає формат)."""
+
+    def __init__(self, file, name):
+        self._file = file
+        self.name = name
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+
+class MediaBuffer:
+    """Вміст файлу: у пам'яті до spool_bytes, далі — у тимчасовому файлі."""
+
+    def __init__(self, name="file", spool_bytes=MEDIA_SPOOL_BYTES):
+        self.name = name
+        self.spool_bytes = spool_bytes
+        self.size = 0
+        self._memory = BytesIO()
+        self._disk = None
+        self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def on_disk(self):
+        return self._disk is not None
+
+    def write(self, chunk):
+        if self._disk is None and self.size + len(chunk) > self.spool_bytes:
+            self._disk = tempfile.TemporaryFile(prefix="brama-media-")
+            self._disk.write(self._memory.getbuffer())
+            self._memory = None
+        (self._disk or self._memory).write(chunk)
+        self.size += len(chunk)
+
+    def view(self):
+        """memoryview вмісту без копіювання."""
+        if self._disk is None:
+            return self._memory.getbuffer()
+        if self._mmap is None:
+            self._disk.flush()
+            self._mmap = mmap.mmap(self._disk.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap)
+
+    def open(self, name=None):
+        """Файловий об'єкт з початку вмісту (для Whisper і PIL) без копіювання."""
+        file = self._disk if self._disk is not None else self._memory
+        file.seek(0)
+        return _NamedReader(file, name or self.name)
+
+    def close(self):
+        # Поки споживач тримає memoryview, буфер не закривається — його звільнить збирач сміття
+        for resource in (self._mmap, self._disk, self._memory):
+            if resource is not None:
+                try:
+                    resource.close()
+                except BufferError:
+                    pass
+        self._mmap = self._disk = self._memory = None
+
+
+class MediaFetcher:
+    """Потокове завантаження файлів Telegram через спільну aiohttp-сесію."""
+
+    def __init__(self, spool_bytes=MEDIA_SPOOL_BYTES, timeout=MEDIA_TIMEOUT):
+        self.spool_bytes = spool_bytes
+        self.timeout = timeout
+        self._session = None
+
+    def _get_session(self):
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def fetch(self, bot, media, max_bytes, name="file"):
+        """
+        Завантажує media (Voice, PhotoSize...) у MediaBuffer. Якщо файл
+        більший за max_bytes, кидає MediaTooLarge — за можливості ще до
+        завантаження.
+        """
+        if media.file_size and media.file_size > max_bytes:
+            raise MediaTooLarge(f"Файл {media.file_size} Б більший за ліміт {max_bytes} Б")
+        with timed("download"):
+            tg_file = await bot.get_file(media.file_id)
+            if tg_file.file_size and tg_file.file_size > max_bytes:
+                raise MediaTooLarge(f"Файл {tg_file.file_size} Б більший за ліміт {max_bytes} Б")
+            buffer = MediaBuffer(name, self.spool_bytes)
+            try:
+                if tg_file.file_path.startswith(("http://", "https://")):
+                    await self._stream(tg_file.file_path, buffer, max_bytes)
+                else:
+                    # Локальний Bot API сервер: file_path — шлях до файлу на диску
+                    with open(tg_file.file_path, "rb") as f:
+                        while chunk := f.read(CHUNK_SIZE):
+                            self._append(buffer, chunk, max_bytes)
+            except BaseException:
+                buffer.close()
+                raise
+        return buffer
+
+    @staticmethod
+    def _append(buffer, chunk, max_bytes):
+        if buffer.size + len(chunk) > max_bytes:
+            raise MediaTooLarge(f"Файл більший за ліміт {max_bytes} Б")
+        buffer.write(chunk)
+
+    async def _stream(self, url, buffer, max_bytes):
+        async with self._get_session().get(url) as response:
+            response.raise_for_status()
+            if response.content_length and response.content_length > max_bytes:
+                raise MediaTooLarge(f"Файл {response.content_length} Б більший за ліміт {max_bytes} Б")
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                self._append(buffer, chunk, max_bytes)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
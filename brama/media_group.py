@@ -0,0 +1,88 @@
+"""
+Альбоми фото (media_group_id): багатосторінковий лист — одним запитом.
+
+Telegram надсилає кожне фото альбому окремим оновленням з тим самим
+media_group_id і не позначає останнє. MediaGroupCollector збирає їх ще
+до планувальника: перше оновлення групи чекає, доки нові сторінки не
+перестануть надходити MEDIA_GROUP_WINDOW секунд (але не довше за
+MEDIA_GROUP_MAX_WAIT), і отримує всі повідомлення за порядком
+message_id; решта оновлень групи отримують None і нічого не роблять.
+Далі сторінки розпізнаються одночасно, а текст іде в LLM одним запитом.
+"""
+
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MEDIA_GROUP_WINDOW = float(os.getenv("MEDIA_GROUP_WINDOW", "1.0"))
+MEDIA_GROUP_MAX_WAIT = float(os.getenv("MEDIA_GROUP_MAX_WAIT", "5"))
+
+
+class _Group:
+    __slots__ = ("messages", "changed")
+
+    def __init__(self, message):
+        self.messages = [message]
+        self.changed = asyncio.Event()
+
+
+class MediaGroupCollector:
+    """Збирає повідомлення одного альбому (чат + media_group_id)."""
+
+    def __init__(self, window=MEDIA_GROUP_WINDOW, max_wait=MEDIA_GROUP_MAX_WAIT):
+        self.window = window
+        self.max_wait = max_wait
+        self._groups = {}  # (chat_id, media_group_id) -> _Group
+
+    async def collect(self, message):
+        """
+        Сторінки альбому, до якого належить message, або None, якщо їх
+        обробляє інше оновлення. Повідомлення без альбому — [message] одразу.
+        """
+        if message.media_group_id is None:
+            return [message]
+        key = (message.chat_id, message.media_group_id)
+        group = self._groups.get(key)
+        if group is not None:
+            group.messages.append(message)
+            group.changed.set()
+            return None
+
+        group = self._groups[key] = _Group(message)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        try:
+            while (timeout := min(self.window, deadline - loop.time())) > 0:
+                group.changed.clear()
+                try:
+                    await asyncio.wait_for(group.changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+        finally:
+            # Сторінки, що прийдуть пізніше, стануть новою групою
+            del self._groups[key]
+        return sorted(group.messages, key=lambda m: m.message_id)
+
+
+async def recognize_pages(recognize, messages):
+    """
+    Запускає recognize(message) для всіх сторінок одночасно і повертає
+    тексти за порядком сторінок. Сторінка з помилкою дає порожній текст;
+    якщо не вдалося жодної, кидається помилка першої.
+    """
+    results = await asyncio.gather(*(recognize(m) for m in messages), return_exceptions=True)
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors and len(errors) == len(results):
+        raise errors[0]
+    for error in errors:
+        logger.error(f"Помилка при OCR сторінки альбому: {error}")
+    return ["" if isinstance(r, BaseException) else r for r in results]
+
+
+def join_pages(texts):
+    """Текст альбому: непорожні сторінки з номерами (одна сторінка — без номера)."""
+    if len(texts) == 1:
+        return texts[0]
+    return "\n\n".join(f"[Сторінка {i}]\n{text.strip()}" for i, text in enumerate(texts, 1) if text.strip())
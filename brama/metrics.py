@@ -0,0 +1,208 @@
+"""
+Метрики конвеєра обробки повідомлень у форматі Prometheus.
+
+Гістограми тривалості етапів (завантаження файлу, попередня обробка фото,
+OCR, Whisper, запит до LLM, генерація PDF, надсилання в Telegram),
+кількість токенів, частка влучань у кеші та кількість задач у роботі.
+Запис метрики — це кілька операцій зі словником у пам'яті процесу, без
+блокувань і без мережі; HTTP-сервер лише віддає поточні значення
+(GET /metrics), коли Prometheus їх забирає.
+"""
+
+import bisect
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Порт HTTP-сервера метрик (0 — вимкнено)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "0.0.0.0")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+# --------------------- Типи метрик ---------------------
+REGISTRY = []
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Gauge:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._callbacks = {}  # мітки -> func
+        REGISTRY.append(self)
+
+    def set(self, *labels, value):
+        self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set_function(self, labels, func):
+        """
+        Значення обчислюється func() лише під час збору метрик. Повторний
+        виклик з тими самими мітками замінює функцію, а не додає ще одну серію.
+        """
+        self._callbacks[tuple(labels)] = func
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+        for labels, func in self._callbacks.items():
+            try:
+                value = func()
+            except Exception as e:
+                logger.debug(f"Метрика {self.name}{labels}: {e}")
+                continue
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # мітки -> [лічильники кошиків..., сума, кількість]
+        REGISTRY.append(self)
+
+    def observe(self, *labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        names = self.labelnames + ("le",)
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}"
+            label_text = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(series[-2])}"
+            yield f"{self.name}_count{label_text} {series[-1]}"
+
+
+STAGE_SECONDS = Histogram(
+    "brama_stage_seconds", "Тривалість етапу обробки повідомлення, секунд", ("stage",)
+)
+STAGE_IN_FLIGHT = Gauge("brama_stage_in_flight", "Кількість задач, що зараз виконують етап", ("stage",))
+STAGE_ERRORS = Counter("brama_stage_errors_total", "Кількість помилок на етапі", ("stage",))
+LLM_TOKENS = Counter("brama_llm_tokens_total", "Токени запитів до LLM", ("kind",))
+CACHE_HIT_RATE = Gauge("brama_cache_hit_rate", "Частка влучань у кеш", ("cache",))
+QUEUE_SIZE = Gauge("brama_queue_size", "Розмір черг обробки", ("queue",))
+
+
+class timed:
+    """
+    Вимірює тривалість етапу:  with timed("ocr"): ...
+    Працює і всередині корутин (час включає очікування await).
+    """
+
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        STAGE_IN_FLIGHT.inc(self.stage)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.observe(self.stage, value=time.perf_counter() - self.started)
+        STAGE_IN_FLIGHT.dec(self.stage)
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            STAGE_ERRORS.inc(self.stage)
+        return False
+
+
+def observe_stage(stage, seconds):
+    """Записує тривалість етапу, виміряну деінде (наприклад, у процесі OCR)."""
+    STAGE_SECONDS.observe(stage, value=seconds)
+
+
+def track_cache(name, cache):
+    """Показує hit_rate кешу (атрибут або властивість cache.hit_rate); новий кеш з тим самим name замінює попередній."""
+    CACHE_HIT_RATE.set_function((name,), lambda: cache.hit_rate)
+
+
+def track_queue(name, func):
+    """Показує розмір черги, який повертає func()."""
+    QUEUE_SIZE.set_function((name,), func)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(port=METRICS_PORT, host=METRICS_LISTEN):
+    """Запускає HTTP-сервер з GET /metrics; повертає aiohttp AppRunner (або None, якщо port=0)."""
+    if not port:
+        return None
+    from aiohttp import web  # без сервера метрик aiohttp не завантажується
+
+    async def handle_metrics(request):
+        return web.Response(
+            body=render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"Метрики Prometheus: http://{host}:{port}/metrics")
+    return runner
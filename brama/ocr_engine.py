@@ -0,0 +1,373 @@
+"""
+OCR у пулі процесів.
+
+Tesseract запускається не в циклі подій, а в окремих процесах (за
+замовчуванням — по одному на ядро). Проби мов і режимів PSM для одного
+фото виконуються одночасно. Попередня обробка (brama.image_preprocess)
+виконується один раз у пулі, а всі проходи OCR отримують уже зменшене
+і бінаризоване зображення.
+
+Якщо встановлено tesserocr, кожен процес пулу тримає завантажені мовні
+моделі (PyTessBaseAPI) і отримує зображення в пам'яті — без запуску
+tesseract.exe і тимчасових файлів на кожен виклик. Інакше використовується
+pytesseract. Результат в обох випадках — той самий рядок тексту, що й
+GetUTF8Text/image_to_string; впевненість слів pytesseract отримує з tsv
+того самого запуску tesseract.
+
+recognize() не перебирає мови й режими на повному зображенні, а планує
+прохід: на зменшеній копії (OCR_PROBE_SCALE) Tesseract OSD визначає
+поворот і письмо, далі мови з відповідним письмом і режими PSM
+пробуються на мініатюрі одночасно, і за середньою впевненістю слів
+обирається один план — мова і PSM. Повне зображення
+розпізнається один раз; лише якщо впевненість нижча за
+OCR_RETRY_CONFIDENCE, пробуються ще OCR_RETRY_PLANS наступних планів.
+Обраний план рахується в метриці brama_ocr_plans_total.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import pytesseract
+from PIL import Image, ImageEnhance, ImageOps
+
+from brama.metrics import Counter, observe_stage
+
+try:
+    from brama.image_preprocess import OCR_PREPROCESS_STEPS, encode_png, preprocess_image
+except ImportError:  # OpenCV/NumPy не встановлені — лише базова обробка через PIL
+    OCR_PREPROCESS_STEPS = ()
+    preprocess_image = None
+
+try:
+    import tesserocr
+except ImportError:  # tesserocr не встановлено — Tesseract запускається через pytesseract
+    tesserocr = None
+
+logger = logging.getLogger(__name__)
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or os.cpu_count() or 1
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "60"))
+# auto — tesserocr, якщо встановлено, інакше pytesseract
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto")
+# Мовні моделі, які процеси пулу завантажують одразу при старті
+OCR_PRELOAD_LANGS = tuple(
+    lang.strip() for lang in os.getenv("OCR_PRELOAD_LANGS", "deu,ukr+eng").split(",") if lang.strip()
+)
+# Масштаб мініатюри для визначення повороту, мови і PSM
+OCR_PROBE_SCALE = float(os.getenv("OCR_PROBE_SCALE", "0.5"))
+# Нижче цієї середньої впевненості слів (0–100) повне зображення розпізнається ще раз з іншими планами
+OCR_RETRY_CONFIDENCE = float(os.getenv("OCR_RETRY_CONFIDENCE", "60"))
+OCR_RETRY_PLANS = int(os.getenv("OCR_RETRY_PLANS", "2"))
+
+# Менша впевненість OSD (поворот, письмо) — результат ігнорується
+OSD_MIN_CONFIDENCE = 2.0
+# Письмо першої мови набору: "ukr+eng" підходить для кирилиці, "deu" — для латиниці
+LANG_SCRIPTS = {
+    "ukr": "Cyrillic", "rus": "Cyrillic", "bel": "Cyrillic", "bul": "Cyrillic",
+    "eng": "Latin", "deu": "Latin", "pol": "Latin", "fra": "Latin", "ita": "Latin", "spa": "Latin",
+}
+
+OCR_PLANS = Counter("brama_ocr_plans_total", "Плани OCR, за якими розпізнано фото", ("lang", "psm", "source"))
+OCR_PASSES = Counter("brama_ocr_passes_total", "Проходи Tesseract", ("kind",))
+
+
+def _resolve_backend(backend):
+    if backend == "auto":
+        return "tesserocr" if tesserocr is not None else "pytesseract"
+    if backend == "tesserocr" and tesserocr is None:
+        raise ValueError("OCR_BACKEND=tesserocr, але пакет tesserocr не встановлено")
+    if backend not in ("tesserocr", "pytesseract"):
+        raise ValueError(f"Невідомий OCR_BACKEND: {backend}")
+    return backend
+
+
+# --------------------- Код, що виконується у процесах пулу ---------------------
+_backend = "pytesseract"
+_apis = {}  # (мова, OEM) -> PyTessBaseAPI, живе весь час роботи процесу
+
+
+def _init_worker(tesseract_cmd, backend, preload_langs):
+    global _backend
+    # Процес створено через fork і він успадкував обробники сигналів циклу подій
+    # бота: без цього SIGTERM при зупинці пулу "отримав" би і сам бот
+    if hasattr(signal, "set_wakeup_fd"):
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _backend = backend
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    if backend == "tesserocr":
+        for lang in preload_langs:
+            try:
+                _get_api(lang, 3)
+            except Exception:
+                pass  # мову не встановлено — помилка з'явиться при першому запиті
+
+
+def _get_api(lang, oem):
+    api = _apis.get((lang, oem))
+    if api is None:
+        kwargs = {"lang": lang, "oem": oem}
+        tessdata = os.environ.get("TESSDATA_PREFIX")
+        if tessdata:
+            kwargs["path"] = os.path.join(tessdata, "")
+        api = _apis[(lang, oem)] = tesserocr.PyTessBaseAPI(**kwargs)
+    return api
+
+
+def _preprocess_pass(image_data, steps):
+    """Повертає (PNG-байти обробленого зображення, час кроків у мс)."""
+    if preprocess_image is not None:
+        img, timings = preprocess_image(image_data, steps)
+        return encode_png(img), timings
+
+    img = Image.open(BytesIO(image_data))
+    img = img.convert("L")  # Градація сірого
+    img = ImageOps.autocontrast(img)  # Автоматичний контраст
+    img = ImageEnhance.Contrast(img).enhance(2)  # Підвищення контрасту
+    output = BytesIO()
+    img.save(output, format="PNG")
+    return output.getvalue(), {}
+
+
+def _tesseract_text_and_data(img, lang, config, timeout):
+    """
+    image_to_string і image_to_data (DICT) за один запуск tesseract: текст
+    береться з виводу txt, як в image_to_string, слова з впевненістю — з tsv.
+    """
+    tess = pytesseract.pytesseract
+    with tess.save(img) as (temp_name, input_filename):
+        tess.run_tesseract(
+            input_filename, temp_name, "txt", lang, f"-c tessedit_create_tsv=1 {config}", timeout=timeout
+        )
+        with open(f"{temp_name}.txt", encoding=tess.DEFAULT_ENCODING) as f:
+            text = f.read()
+        with open(f"{temp_name}.tsv", encoding=tess.DEFAULT_ENCODING) as f:
+            data = tess.file_to_dict(f.read(), "\t", -1)
+    return text, data
+
+
+def _scored_pass(image_data, lang, psm, oem, timeout, rotate=0):
+    """
+    Повертає (текст, середня впевненість слів 0–100, тривалість у секундах).
+    rotate — поворот за годинниковою стрілкою з OSD.
+    """
+    started = time.perf_counter()
+    img = Image.open(BytesIO(image_data))
+    if rotate:
+        img = img.rotate(-rotate, expand=True)
+    if _backend == "tesserocr":
+        api = _get_api(lang, oem)
+        api.SetPageSegMode(psm)
+        api.SetImage(img)
+        try:
+            text = api.GetUTF8Text()
+            confidence = float(api.MeanTextConf()) if text.strip() else 0.0
+        finally:
+            api.Clear()
+    else:
+        config = f"--psm {psm} --oem {oem}"
+        try:
+            text, data = _tesseract_text_and_data(img, lang, config, timeout)
+        except pytesseract.TesseractNotFoundError as e:
+            # Виняток без аргументів не відновлюється з pickle і "ламає" весь пул
+            raise RuntimeError(str(e)) from None
+        # Середня впевненість, зважена довжиною слів (розділові знаки майже не впливають)
+        words = [(float(c), len(w.strip())) for c, w in zip(data["conf"], data["text"]) if w.strip() and float(c) >= 0]
+        chars = sum(n for _, n in words)
+        confidence = sum(c * n for c, n in words) / chars if chars else 0.0
+    return text, confidence, time.perf_counter() - started
+
+
+def _detect_osd(img, lang, oem, timeout):
+    """(поворот за годинниковою стрілкою, письмо або None) за Tesseract OSD."""
+    try:
+        if _backend == "tesserocr":
+            api = _get_api(lang, oem)
+            api.SetPageSegMode(tesserocr.PSM.OSD_ONLY)
+            api.SetImage(img)
+            try:
+                osd = api.DetectOrientationScript()
+            finally:
+                api.Clear()
+            if not osd:
+                return 0, None
+            rotate = (360 - osd["orient_deg"]) % 360
+            orientation_conf, script, script_conf = osd["orient_conf"], osd["script_name"], osd["script_conf"]
+        else:
+            osd = pytesseract.image_to_osd(img, output_type=pytesseract.Output.DICT, timeout=timeout)
+            rotate = osd.get("rotate", 0)
+            orientation_conf, script, script_conf = osd.get("orientation_conf", 0), osd.get("script"), osd.get("script_conf", 0)
+    except Exception:
+        # Немає osd.traineddata або замало тексту — без повороту, письмо невідоме
+        return 0, None
+    return (
+        rotate if orientation_conf >= OSD_MIN_CONFIDENCE else 0,
+        script if script_conf >= OSD_MIN_CONFIDENCE else None,
+    )
+
+
+def _probe_pass(image_data, scale, lang, oem, timeout):
+    """Повертає (PNG мініатюри, вже повернутої; поворот; письмо; тривалість у секундах)."""
+    started = time.perf_counter()
+    img = Image.open(BytesIO(image_data)).convert("L")
+    if scale < 1:
+        img = img.resize((max(int(img.width * scale), 1), max(int(img.height * scale), 1)), Image.LANCZOS)
+    rotate, script = _detect_osd(img, lang, oem, timeout)
+    if rotate:
+        img = img.rotate(-rotate, expand=True)
+    output = BytesIO()
+    img.save(output, format="PNG")
+    return output.getvalue(), rotate, script, time.perf_counter() - started
+
+
+class OCRPlan:
+    """Обраний для фото план OCR і його результат (для метрик і логів)."""
+
+    __slots__ = ("lang", "psm", "rotate", "script", "confidence", "source", "full_passes")
+
+    def __init__(self, lang, psm, rotate=0, script=None, confidence=0.0, source="probe", full_passes=0):
+        self.lang = lang
+        self.psm = psm
+        self.rotate = rotate
+        self.script = script
+        self.confidence = confidence
+        self.source = source  # probe — за мініатюрою, retry — повторна спроба, only — вибору не було
+        self.full_passes = full_passes
+
+    def __repr__(self):
+        return (
+            f"OCRPlan(lang={self.lang!r}, psm={self.psm}, rotate={self.rotate}, script={self.script!r}, "
+            f"confidence={self.confidence:.0f}, source={self.source!r}, full_passes={self.full_passes})"
+        )
+
+
+def _candidate_langs(langs, script):
+    """Мовні набори, перша мова яких пишеться визначеним письмом (якщо таких немає — усі)."""
+    if script is None:
+        return list(langs)
+    matching = [lang for lang in langs if LANG_SCRIPTS.get(lang.split("+", 1)[0], script) == script]
+    return matching or list(langs)
+
+
+# --------------------- Рушій OCR ---------------------
+class OCREngine:
+    """Пул процесів Tesseract з паралельними спробами різних режимів PSM."""
+
+    def __init__(
+        self,
+        tesseract_cmd=None,
+        max_workers=OCR_WORKERS,
+        timeout=OCR_TIMEOUT,
+        preprocess_steps=OCR_PREPROCESS_STEPS,
+        backend=OCR_BACKEND,
+        preload_langs=OCR_PRELOAD_LANGS,
+    ):
+        self.backend = _resolve_backend(backend)
+        self.preload_langs = preload_langs
+        self.tesseract_cmd = tesseract_cmd
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.preprocess_steps = preprocess_steps
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.tesseract_cmd, self.backend, self.preload_langs),
+            )
+            logger.info(f"OCR: {self.max_workers} процесів, рушій {self.backend}")
+        return self._pool
+
+    async def _run_passes(self, pool, passes):
+        """Виконує _scored_pass для кожного (аргументи, ключ) одночасно: {ключ: (текст, впевненість)}."""
+        loop = asyncio.get_running_loop()
+        futures = {loop.run_in_executor(pool, _scored_pass, *args): key for args, key in passes}
+        results = {}
+        try:
+            done, _ = await asyncio.wait(futures)
+            for fut in done:
+                try:
+                    text, confidence, _ = fut.result()
+                except Exception as e:
+                    logger.warning(f"Помилка OCR {futures[fut]}: {e}")
+                    continue
+                results[futures[fut]] = (text, confidence)
+        finally:
+            for fut in futures:
+                fut.cancel()
+        return results
+
+    async def recognize(self, image_data, langs=OCR_PRELOAD_LANGS, psm_modes=(3,), oem=3, preprocess=True):
+        """
+        Адаптивне OCR (див. опис модуля): поворот і письмо з OSD, вибір мови
+        з langs і режиму з psm_modes на мініатюрі, один прохід по повному
+        зображенню (повтор — лише за низької впевненості).
+        Повертає (текст, OCRPlan).
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        image_data = bytes(image_data)
+        langs, psm_modes = list(langs), list(psm_modes)
+
+        if preprocess:
+            image_data, timings = await loop.run_in_executor(
+                pool, _preprocess_pass, image_data, self.preprocess_steps
+            )
+            if timings:
+                observe_stage("preprocess", sum(timings.values()) / 1000)
+
+        thumbnail, rotate, script, seconds = await loop.run_in_executor(
+            pool, _probe_pass, image_data, OCR_PROBE_SCALE, langs[0], oem, self.timeout
+        )
+        OCR_PASSES.inc("osd")
+        candidates = [(lang, psm) for lang in _candidate_langs(langs, script) for psm in psm_modes]
+
+        # Проби на мініатюрі: план з найвищою впевненістю (за рівності — раніший у списку)
+        ranked = candidates
+        if len(candidates) > 1:
+            started = loop.time()
+            probes = await self._run_passes(
+                pool, [((thumbnail, lang, psm, oem, self.timeout), (lang, psm)) for lang, psm in candidates]
+            )
+            seconds += loop.time() - started
+            OCR_PASSES.inc("probe", amount=len(candidates))
+            ranked = sorted(candidates, key=lambda plan: -probes.get(plan, ("", 0.0))[1])
+        observe_stage("ocr_probe", seconds)
+
+        plan = OCRPlan(*ranked[0], rotate=rotate, script=script, source="probe" if len(ranked) > 1 else "only")
+        attempts = [ranked[0]]
+        started = loop.time()
+        results = await self._run_passes(pool, [((image_data, *ranked[0], oem, self.timeout, rotate), ranked[0])])
+        best_text, plan.confidence = results.get(ranked[0], ("", 0.0))
+        # Якщо OSD помилився з письмом, наприкінці черги — мови іншого письма
+        fallback = ranked[1:] + [(lang, psm) for lang in langs for psm in psm_modes if (lang, psm) not in ranked]
+        if plan.confidence < OCR_RETRY_CONFIDENCE and fallback and OCR_RETRY_PLANS > 0:
+            retries = fallback[:OCR_RETRY_PLANS]
+            attempts += retries
+            results = await self._run_passes(
+                pool, [((image_data, lang, psm, oem, self.timeout, rotate), (lang, psm)) for lang, psm in retries]
+            )
+            for (lang, psm), (text, confidence) in results.items():
+                if confidence > plan.confidence:
+                    best_text, plan.lang, plan.psm, plan.confidence, plan.source = text, lang, psm, confidence, "retry"
+        observe_stage("ocr", loop.time() - started)
+        plan.full_passes = len(attempts)
+        OCR_PASSES.inc("full", amount=len(attempts))
+        OCR_PLANS.inc(plan.lang, str(plan.psm), plan.source)
+        logger.info(f"OCR: {plan!r}")
+        return best_text, plan
+
+    def shutdown(self):
+        """Зупиняє пул процесів (викликається при зупинці бота)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
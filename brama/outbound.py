@@ -0,0 +1,289 @@
+"""
+Вихідні запити до Telegram: ліміти частоти, об'єднання повідомлень, зворотний тиск.
+
+Telegram обмежує надсилання: ~30 повідомлень на секунду загалом, ~1 на
+секунду в один чат (короткі сплески допускаються) і ~20 на хвилину в групу.
+OutboundLimiter підключається до Application як rate_limiter, тож через
+нього проходять усі виклики бота (reply_text, reply_document, edit_text...):
+  - запити кожного чату йдуть у власну чергу і надсилаються по порядку;
+  - перед надсиланням береться токен з відра чату і з глобального відра;
+  - на RetryAfter запит повторюється після вказаної паузи;
+  - дії "друкує..." пропускаються, якщо чат і так чекає на свою чергу.
+Для повідомлень, на які обробник не чекає (reply_text цього модуля),
+кілька коротких текстів поспіль в одному чаті зливаються в одне. Коли в
+чергах забагато запитів, wait_for_capacity() затримує нові задачі.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from brama.metrics import observe_stage, timed, track_queue
+
+logger = logging.getLogger(__name__)
+
+OUT_GLOBAL_RATE = float(os.getenv("OUT_GLOBAL_RATE", "30"))
+OUT_CHAT_RATE = float(os.getenv("OUT_CHAT_RATE", "1"))
+OUT_CHAT_BURST = int(os.getenv("OUT_CHAT_BURST", "3"))
+OUT_GROUP_RATE = float(os.getenv("OUT_GROUP_RATE", str(20 / 60)))
+# Скільки запитів може чекати у всіх чергах, перш ніж нові задачі пригальмують
+OUT_QUEUE_LIMIT = int(os.getenv("OUT_QUEUE_LIMIT", "1000"))
+OUT_MAX_RETRIES = int(os.getenv("OUT_MAX_RETRIES", "3"))
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+MAX_CHAT_BUCKETS = 10000
+
+# Запити, які надсилає сам обробник черги, не ставляться в чергу вдруге
+_in_worker = contextvars.ContextVar("outbound_in_worker", default=False)
+
+
+class _TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def wait_time(self):
+        """Скільки секунд чекати до наступного токена (0 — токен є)."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _Request:
+    __slots__ = ("callback", "args", "kwargs", "data", "future", "enqueued", "deferred")
+
+    def __init__(self, callback, args, kwargs, data, deferred=False):
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.data = data
+        self.future = asyncio.get_running_loop().create_future()
+        self.enqueued = time.monotonic()
+        self.deferred = deferred
+
+
+class OutboundLimiter(BaseRateLimiter):
+    """Rate limiter для python-telegram-bot з чергою на кожен чат."""
+
+    def __init__(
+        self,
+        global_rate=OUT_GLOBAL_RATE,
+        chat_rate=OUT_CHAT_RATE,
+        chat_burst=OUT_CHAT_BURST,
+        group_rate=OUT_GROUP_RATE,
+        queue_limit=OUT_QUEUE_LIMIT,
+        max_retries=OUT_MAX_RETRIES,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.queue_limit = queue_limit
+        self.max_retries = max_retries
+        # Невеликий запас у глобальному відрі: сплеск не перевищить ліміт за секунду
+        self._global = _TokenBucket(global_rate, max(1, int(global_rate) // 6))
+        self._buckets = OrderedDict()  # chat_id -> _TokenBucket
+        self._queues = {}  # chat_id -> deque[_Request]
+        self._workers = {}  # chat_id -> Task
+        self._capacity = None
+        self.depth = 0
+        self.max_depth = 0
+        self.sent = 0
+        self.merged = 0
+        self.retries = 0
+        self.skipped_actions = 0
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        track_queue("outbound", lambda: self.depth)
+
+    def stats(self):
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "chats_waiting": len(self._queues),
+            "sent": self.sent,
+            "merged": self.merged,
+            "retries": self.retries,
+            "skipped_actions": self.skipped_actions,
+            "wait_avg": self.wait_total / self.wait_count if self.wait_count else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+    # --------------------- Інтерфейс BaseRateLimiter ---------------------
+    async def initialize(self):
+        self._capacity = asyncio.Event()
+        self._capacity.set()
+
+    async def shutdown(self):
+        workers = list(self._workers.values())
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if chat_id is None or _in_worker.get():
+            return await callback(*args, **kwargs)
+
+        if endpoint == "sendChatAction":
+            # Дія лише для краси: не витрачаємо на неї ліміт чату, що чекає
+            if chat_id in self._queues or self._bucket(chat_id).wait_time() > 0:
+                self.skipped_actions += 1
+                return True
+            return await callback(*args, **kwargs)
+
+        request = _Request(callback, args, kwargs, data)
+        self._enqueue(chat_id, request)
+        return await request.future
+
+    # --------------------- Публічні допоміжні методи ---------------------
+    async def wait_for_capacity(self):
+        """Чекає, поки у чергах не звільниться місце (зворотний тиск для обробників)."""
+        if self._capacity is not None:
+            await self._capacity.wait()
+
+    async def reply_text(self, message, text):
+        """
+        Ставить текстову відповідь у чергу чату і не чекає на її надсилання.
+        Кілька таких текстів поспіль зливаються в одне повідомлення.
+        """
+        await self.wait_for_capacity()
+        data = {"chat_id": message.chat_id, "text": text, "reply_to_message_id": message.message_id}
+        request = _Request(message.get_bot().send_message, (), data, data, deferred=True)
+        self._enqueue(message.chat_id, request)
+
+    # --------------------- Черги чатів ---------------------
+    def _bucket(self, chat_id):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            is_group = not isinstance(chat_id, int) or chat_id < 0
+            if is_group:
+                bucket = _TokenBucket(self.group_rate, self.chat_burst)
+            else:
+                bucket = _TokenBucket(self.chat_rate, self.chat_burst)
+            self._buckets[chat_id] = bucket
+            if len(self._buckets) > MAX_CHAT_BUCKETS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(chat_id)
+        return bucket
+
+    def _enqueue(self, chat_id, request):
+        queue = self._queues.get(chat_id)
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+        queue.append(request)
+        self.depth += 1
+        self.max_depth = max(self.max_depth, self.depth)
+        if self._capacity is not None and self.depth >= self.queue_limit:
+            self._capacity.clear()
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._chat_worker(chat_id))
+
+    def _dequeue(self, queue, count):
+        for _ in range(count):
+            queue.popleft()
+        self.depth -= count
+        # Відновлюємо прийом нових задач, коли черги спорожніли наполовину
+        if self._capacity is not None and self.depth <= self.queue_limit // 2:
+            self._capacity.set()
+
+    def _take_batch(self, queue):
+        """Перший запит черги; відкладені тексти поспіль зливаються в один."""
+        first = queue[0]
+        if not first.deferred:
+            return [first], first
+        batch = [first]
+        length = len(first.data["text"])
+        for request in list(queue)[1:]:
+            if not request.deferred:
+                break
+            length += 2 + len(request.data["text"])
+            if length > TELEGRAM_MESSAGE_LIMIT:
+                break
+            batch.append(request)
+        if len(batch) == 1:
+            return batch, first
+        self.merged += len(batch) - 1
+        data = dict(first.data, text="\n\n".join(r.data["text"] for r in batch))
+        return batch, _Request(first.callback, (), data, data, deferred=True)
+
+    async def _acquire(self, bucket):
+        while True:
+            wait = max(bucket.wait_time(), self._global.wait_time())
+            if wait <= 0:
+                bucket.take()
+                self._global.take()
+                return
+            await asyncio.sleep(wait)
+
+    async def _send(self, request):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with timed("telegram_send"):
+                    return await request.callback(*request.args, **request.kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(f"Telegram просить зачекати {e.retry_after} с")
+                await asyncio.sleep(e.retry_after)
+
+    async def _chat_worker(self, chat_id):
+        _in_worker.set(True)
+        queue = self._queues[chat_id]
+        bucket = self._bucket(chat_id)
+        try:
+            while queue:
+                await self._acquire(bucket)
+                batch, request = self._take_batch(queue)
+                waited = time.monotonic() - batch[0].enqueued
+                self.wait_count += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+                observe_stage("telegram_queue", waited)
+                try:
+                    result = await self._send(request)
+                except Exception as e:
+                    result, error = None, e
+                else:
+                    error = None
+                    self.sent += 1
+                self._dequeue(queue, len(batch))
+                for item in batch:
+                    if item.deferred:
+                        if error is not None:
+                            logger.error(f"Не вдалося надіслати повідомлення в чат {chat_id}: {error}")
+                            break
+                    elif item.future.done():
+                        continue  # той, хто чекав, уже скасував очікування
+                    elif error is not None:
+                        item.future.set_exception(error)
+                    else:
+                        item.future.set_result(result)
+        finally:
+            self._workers.pop(chat_id, None)
+            if not queue:
+                self._queues.pop(chat_id, None)
+            else:
+                # Скасування під час роботи: решта запитів не буде надіслана
+                for item in queue:
+                    if not item.future.done():
+                        item.future.cancel()
+                self.depth -= len(queue)
+                self._queues.pop(chat_id, None)
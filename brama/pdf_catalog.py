@@ -0,0 +1,228 @@
+"""
+Індекс PDF-файлів для /findpdf.
+
+Каталог сканується один раз при запуску, далі оновлюється інкрементально
+(опитування mtime у фоні). Пошук іде по індексу в пам'яті: точний збіг
+слова, префікс, підрядок і нечіткий збіг (триграми) для опечаток.
+Результати ранжуються та обмежуються, щоб нечіткий запит не надсилав
+десятки файлів.
+"""
+
+import asyncio
+import bisect
+import heapq
+import logging
+import os
+import re
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+PDF_MAX_RESULTS = int(os.getenv("PDF_MAX_RESULTS", "5"))
+PDF_POLL_INTERVAL = float(os.getenv("PDF_POLL_INTERVAL", "30"))
+
+# Мінімальна схожість триграм для нечіткого збігу
+FUZZY_THRESHOLD = 0.45
+# Мінімальна оцінка, з якою файл потрапляє у результати
+MIN_SCORE = 0.5
+
+# Слова із запиту, які не описують сам файл
+STOP_WORDS = {"pdf", "знайти", "знайди", "файл", "файли", "find", "finden", "suche", "datei"}
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def normalize(text):
+    """Нижній регістр без діакритики: "Bürgergeld" -> "burgergeld"."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def scan_folder(folder):
+    """PDF-файли папки: ім'я -> (шлях, розмір, mtime)."""
+    found = {}
+    if not os.path.isdir(folder):
+        return found
+    with os.scandir(folder) as it:
+        for item in it:
+            if item.is_file() and item.name.lower().endswith(".pdf"):
+                st = item.stat()
+                found[item.name] = (item.path, st.st_size, st.st_mtime)
+    return found
+
+
+def _trigrams(token):
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PDFEntry:
+    __slots__ = ("name", "path", "size", "mtime", "norm", "tokens")
+
+    def __init__(self, name, path, size, mtime):
+        self.name = name
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        stem = os.path.splitext(name)[0]
+        self.norm = " ".join(tokenize(stem))
+        self.tokens = set(self.norm.split())
+
+
+class PDFCatalog:
+    """Індекс імен і метаданих PDF-файлів у папці."""
+
+    def __init__(self, folder, max_results=PDF_MAX_RESULTS, poll_interval=PDF_POLL_INTERVAL):
+        self.folder = folder
+        self.max_results = max_results
+        self.poll_interval = poll_interval
+        self._entries = {}  # ім'я файлу -> PDFEntry
+        self._token_files = {}  # слово -> множина імен файлів
+        self._sorted_tokens = []  # для пошуку за префіксом
+        self._trigram_tokens = {}  # триграма -> множина слів
+        self._poll_task = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    # --------------------- Побудова та оновлення індексу ---------------------
+    def _scan(self):
+        return scan_folder(self.folder)
+
+    def _add_entry(self, entry):
+        self._entries[entry.name] = entry
+        for token in entry.tokens:
+            files = self._token_files.get(token)
+            if files is None:
+                files = self._token_files[token] = set()
+                bisect.insort(self._sorted_tokens, token)
+                for tri in _trigrams(token):
+                    self._trigram_tokens.setdefault(tri, set()).add(token)
+            files.add(entry.name)
+
+    def _remove_entry(self, name):
+        entry = self._entries.pop(name)
+        for token in entry.tokens:
+            files = self._token_files[token]
+            files.discard(name)
+            if not files:
+                del self._token_files[token]
+                del self._sorted_tokens[bisect.bisect_left(self._sorted_tokens, token)]
+                for tri in _trigrams(token):
+                    tokens = self._trigram_tokens[tri]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._trigram_tokens[tri]
+
+    def _apply(self, found):
+        added = removed = 0
+        for name in list(self._entries):
+            entry = self._entries[name]
+            current = found.get(name)
+            if current is None or current[1:] != (entry.size, entry.mtime):
+                self._remove_entry(name)
+                removed += 1
+        for name, (path, size, mtime) in found.items():
+            if name not in self._entries:
+                self._add_entry(PDFEntry(name, path, size, mtime))
+                added += 1
+        return added, removed
+
+    def refresh(self):
+        """Синхронно сканує папку та оновлює індекс (лише змінені файли)."""
+        added, removed = self._apply(self._scan())
+        if added or removed:
+            logger.info(f"Каталог PDF оновлено: +{added} -{removed}, усього {len(self._entries)}")
+
+    async def start(self):
+        """Будує індекс і запускає фонове опитування папки."""
+        found = await asyncio.to_thread(self._scan)
+        self._apply(found)
+        logger.info(f"Каталог PDF: {len(self._entries)} файлів у {self.folder}")
+        if self.poll_interval > 0 and self._poll_task is None:
+            self._poll_task = asyncio.create_task(self._poll_loop())
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                # Сканування — у потоці, зміна індексу — у циклі подій
+                found = await asyncio.to_thread(self._scan)
+                added, removed = self._apply(found)
+                if added or removed:
+                    logger.info(f"Каталог PDF оновлено: +{added} -{removed}, усього {len(self._entries)}")
+            except Exception as e:
+                logger.error(f"Помилка оновлення каталогу PDF: {e}")
+
+    def stop(self):
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            self._poll_task = None
+
+    # --------------------- Пошук ---------------------
+    def _prefix_tokens(self, prefix):
+        start = bisect.bisect_left(self._sorted_tokens, prefix)
+        for i in range(start, len(self._sorted_tokens)):
+            token = self._sorted_tokens[i]
+            if not token.startswith(prefix):
+                break
+            yield token
+
+    def _token_scores(self, query_token):
+        """Оцінка кожного файлу для одного слова запиту."""
+        scores = {}
+
+        def mark(token, score):
+            for name in self._token_files[token]:
+                if score > scores.get(name, 0):
+                    scores[name] = score
+
+        if query_token in self._token_files:
+            mark(query_token, 1.0)
+        for token in self._prefix_tokens(query_token):
+            if token != query_token:
+                mark(token, 0.8)
+
+        query_tris = _trigrams(query_token)
+        candidates = {}
+        for tri in query_tris:
+            for token in self._trigram_tokens.get(tri, ()):
+                candidates[token] = candidates.get(token, 0) + 1
+        for token, shared in candidates.items():
+            if query_token in token:
+                mark(token, 0.6)  # підрядок: "geld" у "burgergeld"
+                continue
+            similarity = shared / len(query_tris | _trigrams(token))
+            if similarity >= FUZZY_THRESHOLD:
+                mark(token, min(similarity, 0.6))  # опечатка
+        return scores
+
+    def search(self, query, limit=None):
+        """Повертає список PDFEntry, відсортований за релевантністю."""
+        limit = limit or self.max_results
+        query_tokens = [t for t in tokenize(query) if t not in STOP_WORDS]
+        if not query_tokens:
+            return []
+
+        totals = {}
+        for token in query_tokens:
+            for name, score in self._token_scores(token).items():
+                totals[name] = totals.get(name, 0) + score
+
+        query_norm = " ".join(query_tokens)
+        ranked = []
+        for name, total in totals.items():
+            score = total / len(query_tokens)
+            entry = self._entries[name]
+            if entry.norm == query_norm:
+                score += 1.0
+            elif entry.norm.startswith(query_norm):
+                score += 0.5
+            if score >= MIN_SCORE:
+                ranked.append((score, name))
+        best = heapq.nsmallest(limit, ranked, key=lambda item: (-item[0], item[1]))
+        return [self._entries[name] for _, name in best]
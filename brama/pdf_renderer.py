@@ -0,0 +1,127 @@
+"""
+Генерація PDF з тексту.
+
+Шрифт з підтримкою кирилиці (TTF) реєструється один раз у кожному процесі
+генерації. Текст верстається через reportlab.platypus: з переносом рядків
+і розбиттям на сторінки. Генерація виконується в окремому процесі, тож
+навіть багатосторінкова відповідь не зупиняє інші чати. PDF стискається,
+а шрифт вбудовується лише з використаними символами (subset).
+"""
+
+import asyncio
+import logging
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+from brama.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+PDF_FONT_PATH = os.getenv("PDF_FONT_PATH", "")
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+
+# Де шукати шрифт з кирилицею, якщо PDF_FONT_PATH не задано
+FONT_CANDIDATES = (
+    os.path.join("fonts", "DejaVuSans.ttf"),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    r"C:\Windows\Fonts\arial.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+)
+FONT_NAME = "BramaSans"
+
+
+def find_font(font_path=PDF_FONT_PATH):
+    for path in (font_path,) + FONT_CANDIDATES:
+        if path and os.path.isfile(path):
+            return path
+    return None
+
+
+# --------------------- Код, що виконується у процесах генерації ---------------------
+_font_name = "Helvetica"
+
+
+def _init_worker(font_path):
+    global _font_name
+    # Процес створено через fork і він успадкував обробники сигналів циклу подій
+    # бота: без цього SIGTERM при зупинці пулу "отримав" би і сам бот
+    if hasattr(signal, "set_wakeup_fd"):
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if font_path:
+        pdfmetrics.registerFont(TTFont(FONT_NAME, font_path))
+        _font_name = FONT_NAME
+
+
+def _render(text, title):
+    styles = getSampleStyleSheet()
+    body = styles["BodyText"].clone("BramaBody", fontName=_font_name, fontSize=11, leading=15)
+    heading = styles["Heading2"].clone("BramaHeading", fontName=_font_name)
+
+    story = []
+    if title:
+        story.append(Paragraph(escape(title), heading))
+        story.append(Spacer(1, 4 * mm))
+    # Порожній рядок — новий абзац, одиночний перенос — розрив рядка в абзаці
+    for block in text.replace("\r\n", "\n").split("\n\n"):
+        if block.strip():
+            story.append(Paragraph(escape(block.strip()).replace("\n", "<br/>"), body))
+
+    output = BytesIO()
+    doc = SimpleDocTemplate(
+        output,
+        pagesize=A4,
+        leftMargin=20 * mm,
+        rightMargin=20 * mm,
+        topMargin=20 * mm,
+        bottomMargin=20 * mm,
+        pageCompression=1,
+        title=title or "",
+        author="Brama-UA e.V.",
+    )
+    doc.build(story)
+    return output.getvalue()
+
+
+# --------------------- Рендерер ---------------------
+class PDFRenderer:
+    """Пул процесів, що перетворює текст на PDF."""
+
+    def __init__(self, font_path=PDF_FONT_PATH, max_workers=PDF_WORKERS):
+        self.font_path = find_font(font_path)
+        self.max_workers = max_workers
+        self._pool = None
+        if self.font_path is None:
+            logger.warning("Не знайдено TTF-шрифт з кирилицею (PDF_FONT_PATH) — кирилиця у PDF не відображатиметься")
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(self.font_path,),
+            )
+        return self._pool
+
+    async def render(self, text, title=None):
+        """Повертає PDF (байти) з текстом; генерація — у процесі пулу."""
+        loop = asyncio.get_running_loop()
+        with timed("pdf_render"):
+            return await loop.run_in_executor(self._get_pool(), _render, text, title)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,35 @@
+"""
+Системний промпт асистента.
+
+Базовий промпт короткий: довідкову інформацію дають фрагменти наших
+PDF-документів, знайдені для конкретного питання (brama.doc_index).
+Замість вбудованого тексту можна вказати файл у SYSTEM_PROMPT_FILE
+(UTF-8) — тоді промпт змінюється без зміни коду.
+"""
+
+import os
+
+SYSTEM_PROMPT_FILE = os.getenv("SYSTEM_PROMPT_FILE", "")
+
+CORE_PROMPT = """Ви Асистент неприбуткової організації Brama-UA e.V., яка допомагає українцям у Німеччині інтегруватися в суспільство.
+
+Відповідайте завжди тією мовою, якою до Вас звернулись. Консультуйте щодо Jobcenter, Agentur für Arbeit, документів, листів від установ і заснування бізнесу; за потреби давайте посилання на https://www.jobcenter-digital.de, https://www.arbeitsagentur.de, https://gruendenplattform.de.
+Якщо нижче є фрагменти документів Brama-UA, спирайтесь на них і називайте файл, з якого взято інформацію. Не вигадуйте того, чого немає у фрагментах; якщо даних бракує — скажіть про це і поставте уточнююче питання.
+"""
+
+
+def load_system_prompt(path=SYSTEM_PROMPT_FILE):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    return CORE_PROMPT
+
+
+def build_system_prompt(passages, core=CORE_PROMPT):
+    """Базовий промпт і знайдені фрагменти документів (Passage з brama.doc_index)."""
+    if not passages:
+        return core
+    lines = [core.rstrip(), "", "Фрагменти документів Brama-UA:"]
+    for passage in passages:
+        lines.append(f"[{passage.file}, с. {passage.page}] {passage.text}")
+    return "\n".join(lines)
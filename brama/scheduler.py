@@ -0,0 +1,177 @@
+"""
+Справедливий планувальник обробки повідомлень.
+
+Повідомлення одного чату обробляються строго по черзі (історія чату не
+змінюється двома обробниками одночасно), різні чати — паралельно. Робота
+поділена на смуги з власними лімітами одночасних задач:
+  text  — текстові питання (дешеві, лише запит до OpenAI);
+  voice — розпізнавання голосу (Whisper);
+  media — OCR фото та робота з PDF.
+Десять фото від одного користувача займають щонайбільше одне місце в смузі
+media і не затримують текстові питання інших. Поки задача чекає або
+виконується, користувач бачить "друкує..." / "надсилає файл...".
+"""
+
+import asyncio
+import functools
+import logging
+import os
+
+from telegram.constants import ChatAction
+from telegram.error import TelegramError
+
+from brama.metrics import track_queue
+
+logger = logging.getLogger(__name__)
+
+SCHED_TEXT_CONCURRENCY = int(os.getenv("SCHED_TEXT_CONCURRENCY", "16"))
+SCHED_VOICE_CONCURRENCY = int(os.getenv("SCHED_VOICE_CONCURRENCY", "4"))
+SCHED_MEDIA_CONCURRENCY = int(os.getenv("SCHED_MEDIA_CONCURRENCY", "2"))
+# Скільки чатів може чекати в одній смузі і скільки повідомлень — в одному чаті
+SCHED_LANE_QUEUE = int(os.getenv("SCHED_LANE_QUEUE", "200"))
+SCHED_CHAT_QUEUE = int(os.getenv("SCHED_CHAT_QUEUE", "10"))
+
+# Дія в чаті діє ~5 секунд, тому її треба повторювати
+CHAT_ACTION_INTERVAL = 4.0
+LANE_ACTIONS = {
+    "text": ChatAction.TYPING,
+    "voice": ChatAction.TYPING,
+    "media": ChatAction.UPLOAD_DOCUMENT,
+}
+BUSY_TEXT = "Зараз забагато запитів. Спробуйте, будь ласка, за хвилину."
+
+
+def message_lane(message):
+    """Смуга для повідомлення за його типом."""
+    if message is None:
+        return "text"
+    if message.voice or message.audio or message.video_note:
+        return "voice"
+    if message.photo or message.document:
+        return "media"
+    return "text"
+
+
+class _Lane:
+    def __init__(self, concurrency, max_waiting):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.waiting = 0
+        self.running = 0
+
+
+class _ChatState:
+    __slots__ = ("lock", "pending")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.pending = 0
+
+
+class ChatScheduler:
+    """Черга по чатах + смуги з обмеженою кількістю одночасних задач."""
+
+    def __init__(
+        self,
+        text_concurrency=SCHED_TEXT_CONCURRENCY,
+        voice_concurrency=SCHED_VOICE_CONCURRENCY,
+        media_concurrency=SCHED_MEDIA_CONCURRENCY,
+        lane_queue=SCHED_LANE_QUEUE,
+        chat_queue=SCHED_CHAT_QUEUE,
+        outbound=None,
+    ):
+        self._lanes = {
+            "text": _Lane(text_concurrency, lane_queue),
+            "voice": _Lane(voice_concurrency, lane_queue),
+            "media": _Lane(media_concurrency, lane_queue),
+        }
+        self.chat_queue = chat_queue
+        self.outbound = outbound  # OutboundLimiter: не починаємо задачі, поки черги відправки переповнені
+        self._chats = {}  # chat_id -> _ChatState
+        self.rejected = 0
+        for name, lane in self._lanes.items():
+            track_queue(f"lane_{name}", lambda lane=lane: lane.waiting)
+
+    def stats(self):
+        return {
+            name: {"running": lane.running, "waiting": lane.waiting, "concurrency": lane.concurrency}
+            for name, lane in self._lanes.items()
+        }
+
+    async def _chat_action_loop(self, bot, chat_id, action):
+        while True:
+            try:
+                await bot.send_chat_action(chat_id=chat_id, action=action)
+            except TelegramError as e:
+                logger.debug(f"Не вдалося надіслати дію в чат {chat_id}: {e}")
+            await asyncio.sleep(CHAT_ACTION_INTERVAL)
+
+    async def run(self, chat_id, lane, job, bot=None, action=None):
+        """
+        Виконує job() (корутину) у смузі lane після попередніх задач цього чату.
+        Повертає False, якщо черга чату чи смуги переповнена і задачу відхилено.
+        """
+        lane_state = self._lanes[lane]
+        state = self._chats.get(chat_id)
+        if state is None:
+            state = self._chats[chat_id] = _ChatState()
+        if state.pending >= self.chat_queue or lane_state.waiting >= lane_state.max_waiting:
+            self.rejected += 1
+            if not state.pending:
+                del self._chats[chat_id]
+            return False
+
+        state.pending += 1
+        lane_state.waiting += 1
+        started = False
+        action_task = None
+        if bot is not None and chat_id is not None:
+            action_task = asyncio.create_task(
+                self._chat_action_loop(bot, chat_id, action or LANE_ACTIONS[lane])
+            )
+        try:
+            async with state.lock:
+                if self.outbound is not None:
+                    await self.outbound.wait_for_capacity()
+                async with lane_state.semaphore:
+                    lane_state.waiting -= 1
+                    lane_state.running += 1
+                    started = True
+                    try:
+                        await job()
+                    finally:
+                        lane_state.running -= 1
+            return True
+        finally:
+            if not started:
+                lane_state.waiting -= 1
+            if action_task is not None:
+                action_task.cancel()
+            state.pending -= 1
+            if not state.pending:
+                self._chats.pop(chat_id, None)
+
+    def handler(self, lane=None, action=None):
+        """
+        Декоратор для обробника python-telegram-bot: обробник виконується
+        через планувальник. Без lane смуга визначається за типом повідомлення.
+        Додаткові аргументи (крім update і context) передаються обробнику.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(update, context, *args):
+                chat_id = update.effective_chat.id if update.effective_chat else None
+                accepted = await self.run(
+                    chat_id,
+                    lane or message_lane(update.effective_message),
+                    lambda: func(update, context, *args),
+                    bot=context.bot,
+                    action=action,
+                )
+                if not accepted:
+                    logger.warning(f"Чат {chat_id}: запит відхилено, черга переповнена")
+                    if update.effective_message:
+                        await update.effective_message.reply_text(BUSY_TEXT)
+            return wrapper
+        return decorator
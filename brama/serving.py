@@ -0,0 +1,380 @@
+"""
+Режими роботи бота: long polling або webhook з кількома процесами-обробниками.
+
+BOT_MODE=polling  — як раніше, один процес з long polling.
+BOT_MODE=webhook  — вбудований HTTP-сервер (aiohttp) приймає оновлення від
+                    Telegram. Якщо BOT_WORKERS > 1 або задано WORKER_URLS,
+                    головний процес лише маршрутизує оновлення, а обробляють
+                    їх процеси-обробники; інакше все відбувається в одному процесі.
+BOT_MODE=worker   — лише обробник: приймає оновлення від маршрутизатора
+                    (для запуску на інших машинах, див. WORKER_URLS).
+
+Оновлення розподіляються консистентним хешуванням за chat_id: усі
+повідомлення одного чату потрапляють до одного обробника і обробляються
+по черзі, а історія чату лишається в пам'яті саме цього процесу. Додавання
+чи прибирання обробника переносить лише невелику частину чатів.
+"""
+
+import asyncio
+import bisect
+import contextlib
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+
+# aiohttp потрібен лише для webhook і маршрутизатора — імпортується у відповідних функціях
+from telegram import Bot, Update
+from telegram.ext import Application
+
+from brama.log import flush_logging
+from brama.metrics import METRICS_PORT, start_metrics_server, track_queue
+
+logger = logging.getLogger(__name__)
+
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+# Публічна адреса, на яку Telegram надсилає оновлення (https://...)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# Секрет, який Telegram передає у заголовку X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+
+# Кількість локальних процесів-обробників і адреси обробників на інших машинах
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+WORKER_URLS = [url.strip() for url in os.getenv("WORKER_URLS", "").split(",") if url.strip()]
+WORKER_LISTEN = os.getenv("WORKER_LISTEN", "127.0.0.1")
+WORKER_PORT = int(os.getenv("WORKER_PORT", "9000"))
+WORKER_PATH = "/update"
+# Скільки оновлень може чекати на пересилання одному обробнику
+WORKER_QUEUE_SIZE = int(os.getenv("WORKER_QUEUE_SIZE", "1000"))
+
+# Адреси Bot API (інші — для локального Bot API сервера чи стенду навантажувального тесту)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org/bot")
+TELEGRAM_FILE_URL = os.getenv("TELEGRAM_FILE_URL", "https://api.telegram.org/file/bot")
+
+# Пул HTTP-з'єднань до Telegram Bot API
+TELEGRAM_POOL_SIZE = int(os.getenv("TELEGRAM_POOL_SIZE", "128"))
+TELEGRAM_POOL_TIMEOUT = float(os.getenv("TELEGRAM_POOL_TIMEOUT", "10"))
+TELEGRAM_READ_TIMEOUT = float(os.getenv("TELEGRAM_READ_TIMEOUT", "15"))
+TELEGRAM_WRITE_TIMEOUT = float(os.getenv("TELEGRAM_WRITE_TIMEOUT", "30"))
+# Скільки оновлень обробляються одночасно (порядок у межах чату тримає ChatScheduler)
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "256"))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+# Спроби пересилання (~30 с) покривають і запуск обробників після рестарту
+MAX_FORWARD_ATTEMPTS = 10
+
+
+def application_builder(token):
+    """ApplicationBuilder з налаштованим пулом з'єднань до Telegram і паралельною обробкою оновлень."""
+    return (
+        Application.builder()
+        .token(token)
+        .base_url(TELEGRAM_API_URL)
+        .base_file_url(TELEGRAM_FILE_URL)
+        .concurrent_updates(BOT_CONCURRENT_UPDATES)
+        .connection_pool_size(TELEGRAM_POOL_SIZE)
+        .pool_timeout(TELEGRAM_POOL_TIMEOUT)
+        .read_timeout(TELEGRAM_READ_TIMEOUT)
+        .write_timeout(TELEGRAM_WRITE_TIMEOUT)
+    )
+
+
+# --------------------- Консистентне хешування ---------------------
+def _hash(value):
+    return int.from_bytes(hashlib.md5(str(value).encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """Кільце консистентного хешування з віртуальними вузлами."""
+
+    def __init__(self, nodes, replicas=160):
+        self.nodes = list(nodes)
+        if not self.nodes:
+            raise ValueError("HashRing потребує хоча б один вузол")
+        ring = sorted(
+            (_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(replicas)
+        )
+        self._keys = [key for key, _ in ring]
+        self._values = [node for _, node in ring]
+
+    def node(self, key):
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._values[index]
+
+
+def update_chat_id(data):
+    """chat_id з оновлення (dict); для оновлень без чату — id користувача або update_id."""
+    for value in data.values():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+        sender = value.get("from") or value.get("user")
+        if sender:
+            return sender["id"]
+    return data.get("update_id", 0)
+
+
+# --------------------- Допоміжне ---------------------
+def _stop_event():
+    """Подія, що встановлюється за SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows: Ctrl+C перерве asyncio.run() через KeyboardInterrupt
+            pass
+    return stop
+
+
+def _secret_ok(request):
+    return not WEBHOOK_SECRET or request.headers.get(SECRET_HEADER) == WEBHOOK_SECRET
+
+
+async def _start_site(web_app, host, port):
+    from aiohttp import web
+
+    runner = web.AppRunner(web_app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def _set_webhook(token):
+    if not WEBHOOK_URL:
+        raise ValueError("Для BOT_MODE=webhook потрібно задати WEBHOOK_URL")
+    async with Bot(token, base_url=TELEGRAM_API_URL, base_file_url=TELEGRAM_FILE_URL) as bot:
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    logger.info(f"Webhook встановлено: {WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}")
+
+
+# --------------------- Обробник ---------------------
+@contextlib.asynccontextmanager
+async def _running(application):
+    """Запуск і зупинка Application у тому ж порядку, що й у run_polling()."""
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    try:
+        yield
+    finally:
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+async def _serve_polling(build_application, metrics_port):
+    application = build_application()
+    stop = _stop_event()
+    async with _running(application):
+        await application.updater.start_polling()
+        metrics_runner = await start_metrics_server(metrics_port)
+        try:
+            await stop.wait()
+        finally:
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+            await application.updater.stop()
+
+
+async def _serve_worker(build_application, host, port, path, token=None, metrics_port=METRICS_PORT):
+    """
+    Запускає Application без long polling і HTTP-сервер, що кладе отримані
+    оновлення в його чергу. Якщо задано token — спершу реєструє webhook
+    (режим одного процесу, коли обробник приймає оновлення прямо від Telegram).
+    """
+    from aiohttp import web
+
+    application = build_application()
+    stop = _stop_event()
+
+    async def handle_update(request):
+        if not _secret_ok(request):
+            return web.Response(status=403)
+        update = Update.de_json(await request.json(), application.bot)
+        await application.update_queue.put(update)
+        return web.Response()
+
+    web_app = web.Application()
+    web_app.router.add_post(path, handle_update)
+
+    async with _running(application):
+        runner = await _start_site(web_app, host, port)
+        metrics_runner = await start_metrics_server(metrics_port)
+        try:
+            if token:
+                await _set_webhook(token)
+            logger.info(f"Обробник оновлень слухає {host}:{port}{path}")
+            await stop.wait()
+        finally:
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+            await runner.cleanup()
+
+
+def _worker_process(build_application, host, port, metrics_port):
+    try:
+        asyncio.run(_serve_worker(build_application, host, port, WORKER_PATH, metrics_port=metrics_port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Процес multiprocessing завершується без atexit — дописуємо лог самі
+        flush_logging()
+
+
+# --------------------- Маршрутизатор ---------------------
+class UpdateRouter:
+    """Приймає оновлення від Telegram і пересилає їх обробникам за chat_id."""
+
+    def __init__(self, worker_urls, queue_size=WORKER_QUEUE_SIZE):
+        self.worker_urls = list(worker_urls)
+        self.ring = HashRing(self.worker_urls)
+        self.queue_size = queue_size
+        self._queues = {}
+        self._tasks = []
+        self._session = None
+
+    async def start(self):
+        from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+        self._session = ClientSession(
+            connector=TCPConnector(limit_per_host=4),
+            timeout=ClientTimeout(total=30),
+        )
+        for url in self.worker_urls:
+            # Одна черга і один відправник на обробник: порядок оновлень зберігається
+            queue = asyncio.Queue(maxsize=self.queue_size)
+            self._queues[url] = queue
+            track_queue(f"forward:{url}", queue.qsize)
+            self._tasks.append(asyncio.create_task(self._forward_loop(url, queue)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+    async def _forward_loop(self, url, queue):
+        headers = {"Content-Type": "application/json"}
+        if WEBHOOK_SECRET:
+            headers[SECRET_HEADER] = WEBHOOK_SECRET
+        while True:
+            body = await queue.get()
+            for attempt in range(MAX_FORWARD_ATTEMPTS):
+                try:
+                    async with self._session.post(url, data=body, headers=headers) as response:
+                        if response.status < 500:
+                            if response.status != 200:
+                                logger.error(f"Обробник {url} відхилив оновлення: HTTP {response.status}")
+                            break
+                except (OSError, asyncio.TimeoutError) as e:
+                    logger.warning(f"Обробник {url} недоступний ({e!r}), спроба {attempt + 1}")
+                await asyncio.sleep(min(2 ** attempt * 0.2, 5))
+            else:
+                logger.error(f"Оновлення втрачено: обробник {url} не відповідає")
+
+    async def handle_update(self, request):
+        from aiohttp import web
+
+        if not _secret_ok(request):
+            return web.Response(status=403)
+        body = await request.read()
+        url = self.ring.node(update_chat_id(json.loads(body)))
+        # Повна черга затримує відповідь Telegram — він сам сповільнить надсилання
+        await self._queues[url].put(body)
+        return web.Response()
+
+
+async def _serve_router(token, worker_urls):
+    from aiohttp import web
+
+    router = UpdateRouter(worker_urls)
+    stop = _stop_event()
+    web_app = web.Application()
+    web_app.router.add_post(WEBHOOK_PATH, router.handle_update)
+
+    await router.start()
+    runner = await _start_site(web_app, WEBHOOK_LISTEN, WEBHOOK_PORT)
+    metrics_runner = await start_metrics_server(METRICS_PORT)
+    try:
+        await _set_webhook(token)
+        logger.info(f"Маршрутизатор слухає {WEBHOOK_LISTEN}:{WEBHOOK_PORT}, обробників: {len(worker_urls)}")
+        await stop.wait()
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await runner.cleanup()
+        await router.stop()
+
+
+# --------------------- Точка входу ---------------------
+def run_application(build_application, token, mode=BOT_MODE):
+    """
+    Запускає бота у вибраному режимі. build_application() має повертати
+    готовий Application (з обробниками, post_init/post_shutdown); у режимі
+    webhook вона викликається у кожному процесі-обробнику окремо.
+    """
+    if mode == "polling":
+        try:
+            asyncio.run(_serve_polling(build_application, METRICS_PORT))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if mode == "worker":
+        try:
+            asyncio.run(_serve_worker(build_application, WORKER_LISTEN, WORKER_PORT, WORKER_PATH))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if mode != "webhook":
+        raise ValueError(f"Невідомий BOT_MODE: {mode}")
+
+    if BOT_WORKERS <= 1 and not WORKER_URLS:
+        try:
+            asyncio.run(_serve_worker(build_application, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, token))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    processes = []
+    worker_urls = list(WORKER_URLS)
+    for i in range(BOT_WORKERS if BOT_WORKERS > 1 else 0):
+        port = WORKER_PORT + i
+        process = multiprocessing.Process(
+            target=_worker_process,
+            # Кожен обробник віддає власні метрики: METRICS_PORT + 1 + номер
+            args=(build_application, "127.0.0.1", port, METRICS_PORT + 1 + i if METRICS_PORT else 0),
+            name=f"bot-worker-{i}",
+        )
+        process.start()
+        processes.append(process)
+        worker_urls.append(f"http://127.0.0.1:{port}{WORKER_PATH}")
+    try:
+        asyncio.run(_serve_router(token, worker_urls))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
@@ -0,0 +1,106 @@
+"""
+Потокові відповіді в Telegram.
+
+Перше повідомлення надсилається, щойно від OpenAI приходить перший
+фрагмент відповіді, далі воно оновлюється через edit_message_text не
+частіше ніж раз на STREAM_EDIT_INTERVAL секунд. Текст, довший за ліміт
+Telegram (4096 символів), продовжується у новому повідомленні.
+"""
+
+import asyncio
+import logging
+import os
+
+from telegram.error import BadRequest, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+STREAM_REPLIES = os.getenv("STREAM_REPLIES", "1") == "1"
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+def _split_point(text, limit):
+    """Місце розриву: останній перенос рядка або пробіл перед лімітом."""
+    cut = text.rfind("\n", 0, limit)
+    if cut < limit // 2:
+        cut = text.rfind(" ", 0, limit)
+    if cut < limit // 2:
+        cut = limit
+    return cut
+
+
+def split_message(text, limit=TELEGRAM_MESSAGE_LIMIT):
+    """Розбиває текст на частини, що вміщуються в одне повідомлення Telegram."""
+    parts = []
+    while len(text) > limit:
+        cut = _split_point(text, limit)
+        parts.append(text[:cut])
+        text = text[cut:].lstrip()
+    if text.strip():
+        parts.append(text)
+    return parts
+
+
+async def reply_long_text(message, text):
+    """Надсилає текст одним або кількома повідомленнями."""
+    for part in split_message(text):
+        await message.reply_text(part)
+
+
+async def _edit(sent, text, final=False):
+    try:
+        await sent.edit_text(text)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+    except RetryAfter as e:
+        # Проміжне оновлення можна пропустити, останнє — ні
+        if not final:
+            return
+        await asyncio.sleep(e.retry_after)
+        await sent.edit_text(text)
+
+
+async def stream_reply(message, chunks, edit_interval=STREAM_EDIT_INTERVAL):
+    """
+    Показує відповідь у Telegram у міру надходження фрагментів з chunks
+    (асинхронний ітератор рядків) і повертає повний текст.
+    """
+    loop = asyncio.get_running_loop()
+    full_text = []
+    current = ""  # текст поточного повідомлення
+    shown = ""  # що вже показано в поточному повідомленні
+    sent = None
+    last_edit = 0.0
+
+    async for piece in chunks:
+        full_text.append(piece)
+        current += piece
+
+        # Поточне повідомлення заповнене — закриваємо його і починаємо нове
+        while len(current) > TELEGRAM_MESSAGE_LIMIT:
+            cut = _split_point(current, TELEGRAM_MESSAGE_LIMIT)
+            head, current = current[:cut], current[cut:].lstrip()
+            if sent is None:
+                await message.reply_text(head)
+            else:
+                await _edit(sent, head, final=True)
+            sent, shown = None, ""
+
+        now = loop.time()
+        if sent is None:
+            if current.strip():
+                sent = await message.reply_text(current)
+                shown, last_edit = current, now
+        elif current != shown and now - last_edit >= edit_interval:
+            await _edit(sent, current)
+            shown, last_edit = current, now
+
+    if current.strip() and current != shown:
+        if sent is None:
+            await message.reply_text(current)
+        else:
+            await _edit(sent, current, final=True)
+    return "".join(full_text)
@@ -0,0 +1,192 @@
+"""
+Розпізнавання довгих голосових частинами, паралельно.
+
+Whisper обробляє запис від початку до кінця, тож 5-хвилинне голосове —
+одне довге очікування. Тут запис декодується (PyAV) у моно 16 кГц, тиша
+на початку і в кінці обрізається, а запис, довший за
+VOICE_SEGMENT_SECONDS, ділиться на частини по паузах (найдовша пауза у
+вікні; якщо пауз немає — найтихіше місце). Частини кодуються в Opus і
+розпізнаються одночасно (не більше VOICE_CONCURRENCY на повідомлення;
+загальний ліміт запитів — у LLMClient), а тексти склеюються в початковому
+порядку.
+
+Короткі голосові (за duration від Telegram), файли, які не вдалося
+декодувати, і все — якщо PyAV не встановлено, йдуть у Whisper цілими.
+"""
+
+import asyncio
+import logging
+import os
+from io import BytesIO
+
+import numpy as np
+
+from brama.metrics import Counter, timed
+
+try:
+    import av
+except ImportError:  # PyAV не встановлено — голосові розпізнаються цілими
+    av = None
+
+logger = logging.getLogger(__name__)
+
+# Довші записи діляться на частини не довші за це, с
+VOICE_SEGMENT_SECONDS = float(os.getenv("VOICE_SEGMENT_SECONDS", "30"))
+# Коротші частини Whisper розпізнає гірше (мало контексту)
+VOICE_MIN_SEGMENT_SECONDS = float(os.getenv("VOICE_MIN_SEGMENT_SECONDS", "10"))
+VOICE_MIN_PAUSE = float(os.getenv("VOICE_MIN_PAUSE", "0.3"))
+# Кадр, тихіший за гучні (95-й перцентиль) на стільки дБ, вважається тишею
+VOICE_SILENCE_DB = float(os.getenv("VOICE_SILENCE_DB", "30"))
+VOICE_CONCURRENCY = int(os.getenv("VOICE_CONCURRENCY", "4"))
+
+SAMPLE_RATE = 16000
+FRAME = SAMPLE_RATE // 50  # кадр 20 мс
+PAD_FRAMES = 10  # 0.2 с тиші лишається по краях частини
+SILENCE_FLOOR_DB = -60.0  # тихіше — тиша за будь-якої гучності запису
+OPUS_BITRATE = 24000
+
+SEGMENTS = Counter("brama_voice_segments_total", "Частини голосових, надіслані у Whisper")
+
+
+# --------------------- Аудіо ---------------------
+def decode(file):
+    """Аудіо з файлу як float32 моно 16 кГц."""
+    chunks = []
+    resampler = av.AudioResampler(format="flt", layout="mono", rate=SAMPLE_RATE)
+    with av.open(file) as container:
+        for frame in container.decode(audio=0):
+            chunks.extend(f.to_ndarray().reshape(-1) for f in resampler.resample(frame))
+    chunks.extend(f.to_ndarray().reshape(-1) for f in resampler.resample(None))
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+
+
+def encode(samples, name):
+    """Ogg/Opus у пам'яті; name — ім'я файлу для Whisper."""
+    buffer = BytesIO()
+    with av.open(buffer, "w", format="ogg") as container:
+        stream = container.add_stream("libopus", rate=SAMPLE_RATE, layout="mono")
+        stream.bit_rate = OPUS_BITRATE
+        frame = av.AudioFrame.from_ndarray(samples.reshape(1, -1), format="flt", layout="mono")
+        frame.sample_rate = SAMPLE_RATE
+        for packet in stream.encode(frame):
+            container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    buffer.seek(0)
+    buffer.name = name
+    return buffer
+
+
+def frame_levels(samples):
+    """Гучність кожного 20-мс кадру, дБ від повної шкали."""
+    count = len(samples) // FRAME
+    frames = samples[:count * FRAME].reshape(count, FRAME)
+    rms = np.sqrt(np.mean(np.square(frames, dtype=np.float64), axis=1))
+    return 20 * np.log10(rms + 1e-10)
+
+
+def _pauses(silent, start, end, min_frames):
+    """Проміжки тиші (початок, кінець) всередині [start, end), не коротші за min_frames."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], silent.astype(np.int8), [0]))))
+    return [
+        (int(a), int(b)) for a, b in edges.reshape(-1, 2)
+        if b - a >= min_frames and a > start and b < end
+    ]
+
+
+def plan_segments(levels, max_frames, min_frames, min_pause_frames, silence_db=VOICE_SILENCE_DB):
+    """
+    Межі частин у кадрах: [(початок, кінець), ...]. Тиша по краях запису
+    і всередині пауз, по яких іде поділ, відкидається. Порожній список —
+    у записі немає звуку.
+    """
+    if not len(levels):
+        return []
+    silent = levels < max(np.percentile(levels, 95) - silence_db, SILENCE_FLOOR_DB)
+    voiced = np.flatnonzero(~silent)
+    if not len(voiced):
+        return []
+    start = max(int(voiced[0]) - PAD_FRAMES, 0)
+    end = min(int(voiced[-1]) + 1 + PAD_FRAMES, len(levels))
+    pauses = _pauses(silent, start, end, min_pause_frames)
+    segments = []
+    while end - start > max_frames:
+        low, high = start + min_frames, start + max_frames
+        candidates = [(b - a, a, b) for a, b in pauses if low <= a <= high - PAD_FRAMES]
+        if candidates:
+            _, a, b = max(candidates)
+            cut = min(a + PAD_FRAMES, b)
+            segments.append((start, cut))
+            start = max(b - PAD_FRAMES, cut)
+        else:
+            cut = low + int(np.argmin(levels[low:high]))
+            segments.append((start, cut))
+            start = cut
+    segments.append((start, end))
+    return segments
+
+
+# --------------------- Розпізнавання ---------------------
+class Transcriber:
+    """Whisper через LLMClient.transcribe; довгі голосові — частинами паралельно."""
+
+    def __init__(
+        self,
+        llm,
+        segment_seconds=VOICE_SEGMENT_SECONDS,
+        min_segment_seconds=VOICE_MIN_SEGMENT_SECONDS,
+        min_pause=VOICE_MIN_PAUSE,
+        concurrency=VOICE_CONCURRENCY,
+    ):
+        self.llm = llm
+        self.segment_seconds = segment_seconds
+        self.max_frames = int(segment_seconds * 50)
+        self.min_frames = int(min(min_segment_seconds, segment_seconds / 2) * 50)
+        self.min_pause_frames = max(int(min_pause * 50), 1)
+        self.concurrency = concurrency
+
+    def split(self, audio_file):
+        """
+        Декодує запис і повертає (семпли, межі частин) або None, якщо
+        запис досить короткий, щоб надіслати його цілим.
+        """
+        samples = decode(audio_file)
+        levels = frame_levels(samples)
+        segments = plan_segments(levels, self.max_frames, self.min_frames, self.min_pause_frames)
+        if len(segments) == 1 and len(levels) <= self.max_frames:
+            return None
+        return samples, segments
+
+    async def transcribe(self, audio_file, language="uk", duration=None):
+        """Текст голосового; duration — тривалість від Telegram, с (якщо відома)."""
+        if av is None or self.concurrency < 1 or (duration and duration <= self.segment_seconds):
+            return await self.llm.transcribe(audio_file, language=language)
+        try:
+            with timed("audio_split"):
+                plan = await asyncio.to_thread(self.split, audio_file)
+        except Exception as e:  # не аудіо або пошкоджений файл — нехай Whisper спробує сам
+            logger.warning(f"Не вдалося поділити голосове на частини: {e}")
+            plan = None
+        if plan is None:
+            audio_file.seek(0)
+            return await self.llm.transcribe(audio_file, language=language)
+
+        samples, segments = plan
+        if not segments:
+            return ""
+        SEGMENTS.inc(amount=len(segments))
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(index, start, end):
+            async with semaphore:
+                part = await asyncio.to_thread(encode, samples[start * FRAME:end * FRAME], f"part{index}.ogg")
+                return await self.llm.transcribe(part, language=language)
+
+        tasks = [asyncio.create_task(run(i, start, end)) for i, (start, end) in enumerate(segments)]
+        try:
+            texts = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return " ".join(text.strip() for text in texts if text.strip())
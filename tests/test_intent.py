@@ -0,0 +1,49 @@
+"""Маршрутизація намірів: питання про PDF — розмова, а не команда."""
+
+import pytest
+
+from brama.intent import CHAT, CREATE_PDF, FIND_PDF, HELP, classify
+
+
+@pytest.mark.parametrize("text", [
+    "Як створити PDF файл на телефоні?",
+    "Как сделать PDF из фото?",
+    "How do I make a PDF?",
+    "Wie erstelle ich ein PDF?",
+    "Як знайти PDF файл на телефоні?",
+    "Чи можна створити PDF у Telegram?",
+])
+def test_how_to_questions_go_to_chat(text):
+    assert classify(text).name == CHAT
+
+
+@pytest.mark.parametrize("text", [
+    "що ти вмієш",
+    "Що ти вмієш?",
+    "что ты умеешь",
+    "what can you do",
+    "Was kannst du?",
+    "help",
+])
+def test_help_questions_still_go_to_help(text):
+    assert classify(text).name == HELP
+
+
+def test_create_rule_needs_document_text():
+    intent = classify("Зроби PDF")
+    assert (intent.name, intent.source) != (CREATE_PDF, "rule")
+
+
+@pytest.mark.parametrize("text, argument", [
+    ("Створи PDF: Привіт", "Привіт"),
+    ("сделай pdf из текста: ааа", "ааа"),
+    ("Створи PDF\nперший рядок", "перший рядок"),
+])
+def test_create_command_with_text(text, argument):
+    intent = classify(text)
+    assert (intent.name, intent.source, intent.argument) == (CREATE_PDF, "rule", argument)
+
+
+def test_find_command():
+    intent = classify("Знайди PDF Anmeldung")
+    assert (intent.name, intent.argument) == (FIND_PDF, "anmeldung")
@@ -0,0 +1,52 @@
+"""Проходи OCR через pytesseract повертають той самий текст, що й image_to_string."""
+
+import os
+import sys
+from io import BytesIO
+
+import pytest
+import pytesseract
+from PIL import Image
+
+from brama import ocr_engine
+
+FAKE_TESSERACT = """#!{python}
+import sys
+args = sys.argv[1:]
+if args[0] == "--version":
+    print("tesseract 5.3.0")
+    sys.exit(0)
+out = args[1]
+with open(out + ".txt", "w", encoding="utf-8") as f:
+    f.write("Sehr geehrte  Frau Müller,\\n\\nIhr Antrag\\n")
+if any("tessedit_create_tsv=1" in a for a in args):
+    rows = ["level\\tpage_num\\tblock_num\\tpar_num\\tline_num\\tword_num\\tleft\\ttop\\twidth\\theight\\tconf\\ttext"]
+    for par, (conf, word) in enumerate([(90, "Sehr"), (60, "geehrte"), (-1, ""), (30, ",")], 1):
+        rows.append(f"5\\t1\\t1\\t{{par}}\\t1\\t1\\t0\\t0\\t10\\t10\\t{{conf}}\\t{{word}}")
+    with open(out + ".tsv", "w", encoding="utf-8") as f:
+        f.write("\\n".join(rows) + "\\n")
+"""
+
+
+@pytest.fixture
+def fake_tesseract(tmp_path, monkeypatch):
+    path = tmp_path / "tesseract"
+    path.write_text(FAKE_TESSERACT.format(python=sys.executable), encoding="utf-8")
+    path.chmod(0o755)
+    monkeypatch.setattr(pytesseract.pytesseract, "tesseract_cmd", str(path))
+    monkeypatch.setattr(ocr_engine, "_backend", "pytesseract")
+
+
+@pytest.fixture
+def image():
+    output = BytesIO()
+    Image.new("L", (40, 20), 255).save(output, format="PNG")
+    return output.getvalue()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="фальшивий tesseract — скрипт з shebang")
+def test_scored_pass_keeps_image_to_string_text(fake_tesseract, image):
+    text, confidence, _ = ocr_engine._scored_pass(image, "deu", 6, 3, 10)
+    assert text == pytesseract.image_to_string(Image.open(BytesIO(image)), lang="deu")
+    # Впевненість зважена довжиною слів; порожні слова й conf=-1 не враховуються
+    assert confidence == pytest.approx((90 * 4 + 60 * 7 + 30 * 1) / 12)